@@ -26,6 +26,8 @@ if __name__ == '__main__':
             st.Page(Path("content", "results", "proteomicslfq.py"), title="Quantification Results", icon="📊"),
             st.Page(Path("content", "results", "msstats.py"), title="Statistical Analysis", icon="📈"),
             st.Page(Path("content", "results", "pmultiqc.py"), title="Quality Control", icon="📃"),
+            st.Page(Path("content", "results", "sql_query.py"), title="SQL Query", icon="🗄️"),
+            st.Page(Path("content", "results", "performance.py"), title="Pipeline Performance", icon="⏱️"),
         ]
     }
 
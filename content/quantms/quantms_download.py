@@ -1,21 +1,43 @@
 import streamlit as st
 from pathlib import Path
 from src.common.common import page_setup
+from src.common.catalog import artifacts
+from src.common.download_server import download_url, server_url, start_download_server
 
 page_setup()
 
 st.title("QuantMS Analysis Download Page")
 
-results_dir = Path(st.session_state.workspace, "results")
-zip_path = results_dir.with_suffix(".zip")
+server = st.session_state.settings["download_server"]
+steps = sorted({a["step"] for a in artifacts(st.session_state.workspace) if a["path"].startswith("results/")})
+
+if not steps:
+    st.info("Results will be available for download once the analysis is successfully completed.")
+
+elif (
+    server["enabled"]
+    and (base_url := server_url(server, st.context.headers))
+    and start_download_server(st.session_state.workspace.parent, server["port"], server["host"])
+):
+    # The archive is generated on the fly by the download server while it is downloaded
+
+    selected = st.multiselect("Steps", steps, default=steps, key="download-steps")
+    st.link_button(
+        "📦 Download Results (.zip)",
+        download_url(base_url, st.session_state.workspace, [] if set(selected) == set(steps) else selected),
+        disabled=not selected,
+    )
 
-if zip_path.is_file():
-    with open(zip_path, "rb") as f:
-        st.download_button(
-            label="📦 Download Results (.zip)",
-            data=f,
-            file_name=zip_path.name,
-            mime="application/zip"
-        )
 else:
-    st.info("Results will be available for download once the analysis is successfully completed.")
\ No newline at end of file
+    # Download server disabled, unreachable behind a proxy or its port taken, offer the archive built after the run
+    zip_path = Path(st.session_state.workspace, "results.zip")
+    if zip_path.is_file():
+        with open(zip_path, "rb") as f:
+            st.download_button(
+                label="📦 Download Results (.zip)",
+                data=f,
+                file_name=zip_path.name,
+                mime="application/zip"
+            )
+    else:
+        st.info("Results will be available for download once the analysis is successfully completed.")
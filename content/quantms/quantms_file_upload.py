@@ -1,9 +1,9 @@
 from pathlib import Path
 import streamlit as st
 import pandas as pd
-import zipfile
 import json
 import os
+from collections import deque
 
 from src.common.common import (
     page_setup,
@@ -13,13 +13,11 @@ from src.common.common import (
     TK_AVAILABLE,
     tk_directory_dialog,
 )
+from src.common.catalog import artifact_paths, build_catalog
+from src.common import nextflow_job, run_queue
+from src.common.download_server import log_url, server_url, start_download_server
+from src.common.trace import TRACE_FILE, load_trace, process_summary
 from src.upload import sdrf_upload, fasta_upload
-from src.workflow.CommandExecutor import CommandExecutor
-
-def zip_results_folder(results_dir: Path, zip_path: Path):
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for file in results_dir.rglob("*"):
-            zipf.write(file, arcname=file.relative_to(results_dir))
 
 def load_default_values():
     BASE_DIR = Path(__file__).parent
@@ -71,24 +69,22 @@ with sub_tabs[0]:
                 st.warning("Please select SDRF files.")
 
     # Show SDRF files in workspace
-    if any(sdrf_dir.iterdir()):
+    sdrf_workspace_files = [
+        f for f in artifact_paths(st.session_state.workspace, "sdrf-files")
+        if "external_files.txt" not in f.name
+    ]
+    if sdrf_workspace_files:
         st.markdown("#### SDRF Files in Workspace:")
-        df = pd.DataFrame({
-            "File Name": [
-                f.name for f in sdrf_dir.iterdir()
-                if "external_files.txt" not in f.name
-            ]
-        })
+        df = pd.DataFrame({"File Name": [f.name for f in sdrf_workspace_files]})
         show_table(df)
 
         st.markdown("###### 🗑️ Delete SDRF Files:")
-        for f in sdrf_dir.iterdir():
-            if "external_files.txt" in f.name:
-                continue
+        for f in sdrf_workspace_files:
             col1, col2 = st.columns([4, 1])
             col1.write(f.name)
             if col2.button("🗑️ Delete", key=f"sdrf_del_{f.name}"):
                 f.unlink()
+                build_catalog(st.session_state.workspace, ("sdrf-files",))
                 st.rerun()
 
 # FASTA Upload Tab
@@ -112,25 +108,23 @@ with sub_tabs[1]:
                 st.warning("Please select FASTA files.")
 
     # Show FASTA files in workspace
-    if any(fasta_dir.iterdir()):
+    fasta_workspace_files = [
+        f for f in artifact_paths(st.session_state.workspace, "fasta-files")
+        if "external_files.txt" not in f.name
+    ]
+    if fasta_workspace_files:
         v_space(2)
         st.markdown("#### FASTA Files in Workspace:")
-        df = pd.DataFrame({
-            "File Name": [
-                f.name for f in fasta_dir.iterdir()
-                if "external_files.txt" not in f.name
-            ]
-        })
+        df = pd.DataFrame({"File Name": [f.name for f in fasta_workspace_files]})
         show_table(df)
 
         st.markdown("###### 🗑️ Delete FASTA Files:")
-        for f in fasta_dir.iterdir():
-            if "external_files.txt" in f.name:
-                continue
+        for f in fasta_workspace_files:
             col1, col2 = st.columns([4, 1])
             col1.write(f.name)
             if col2.button("🗑️ Delete", key=f"fasta_del_{f.name}"):
                 f.unlink()
+                build_catalog(st.session_state.workspace, ("fasta-files",))
                 st.rerun()
 
 # --------- TAB 2: Configure ---------
@@ -220,25 +214,39 @@ with tabs[1]:
 with tabs[2]:
     st.subheader("Run Analysis")
 
-    sdrf_files = list(sdrf_dir.glob("*.tsv")) + list(sdrf_dir.glob("*.sdrf"))
-    fasta_files = list(fasta_dir.glob("*.fasta")) + list(fasta_dir.glob("*.fa"))
+    sdrf_files = artifact_paths(st.session_state.workspace, "sdrf-files", ("tsv", "sdrf"))
+    fasta_files = artifact_paths(st.session_state.workspace, "fasta-files", ("fasta", "fa"))
 
     if not sdrf_files:
         st.warning("Please upload at least one SDRF file in the 'File Upload' tab.")
     if not fasta_files:
         st.warning("Please upload at least one FASTA file in the 'File Upload' tab.")
 
-    if st.button("Start Workflow") and sdrf_files and fasta_files:
+    # Runs of all workspaces share this host and wait in one queue
+    workspaces_dir = st.session_state.workspace.parent
+    limits = st.session_state.settings["run_queue"]
+    queue = run_queue.summary(workspaces_dir)
+    st.caption(f"{queue['running']} analyses running, {queue['queued']} queued "
+               f"(at most {limits['max_concurrent_runs']} run at the same time).")
+
+    job = nextflow_job.read_job(st.session_state.workspace)
+    active = job is not None and job["state"] in nextflow_job.ACTIVE_STATES
+
+    # Tasks whose inputs and parameters did not change since the previous run are taken from its cache
+    session = nextflow_job.read_session(st.session_state.workspace)
+    resume = st.checkbox(
+        "Reuse results of the previous run",
+        value=True,
+        key="run-resume",
+        disabled=session is None,
+        help="Resume the previous Nextflow run (-resume), so that only the steps affected by changed "
+             "files or parameters are executed again. Uncheck to run all steps from scratch.",
+    )
+
+    if st.button("Start Workflow", disabled=active) and sdrf_files and fasta_files:
         sdrf_path = str(sdrf_files[0])
         fasta_path = str(fasta_files[0])
         profile = st.session_state.get("profile", "docker")
-        workdir = st.session_state.workspace
-
-        command_placeholder = st.empty()
-        status_placeholder = st.empty()
-        log_placeholder = st.empty()
-        output_lines = []
-        returncode = None
 
         default_values = load_default_values()
 
@@ -250,31 +258,93 @@ with tabs[2]:
         config_args = ' '.join(f'--{k} {v}' for k, v in changed_values.items())
         # config_args += " --skip_post_msstats True"
         st.write(config_args)
-        
-
-        for kind, value in CommandExecutor.run_nextflow(sdrf_path, fasta_path, workdir, config_args, profile):
-            if kind == "debug":
-                st.code(value, language="bash")
-            elif kind == "cmd":
-                command_placeholder.code(value, language="bash")
-            elif kind == "log_update":
-                output_lines.append(value)
-                log_placeholder.text_area("Analysis Log", "\n".join(output_lines), height=400)
-            elif kind == "returncode":
-                returncode = value
 
-        if returncode == 0:
-            status_placeholder.success("The analysis completed successfully.")
-
-            results_dir = Path(st.session_state.workspace, "results")
-
-            zip_path = results_dir.with_suffix(".zip")
-            zip_results_folder(results_dir, zip_path)
+        # The run continues in the background when this session ends, the next visit reattaches to it
+        try:
+            nextflow_job.start_job(
+                st.session_state.workspace, sdrf_path, fasta_path, config_args, profile, limits,
+                # Without a reachable download server, results are downloaded as a prebuilt archive
+                archive=not (
+                    st.session_state.settings["download_server"]["enabled"]
+                    and server_url(st.session_state.settings["download_server"], st.context.headers)
+                ),
+                resume=resume,
+            )
+        except ValueError:
+            st.warning("An analysis of this workspace is already queued or running.")
+        job = nextflow_job.read_job(st.session_state.workspace)
+        active = job is not None and job["state"] in nextflow_job.ACTIVE_STATES
+
+    def show_run(was_active: bool):
+        job = nextflow_job.read_job(st.session_state.workspace)
+        if job is None:
+            return
+        # A session that did not follow this run yet attaches to the end of its log,
+        # afterwards only the lines appended since the last byte offset are read
+        if st.session_state.get("run-job-id") != job["id"]:
+            st.session_state["run-job-id"] = job["id"]
+            st.session_state["run-log-offset"] = None
+            st.session_state["run-log-view"] = deque(maxlen=nextflow_job.LOG_VIEW_LINES)
+        st.session_state["run-log-offset"] = nextflow_job.follow_log(
+            st.session_state.workspace, st.session_state["run-log-view"], st.session_state["run-log-offset"]
+        )
 
+        if job["command"]:
+            st.code(job["command"], language="bash")
+        if job["resumed_from"]:
+            st.caption(f"Resuming run `{job['resumed_from']}`, unchanged steps are taken from its cache.")
+        if job["state"] == "queued":
+            st.info(f"⏳ Waiting for a free slot, position {job['position'] or '-'} in the queue.")
+        elif job["state"] == "running":
+            st.info("⚙️ The analysis is running. You can leave this page and come back later.")
+        elif job["state"] == "done":
+            st.success("The analysis completed successfully.")
             st.session_state["analysis_success"] = True
+            if job.get("postprocess_error"):
+                st.warning(f"The results could not be prepared for the results pages and download: {job['postprocess_error']}")
         else:
-            status_placeholder.error(f"An error occurred during the analysis (exit code {returncode}).")
+            st.error(f"An error occurred during the analysis (exit code {job['returncode']}). {job.get('error', '')}")
             st.session_state["analysis_success"] = False
 
+        trace_file = Path(st.session_state.workspace, nextflow_job.JOB_DIR, TRACE_FILE)
+        if job["state"] not in nextflow_job.ACTIVE_STATES and trace_file.is_file():
+            tasks = process_summary(load_trace(trace_file))[["process", "executed", "cached"]]
+            st.markdown(f"**{tasks['executed'].sum():,} tasks executed, {tasks['cached'].sum():,} taken from the cache**")
+            st.dataframe(tasks, hide_index=True, use_container_width=True)
+        st.text_area(
+            f"Analysis Log (last {nextflow_job.LOG_VIEW_LINES:,} lines)",
+            "\n".join(st.session_state["run-log-view"]),
+            height=400,
+        )
+
+        if was_active and job["state"] not in nextflow_job.ACTIVE_STATES:
+            # Stop polling and refresh the whole page once the run has finished
+            st.rerun()
+
+    # Update the log view at a fixed rate, only while the run is active
+    st.fragment(show_run, run_every=nextflow_job.LOG_VIEW_INTERVAL if active else None)(active)
+
+    # The full log stays on disk, searched and downloaded from there
+    log_file = nextflow_job.log_path(st.session_state.workspace)
+    if job is not None and log_file.is_file():
+        query = st.text_input("Search the full log", key="run-log-search")
+        if query:
+            matches = nextflow_job.search_log(st.session_state.workspace, query)
+            st.caption(f"{len(matches):,} matching lines" if len(matches) < nextflow_job.MAX_SEARCH_MATCHES
+                       else f"First {len(matches):,} matching lines")
+            if matches:
+                st.code("\n".join(f"{number}: {line}" for number, line in matches), language=None, height=300)
+        # Served by the download server, or read into the session only when asked for
+        server = st.session_state.settings["download_server"]
+        if (
+            server["enabled"]
+            and (base_url := server_url(server, st.context.headers))
+            and start_download_server(st.session_state.workspace.parent, server["port"], server["host"])
+        ):
+            st.link_button("Download Log", log_url(base_url, st.session_state.workspace))
+        elif st.button("Prepare Log Download"):
+            with open(log_file, "rb") as f:
+                st.download_button("Download Log", f, file_name=f"{st.session_state.workspace.name}-nextflow.log")
+
 # Save state
 save_params(params)
@@ -2,87 +2,74 @@ from pathlib import Path
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from pyopenms import IdXMLFile
 from streamlit_plotly_events import plotly_events
 
-from src.common.common import page_setup
+from src.common.catalog import artifact_paths, has_step
+from src.common.common import display_large_dataframe, lazy_tabs, page_setup
+from src.common.idxml import cache_path, idxml_to_dataframe, is_cache_fresh
+from src.common.scatter import MAX_OVERLAY_POINTS, RASTER_THRESHOLD, density_scatter
 
 # Page setup
 params = page_setup()
 st.title("🔍 Peptide Spectrum Matches")
 st.info("Here you can explore the PSM scatterplot along with the detailed PSM table.")
 
-# Path to results folder
-results_dir = Path(st.session_state.workspace, "results")
-idfilter_dir = results_dir / "idfilter"
-
-# Check if path exists
-if not idfilter_dir.exists():
+# Check if the step has any results
+if not has_step(st.session_state.workspace, "idfilter"):
     st.warning("❗ 'idfilter' directory not found. Please run the analysis first.")
     st.stop()
 
 # Get list of idXML files
-idxml_files = sorted(idfilter_dir.glob("*.idXML"))
+idxml_files = artifact_paths(st.session_state.workspace, "idfilter", "idXML")
 if not idxml_files:
     st.info("No idXML files found in the 'idfilter' directory.")
     st.stop()
 
-# Convert idXML → DataFrame
-def idxml_to_dataframe(idxml_file: str) -> pd.DataFrame:
-    proteins = []
-    peptides = []
-    IdXMLFile().load(str(idxml_file), proteins, peptides)
-
-    records = []
-    for pep in peptides:
-        rt = pep.getRT()
-        mz = pep.getMZ()
-        for hit in pep.getHits():
-            protein_refs = [ev.getProteinAccession() for ev in hit.getPeptideEvidences()]
-            records.append({
-                "RT": rt,
-                "m/z": mz,
-                "Sequence": hit.getSequence().toString(),
-                "Charge": hit.getCharge(),
-                "Score": hit.getScore(),
-                "Proteins": ",".join(protein_refs) if protein_refs else None
-            })
-
-    df = pd.DataFrame(records)
-    if not df.empty:
-        # Convert Charge to categorical string
-        df["Charge"] = df["Charge"].astype(str)
-        charge_order = sorted(df["Charge"].unique(), key=lambda x: int(x))
-        df["Charge"] = pd.Categorical(df["Charge"], categories=charge_order, ordered=True)
-
-        # Add numeric column for color scale
-        df["Charge_num"] = df["Charge"].astype(int)
-
-    return df
-
-
-# Create tabs based on file names
-tabs = st.tabs([f.stem.split("_")[0] for f in idxml_files])
-
-for tab, idxml_file in zip(tabs, idxml_files):
-    with tab:
-        st.markdown(f"### 🧾 {idxml_file.name}")
-
-        try:
-            df = idxml_to_dataframe(str(idxml_file))
-            if df.empty:
-                st.info("No peptide hits found in this file.")
-                continue
+
+def show_psms(idxml_file: Path, df: pd.DataFrame) -> None:
+    """
+    Show the PSM table and the clickable RT vs m/z scatter plot of one run.
+    """
+    st.markdown(f"### 🧾 {idxml_file.name}")
+
+    try:
+        if df.empty:
+            st.info("No peptide hits found in this file.")
+            return
+
+        # Display the PSM table page by page, read from the columnar cache if there is one
+        display_large_dataframe(
+            cache_path(idxml_file) if is_cache_fresh(idxml_file) else df,
+            key_prefix=f"psm_table_{idxml_file.stem}",
+            use_container_width=True
+        )
+
+        # Runs too large to draw every PSM in the browser are binned into a density image on the server
+        if len(df) > RASTER_THRESHOLD:
+            st.caption(
+                f"{len(df):,} PSMs are shown as a density image. Narrow the RT and m/z ranges "
+                f"to at most {MAX_OVERLAY_POINTS:,} PSMs to show and select individual matches."
+            )
+            cols = st.columns(2)
+            rt_min, rt_max = float(df["RT"].min()), float(df["RT"].max())
+            mz_min, mz_max = float(df["m/z"].min()), float(df["m/z"].max())
+            with cols[0]:
+                rt_range = st.slider("RT range", rt_min, rt_max, (rt_min, rt_max), key=f"psm_rt_{idxml_file.stem}")
+            with cols[1]:
+                mz_range = st.slider("m/z range", mz_min, mz_max, (mz_min, mz_max), key=f"psm_mz_{idxml_file.stem}")
+
+            fig, overlay_index = density_scatter(
+                df, "RT", "m/z", rt_range, mz_range, hover_columns=["Score", "Sequence", "Proteins"]
+            )
+        else:
+            overlay_index = None
 
             # Add index as a column
             df_with_index = df.reset_index()
 
-            # Display the full DataFrame
-            st.dataframe(df, use_container_width=True)
-
             # Prepare data for RT vs m/z scatter plot
             df_with_index['custom_index'] = df_with_index['index'] # Add custom index for plotly events
-            
+
             fig = px.scatter(
                 df_with_index,
                 x="RT",
@@ -110,19 +97,36 @@ for tab, idxml_file in zip(tabs, idxml_files):
                 hovermode="closest"
             )
 
-            # Enable clickable scatter plot and display
-            clicked = plotly_events(
-                fig,
-                click_event=True,
-                hover_event=False,
-                override_height=600
-            )
-
-            # If a point is clicked, show the corresponding DataFrame row
-            if clicked:
-                row_index = clicked[0]["pointNumber"]
-                st.subheader("📌 Selected Peptide Match")
-                st.dataframe(df.iloc[[row_index]], use_container_width=True)
+        # Enable clickable scatter plot and display
+        clicked = plotly_events(
+            fig,
+            click_event=True,
+            hover_event=False,
+            override_height=600,
+            key=f"psm_scatter_{idxml_file.stem}"
+        )
+
+        # If a point is clicked, show the corresponding DataFrame row
+        # In density mode only the overlaid points (trace 1) map to PSMs
+        if clicked and (overlay_index is None or clicked[0]["curveNumber"] == 1):
+            row_index = clicked[0]["pointNumber"]
+            if overlay_index is not None:
+                row_index = overlay_index[row_index]
+            st.subheader("📌 Selected Peptide Match")
+            st.dataframe(df.iloc[[row_index]], use_container_width=True)
+
+    except Exception as e:
+        st.error(f"Failed to load {idxml_file.name}: {e}")
+
+
+# Create a tab for each run, only the selected run is loaded
+selected = lazy_tabs([f.stem.split("_")[0] for f in idxml_files], key="idfilter-run")
+idxml_file = idxml_files[selected]
+
+try:
+    df = idxml_to_dataframe(idxml_file, parser=st.session_state.settings["idxml_parser"])
+except Exception as e:
+    st.error(f"Failed to load {idxml_file.name}: {e}")
+    st.stop()
 
-        except Exception as e:
-            st.error(f"Failed to load {idxml_file.name}: {e}")
\ No newline at end of file
+show_psms(idxml_file, df)
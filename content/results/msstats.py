@@ -5,22 +5,20 @@ import numpy as np
 import plotly.graph_objects as go
 from streamlit_plotly_events import plotly_events
 
-from src.common.common import page_setup
+from src.common.catalog import artifact_paths, content_hash, has_step
+from src.common.common import page_setup, show_fig
 
 # Page setup
 params = page_setup()
 st.title("📈 Statistical Analysis")
 
-# Path to results folder
-results_dir = Path(st.session_state.workspace, "results")
-msstats_dir = results_dir / "msstats"
-
-if not msstats_dir.exists():
+# Check if the step has any results
+if not has_step(st.session_state.workspace, "msstats"):
     st.warning("❗ 'msstats' directory not found. Please run the analysis first.")
     st.stop()
 
 # Get list of CSV files
-csv_files = sorted(msstats_dir.glob("*.csv"))
+csv_files = artifact_paths(st.session_state.workspace, "msstats", "csv")
 if not csv_files:
     st.info("No CSV files found in the 'msstats' directory.")
     st.stop()
@@ -29,8 +27,125 @@ if not csv_files:
 csv_file = csv_files[0]
 st.markdown(f"### 🧾 {csv_file.name}")
 
+# Volcano plot groups and their colors
+colors = {
+    'Up-regulated': 'red',
+    'Down-regulated': 'blue',
+    'Not significant': 'lightgrey'
+}
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_comparison_table(csv_file: Path, csv_hash: str) -> pd.DataFrame:
+    """
+    Read the MSstats comparison table (tab-separated). Cached per content hash of the file.
+    """
+    return pd.read_csv(csv_file, sep="\t")
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def build_significance_index(csv_file: Path, csv_hash: str) -> dict[str, np.ndarray]:
+    """
+    Precompute everything the volcano plot needs that does not depend on the cutoffs.
+
+    Rows without a valid adj.pvalue or log2FC are dropped. The remaining adj.pvalues and
+    absolute log2FCs are kept sorted together with their sort order, so the rows passing
+    any pair of cutoffs are found with two binary searches. Cached per content hash of the
+    file and shared read-only between sessions.
+
+    Returns:
+        dict[str, np.ndarray]: Plot coordinates, hover data, and the sorted cutoff arrays.
+    """
+    df = load_comparison_table(csv_file, csv_hash)
+    pvalue = df['adj.pvalue'].to_numpy(dtype=float)
+    log2fc = df['log2FC'].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        neg_log10_pvalue = -np.log10(np.where(pvalue > 0, pvalue, np.nan))
+
+    # Remove invalid values, keeping the original row index
+    index = np.flatnonzero(~np.isnan(neg_log10_pvalue) & ~np.isnan(log2fc))
+    pvalue, log2fc = pvalue[index], log2fc[index]
+    abs_log2fc = np.abs(log2fc)
+    p_order = np.argsort(pvalue, kind="stable")
+    fc_order = np.argsort(abs_log2fc, kind="stable")
+
+    # Original row index first, then the hover columns, formatted client-side by the hovertemplate
+    hover_columns = [c for c in ["Protein", "Label", "pvalue", "adj.pvalue"] if c in df.columns]
+    customdata = np.column_stack([index, df[hover_columns].to_numpy()[index]])
+
+    return {
+        "log2FC": log2fc,
+        "neg_log10_pvalue": neg_log10_pvalue[index],
+        "customdata": customdata,
+        "hover_columns": np.array(hover_columns),
+        "p_order": p_order,
+        "p_sorted": pvalue[p_order],
+        "fc_order": fc_order,
+        "abs_log2fc_sorted": abs_log2fc[fc_order],
+    }
+
+
+def passing_cutoffs(index: dict[str, np.ndarray], pvalue_cutoff: float, log2fc_cutoff: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the rows with adj.pvalue < pvalue_cutoff and the rows with |log2FC| > log2fc_cutoff.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Boolean masks over the valid rows of the index.
+    """
+    n = len(index["log2FC"])
+    below_pvalue = np.zeros(n, dtype=bool)
+    below_pvalue[index["p_order"][:np.searchsorted(index["p_sorted"], pvalue_cutoff, side="left")]] = True
+    above_log2fc = np.zeros(n, dtype=bool)
+    above_log2fc[index["fc_order"][np.searchsorted(index["abs_log2fc_sorted"], log2fc_cutoff, side="right"):]] = True
+    return below_pvalue, above_log2fc
+
+
+def significance_curves(
+    index: dict[str, np.ndarray], pvalue_cutoff: float, log2fc_cutoff: float, n_thresholds: int = 200
+) -> tuple[go.Figure, go.Figure]:
+    """
+    Count the significant rows for every adj.pvalue cutoff (at the current log2FC cutoff) and for
+    every log2FC cutoff (at the current adj.pvalue cutoff).
+
+    The sorted arrays of the index stay sorted under a boolean mask, so each curve is a single
+    vectorized binary search over all thresholds.
+    """
+    below_pvalue, above_log2fc = passing_cutoffs(index, pvalue_cutoff, log2fc_cutoff)
+
+    # Significant count by adj.pvalue cutoff
+    p_sorted = index["p_sorted"][above_log2fc[index["p_order"]]]
+    positive = index["p_sorted"][index["p_sorted"] > 0]
+    lowest = positive[0] if len(positive) else 1e-10
+    p_thresholds = np.logspace(np.log10(lowest), 0, n_thresholds)
+    p_counts = np.searchsorted(p_sorted, p_thresholds, side="left")
+
+    # Significant count by log2FC cutoff
+    fc_sorted = index["abs_log2fc_sorted"][below_pvalue[index["fc_order"]]]
+    finite = index["abs_log2fc_sorted"][np.isfinite(index["abs_log2fc_sorted"])]
+    fc_thresholds = np.linspace(0, finite[-1] if len(finite) else 1, n_thresholds)
+    fc_counts = len(fc_sorted) - np.searchsorted(fc_sorted, fc_thresholds, side="right")
+
+    fig_p = go.Figure(go.Scatter(x=p_thresholds, y=p_counts, mode="lines", line_color="red"))
+    fig_p.add_vline(x=pvalue_cutoff, line_dash="dash", line_color="grey")
+    fig_p.update_layout(
+        title=f"Significant proteins vs. adj.pvalue cutoff (|log2FC| > {log2fc_cutoff})",
+        xaxis=dict(title="adj.pvalue cutoff", type="log"),
+        yaxis_title="Significant proteins",
+    )
+
+    fig_fc = go.Figure(go.Scatter(x=fc_thresholds, y=fc_counts, mode="lines", line_color="blue"))
+    fig_fc.add_vline(x=log2fc_cutoff, line_dash="dash", line_color="grey")
+    fig_fc.update_layout(
+        title=f"Significant proteins vs. log2FC cutoff (adj.pvalue < {pvalue_cutoff})",
+        xaxis_title="|log2FC| cutoff",
+        yaxis_title="Significant proteins",
+    )
+    return fig_p, fig_fc
+
+
 try:
-    df = pd.read_csv(csv_file, sep="\t")
+    csv_hash = content_hash(st.session_state.workspace, csv_file)
+    df = load_comparison_table(csv_file, csv_hash)
     
     if df.empty:
         st.info("No data found in this file.")
@@ -53,55 +168,40 @@ try:
 
     # Volcano plot generation
     if 'log2FC' in df.columns and 'adj.pvalue' in df.columns:
-        # Create dataframe for plotting while preserving original row index
-        df_plot = df.copy().reset_index()
-        df_plot['neg_log10_pvalue'] = -np.log10(df_plot['adj.pvalue'].replace(0, np.nan))
+        index = build_significance_index(csv_file, csv_hash)
 
         # Assign group labels based on cutoff rules
-        df_plot['color'] = np.where(
-            (df_plot['log2FC'] > log2fc_cutoff) & (df_plot['adj.pvalue'] < pvalue_cutoff), 'Up-regulated',
-            np.where((df_plot['log2FC'] < -log2fc_cutoff) & (df_plot['adj.pvalue'] < pvalue_cutoff), 'Down-regulated', 'Not significant')
-        )
+        below_pvalue, above_log2fc = passing_cutoffs(index, pvalue_cutoff, log2fc_cutoff)
+        significant = below_pvalue & above_log2fc
+        point_colors = np.full(len(index["log2FC"]), colors['Not significant'], dtype=object)
+        point_colors[significant & (index["log2FC"] > 0)] = colors['Up-regulated']
+        point_colors[significant & (index["log2FC"] < 0)] = colors['Down-regulated']
 
-        # Remove invalid values
-        df_plot_clean = df_plot.dropna(subset=['neg_log10_pvalue', 'log2FC']).copy()
-        
-        # Create Plotly scatter plot (group-wise)
-        fig = go.Figure()
-        
-        colors = {
-            'Up-regulated': 'red',
-            'Down-regulated': 'blue',
-            'Not significant': 'lightgrey'
-        }
-        
+        # All points share one trace, a cutoff change only recolors its markers
+        hover_columns = list(index["hover_columns"])
+        fig = go.Figure(go.Scatter(
+            x=index["log2FC"],
+            y=index["neg_log10_pvalue"],
+            mode='markers',
+            marker=dict(color=point_colors, size=6, opacity=0.8),
+            customdata=index["customdata"],
+            hovertemplate=(
+                "<b>Index: %{customdata[0]}</b><br>"
+                + "".join(f"{col}: %{{customdata[{i + 1}]}}<br>" for i, col in enumerate(hover_columns))
+                + "log2FC: %{x:.3f}<br>-log10(adj.pvalue): %{y:.3f}<extra></extra>"
+            ),
+            showlegend=False
+        ))
+
+        # Legend entries for the groups
         for group_name, color in colors.items():
-            group_data = df_plot_clean[df_plot_clean['color'] == group_name]
-            
-            if len(group_data) > 0:
-                # Build hover text containing full original row metadata
-                hover_texts = []
-                for idx, row in group_data.iterrows():
-                    original_idx = int(row['index'])
-                    original_row = df.iloc[original_idx]
-                    
-                    text_parts = [f"<b>Index: {original_idx}</b>"]
-                    for col in df.columns:
-                        text_parts.append(f"{col}: {original_row[col]}")
-                    text_parts.append(f"<br>-log10(pvalue): {row['neg_log10_pvalue']:.3f}")
-                    
-                    hover_texts.append("<br>".join(text_parts))
-                
-                fig.add_trace(go.Scatter(
-                    x=group_data['log2FC'],
-                    y=group_data['neg_log10_pvalue'],
-                    mode='markers',
-                    name=group_name,
-                    marker=dict(color=color, size=6, opacity=0.8),
-                    customdata=group_data['index'].values.reshape(-1, 1),
-                    hovertext=hover_texts,
-                    hoverinfo='text'
-                ))
+            fig.add_trace(go.Scatter(
+                x=[None],
+                y=[None],
+                mode='markers',
+                name=group_name,
+                marker=dict(color=color, size=6, opacity=0.8)
+            ))
 
         # Add threshold reference lines
         fig.add_hline(y=-np.log10(pvalue_cutoff), line_dash="dash", line_color="grey",
@@ -116,7 +216,8 @@ try:
             xaxis_title="log2 Fold Change",
             yaxis_title="-log10(adj.pvalue)",
             hovermode="closest",
-            showlegend=True
+            showlegend=True,
+            legend=dict(itemclick=False, itemdoubleclick=False)
         )
 
         # Display interactive Plotly chart
@@ -143,6 +244,15 @@ try:
             st.subheader("📌 Selected Data Point")
             st.dataframe(df.iloc[[original_index]], use_container_width=True)
 
+        # Number of significant proteins across all cutoffs
+        with st.expander("📉 Significant proteins vs. cutoff"):
+            fig_p, fig_fc = significance_curves(index, pvalue_cutoff, log2fc_cutoff)
+            cols = st.columns(2)
+            with cols[0]:
+                show_fig(fig_p, "significant-proteins-vs-pvalue-cutoff")
+            with cols[1]:
+                show_fig(fig_fc, "significant-proteins-vs-log2fc-cutoff")
+
     else:
         st.info("Columns 'log2FC' or 'adj.pvalue' not found for volcano plot.")
 
@@ -0,0 +1,91 @@
+from pathlib import Path
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from src.common.common import display_large_dataframe, page_setup, show_fig
+from src.common.nextflow_job import JOB_DIR
+from src.common.trace import REPORT_FILE, TIMELINE_FILE, TRACE_FILE, load_trace, process_summary
+
+# Page setup
+params = page_setup()
+st.title("⏱️ Pipeline Performance")
+
+job_dir = Path(st.session_state.workspace, JOB_DIR)
+trace_file = Path(job_dir, TRACE_FILE)
+if not trace_file.is_file():
+    st.warning("❗ No execution trace found. Please run the analysis first.")
+    st.stop()
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_tasks(trace_file: Path, mtime_ns: int, size: int) -> pd.DataFrame:
+    """
+    Parse the trace file. Cached per modification time and size, the trace grows while the run is active.
+    """
+    return load_trace(trace_file)
+
+
+stat = trace_file.stat()
+tasks = get_tasks(trace_file, stat.st_mtime_ns, stat.st_size)
+if tasks.empty:
+    st.info("No tasks have finished yet.")
+    st.stop()
+summary = process_summary(tasks)
+
+st.info("💡INFO \n\n"
+        "Where the time of the last run went, from the Nextflow trace. Realtime is the execution "
+        "time of a task, queue time the time between its submission and start. Tasks taken from "
+        "the cache of a resumed run are counted, but their time is not.")
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Tasks Executed", f"{summary['executed'].sum():,}", f"{summary['cached'].sum():,} cached", delta_color="off")
+col2.metric("Task Hours", f"{summary['realtime_total_h'].sum():.2f} h")
+col3.metric("CPU Hours", f"{summary['cpu_h'].sum():.2f} h")
+col4.metric("Slowest Process", summary["process"].iloc[0], f"{summary['realtime_share_percent'].iloc[0]:.0f}% of task time", delta_color="off")
+
+st.markdown("### 🐢 Bottlenecks")
+fig = px.bar(
+    summary.iloc[::-1],
+    x=["realtime_total_h", "queue_total_h"],
+    y="process",
+    orientation="h",
+    labels={"value": "Hours", "process": "Process", "variable": ""},
+)
+fig.for_each_trace(lambda t: t.update(name={"realtime_total_h": "Realtime", "queue_total_h": "Queue time"}[t.name]))
+fig.update_layout(height=max(300, 40 * len(summary)), legend=dict(orientation="h"))
+show_fig(fig, "pipeline-bottlenecks")
+
+st.dataframe(
+    summary.round(2),
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "realtime_share_percent": st.column_config.ProgressColumn("Share of Realtime", format="%.1f%%", min_value=0, max_value=100),
+    },
+)
+
+st.markdown("### 💾 Memory and I/O per Task")
+process = st.selectbox("Process", summary["process"], key="performance-process")
+process_tasks = tasks[(tasks["process"] == process) & (tasks["status"] != "CACHED")]
+fig = px.scatter(
+    process_tasks,
+    x="realtime_s",
+    y="peak_rss_mb",
+    size=process_tasks["rchar_mb"].fillna(0) + process_tasks["wchar_mb"].fillna(0) + 1,
+    color="cpu_percent",
+    hover_data=["tag", "queue_s", "rchar_mb", "wchar_mb"],
+    labels={"realtime_s": "Realtime (s)", "peak_rss_mb": "Peak RSS (MB)", "cpu_percent": "%CPU"},
+)
+show_fig(fig, f"pipeline-tasks-{process}")
+
+st.markdown("### 📋 All Tasks")
+display_large_dataframe(tasks, key_prefix="performance-tasks", use_container_width=True)
+
+# The HTML reports of Nextflow, with the full resource usage and timeline of the run
+col1, col2 = st.columns(2)
+for col, name, label in ((col1, REPORT_FILE, "Execution Report"), (col2, TIMELINE_FILE, "Execution Timeline")):
+    report = Path(job_dir, name)
+    if report.is_file():
+        with open(report, "rb") as f:
+            col.download_button(f"Download {label}", f, file_name=f"{st.session_state.workspace.name}-{name}", mime="text/html")
@@ -1,6 +1,7 @@
-from pathlib import Path
 import streamlit as st
-from src.common.common import page_setup
+from src.common.catalog import artifact_paths
+from src.common.common import lazy_tabs, page_setup
+from src.common.quantms_db import database_path, peptide_quant, protein_names, protein_quant, tables
 
 # Page setup
 params = page_setup()
@@ -15,8 +16,8 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-results_dir = Path(st.session_state.workspace, "results")
-png_dir = results_dir / "summarypipeline" / "multiqc_plots" / "png"
+# MultiQC plots of the workspace by file name
+png_files = {f.name: f for f in artifact_paths(st.session_state.workspace, "summarypipeline", "png")}
 
 # Top section files (overview: Heatmap + ms1_tic)
 overview_files = {
@@ -35,8 +36,8 @@ detailed_files = {
 # Overview section
 overview_cols = st.columns(2)
 for i, (png_file, display_name) in enumerate(overview_files.items()):
-    img_path = png_dir / png_file
-    if img_path.exists():
+    img_path = png_files.get(png_file)
+    if img_path is not None:
         with overview_cols[i % 2]:
             st.markdown(
                 f"<h5 style='text-align:center; font-weight:700; font-size:22px;'>{display_name}</h5>",
@@ -52,8 +53,8 @@ st.markdown("<hr style='margin: 30px 0;'>", unsafe_allow_html=True)
 # Detailed section
 detailed_cols = st.columns(2)
 for i, (png_file, display_name) in enumerate(detailed_files.items()):
-    img_path = png_dir / png_file
-    if img_path.exists():
+    img_path = png_files.get(png_file)
+    if img_path is not None:
         with detailed_cols[i % 2]:
             st.markdown(
                 f"<h5 style='text-align:center; font-weight:700; font-size:20px;'>{display_name}</h5>",
@@ -62,4 +63,25 @@ for i, (png_file, display_name) in enumerate(detailed_files.items()):
             st.image(str(img_path), use_container_width=True)
             st.markdown("<br>", unsafe_allow_html=True)
     else:
-        detailed_cols[i % 2].warning(f"{png_file} not found.")
\ No newline at end of file
+        detailed_cols[i % 2].warning(f"{png_file} not found.")
+
+# Quantification section, queried from the pipeline's summary database
+db_file = database_path(st.session_state.workspace)
+if db_file in artifact_paths(st.session_state.workspace, "summarypipeline", "db"):
+    st.markdown("<hr style='margin: 30px 0;'>", unsafe_allow_html=True)
+    st.markdown(
+        "<h5 style='text-align:center; font-weight:700; font-size:22px;'>Quantification Summary</h5>",
+        unsafe_allow_html=True
+    )
+    if not {"PROTQUANT", "PEPQUANT"} <= tables(db_file):
+        st.info("The summary database has no protein and peptide quantification tables.")
+    else:
+        proteins = st.multiselect(
+            "Proteins", protein_names(db_file), placeholder="All proteins", key="pmultiqc-proteins"
+        )
+        selected = lazy_tabs(["🧬 Proteins", "🧪 Peptides"], key="pmultiqc-quant-tab")
+        if selected == 0:
+            st.dataframe(protein_quant(db_file, proteins), use_container_width=True, hide_index=True)
+        else:
+            sequence = st.text_input("Peptide sequence", key="pmultiqc-sequence").strip().upper()
+            st.dataframe(peptide_quant(db_file, proteins, sequence), use_container_width=True, hide_index=True)
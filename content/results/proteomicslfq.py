@@ -2,22 +2,21 @@ from pathlib import Path
 import streamlit as st
 import pandas as pd
 
-from src.common.common import page_setup
+from src.common.catalog import artifact_paths, content_hash, has_step
+from src.common.common import display_large_dataframe, lazy_tabs, page_setup
+from src.common.pagination import csv_to_parquet
+from src.common.quantification import protein_table
 
 # Page setup
 params = page_setup()
 st.title("📊 Quantification Results")
 
-# Path to results folder
-results_dir = Path(st.session_state.workspace, "results")
-proteomicslfq_dir = results_dir / "proteomicslfq"
-
-# Check directory existence
-if not proteomicslfq_dir.exists():
+# Check if the step has any results
+if not has_step(st.session_state.workspace, "proteomicslfq"):
     st.warning("❗ 'proteomicslfq' directory not found. Please run the analysis first.")
     st.stop()
 
-csv_files = sorted(proteomicslfq_dir.glob("*.csv"))
+csv_files = artifact_paths(st.session_state.workspace, "proteomicslfq", "csv")
 
 if not csv_files:
     st.info("No CSV files found in the 'proteomicslfq' directory.")
@@ -26,48 +25,39 @@ if not csv_files:
 # Select the first CSV file
 csv_file = csv_files[0]
 
-# Create tabs for Protein-level and PSM-level tables
-protein_tab, psm_tab = st.tabs(["🧬 Protein Table", "📄 PSM-level Quantification Table"])
 
-try:
-    df = pd.read_csv(csv_file)
-    if df.empty:
-        st.info("No data found in this file.")
-        st.stop()
+@st.cache_data(max_entries=4, show_spinner=False)
+def build_protein_table(csv_file: Path, csv_hash: str) -> pd.DataFrame:
+    """
+    Aggregate the PSM-level table to a protein x sample abundance table (see `protein_table`).
+    Cached per content hash of the CSV file, only the (much smaller) protein table is kept.
+    """
+    return protein_table(pd.read_csv(csv_file))
+
 
+# Create tabs for Protein-level and PSM-level tables, only the selected table is built
+selected = lazy_tabs(["🧬 Protein Table", "📄 PSM-level Quantification Table"], key="proteomicslfq-tab")
+
+try:
     # Raw tab
-    with psm_tab:
+    if selected == 1:
         st.markdown(f"### 📄 PSM-level Quantification Table")
         st.info("💡INFO \n\n This table shows the PSM-level quantification data, including protein IDs,peptide sequences, charge states, and intensities across samples.Each row represents one peptide-spectrum match detected from the MS/MS analysis.")
-        st.dataframe(df, use_container_width=True)
+        # Paged from a Parquet copy of the CSV, the full table is never loaded into memory
+        display_large_dataframe(csv_to_parquet(csv_file), key_prefix="proteomicslfq-psm", use_container_width=True)
 
     # Protein tab
-    with protein_tab:
+    if selected == 0:
         st.markdown("### 🧬 Protein-Level Abundance Table")
         st.info("💡INFO \n\n"
         "This protein-level table is generated by grouping all PSMs that map to the "
         "same protein and aggregating their intensities across samples.\n"
         "It provides an overview of protein abundance rather than individual peptide measurements."
         )
-        # Convert Reference → Sample
-        df['Sample'] = df['Reference'].str.replace('.mzML', '', regex=False)
-
-        # Collect list of all samples
-        all_samples = sorted(df['Sample'].unique())
-
-        pivot_list = []
-
-        # Aggregate PSMs to protein-level table
-        for protein, group in df.groupby('ProteinName'):
-            peptides = ";".join(group['PeptideSequence'].unique())
-            intensity_dict = group.groupby('Sample')['Intensity'].sum().to_dict()
-            intensity_dict_complete = {sample: intensity_dict.get(sample, 0) for sample in all_samples}
-
-            row = {'ProteinName': protein, **intensity_dict_complete, 'PeptideSequence': peptides}
-            pivot_list.append(row)
-
-        pivot_df = pd.DataFrame(pivot_list)
-        pivot_df = pivot_df[['ProteinName'] + all_samples + ['PeptideSequence']]
+        pivot_df = build_protein_table(csv_file, content_hash(st.session_state.workspace, csv_file))
+        if pivot_df.empty:
+            st.info("No data found in this file.")
+            st.stop()
 
         st.dataframe(pivot_df, use_container_width=True)
 
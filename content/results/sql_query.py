@@ -0,0 +1,65 @@
+import streamlit as st
+import duckdb
+
+from src.common.catalog import content_hash
+from src.common.common import available_cpus, display_large_dataframe, page_setup
+from src.common.sql import open_results_db, list_tables, result_files, run_query
+
+# Page setup
+params = page_setup()
+st.title("🗄️ SQL Query")
+
+files = result_files(st.session_state.workspace)
+
+if not files:
+    st.warning("❗ No result files found. Please run the analysis first.")
+    st.stop()
+
+
+@st.cache_resource(max_entries=8, show_spinner="Registering result files...")
+def get_results_db(workspace: str, fingerprint: tuple, parser: str) -> duckdb.DuckDBPyConnection:
+    """
+    Open the results database of a workspace, shared by all sessions. A new database is
+    opened when any result file changes (see `fingerprint`).
+    """
+    return open_results_db(workspace, parser, max_workers=available_cpus())
+
+
+# Path and content hash of every result file
+fingerprint = tuple((str(f), content_hash(st.session_state.workspace, f)) for f in files)
+con = get_results_db(str(st.session_state.workspace), fingerprint, st.session_state.settings["idxml_parser"])
+tables = list_tables(con)
+
+st.info("💡INFO \n\n"
+        "Query all result tables of this workspace with SQL (DuckDB dialect). Filters and aggregations "
+        "are run by the database on columnar copies of the files, only the result is loaded.")
+
+with st.expander("📋 Tables"):
+    for table, columns in tables.items():
+        st.markdown(f"**{table}**: " + ", ".join(f"`{c}`" for c in columns))
+
+with st.form("sql-query-form"):
+    sql = st.text_area(
+        "SQL",
+        value=f"SELECT * FROM {next(iter(tables))} LIMIT 100",
+        height=150,
+        key="sql-query",
+    )
+    submitted = st.form_submit_button("Run Query", type="primary")
+
+if submitted or "sql-query-result" in st.session_state:
+    if submitted:
+        try:
+            st.session_state["sql-query-result"] = run_query(con, sql)
+        except (ValueError, duckdb.Error) as e:
+            st.session_state.pop("sql-query-result", None)
+            st.error(f"Query failed: {e}")
+            st.stop()
+    result = st.session_state["sql-query-result"]
+    st.markdown(f"**{len(result):,} rows**")
+    display_large_dataframe(result, key_prefix="sql-query-result", use_container_width=True)
+    st.download_button(
+        "Download Result",
+        result.to_csv(sep="\t", index=False).encode("utf-8"),
+        "query-result.tsv",
+    )
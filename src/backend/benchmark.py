@@ -0,0 +1,124 @@
+"""
+Benchmark of the Run tab against the stand-in backend: concurrent runs stream their logs at a
+fixed line rate while one simulated session per run follows each log the way the Run tab
+does (see `nextflow_job.follow_log`). Reports the delivered line rate, the time and size of
+the log view updates, how far the views fall behind, and the memory and CPU of this process.
+
+    python -m src.backend.benchmark --runs 4 --line-rate 1000 --lines 20000
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import psutil
+
+from src.backend.stand_in import start_server
+from src.common import backend, nextflow_job
+
+
+def _follow(workspace: Path, done: threading.Event, frames: list[dict]) -> None:
+    """
+    Follow the log of a run like a session of the Run tab, one frame every LOG_VIEW_INTERVAL seconds.
+    """
+    view = deque(maxlen=nextflow_job.LOG_VIEW_LINES)
+    offset = None
+    while not done.is_set():
+        start = time.perf_counter()
+        offset = nextflow_job.follow_log(workspace, view, offset)
+        payload = "\n".join(view)
+        log_size = nextflow_job.log_path(workspace).stat().st_size
+        frames.append({
+            "seconds": time.perf_counter() - start,
+            "payload_bytes": len(payload.encode("utf-8")),
+            "behind_bytes": log_size - offset,
+        })
+        done.wait(nextflow_job.LOG_VIEW_INTERVAL)
+
+
+def run_benchmark(runs: int, line_rate: float, lines: int, results: bool = False, replay: str | None = None) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        runs (int): Concurrent runs, each in its own workspace.
+        line_rate (float): Log lines per second of each run.
+        lines (int): Log lines of each run.
+        results (bool, optional): Let the stand-in write synthetic results trees. Defaults to False.
+        replay (str | None, optional): Recorded log to replay instead of the synthetic log. Defaults to None.
+
+    Returns:
+        dict: The measurements.
+    """
+    server = start_server({"line_rate": line_rate, "lines": lines, "replay": replay, "results": results, "exit_code": 0}, port=0)
+    settings = {**backend.backend_settings(), "url": f"http://127.0.0.1:{server.server_address[1]}"}
+    # Admit all runs at once, the benchmark measures the app and not the queue
+    limits = {"max_concurrent_runs": runs, "cores_per_run": 0, "memory_per_run_gb": 0, "poll_interval": 0.1}
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    cpu_start = process.cpu_times()
+
+    with tempfile.TemporaryDirectory() as workspaces_dir:
+        workspaces = [Path(workspaces_dir, f"benchmark-{i}") for i in range(runs)]
+        done = threading.Event()
+        frames = [[] for _ in workspaces]
+        start = time.monotonic()
+        for workspace in workspaces:
+            workspace.mkdir()
+            nextflow_job.start_job(workspace, "synthetic.sdrf.tsv", "synthetic.fasta", "", "docker", limits,
+                                   resume=False, backend_settings=settings)
+        followers = [threading.Thread(target=_follow, args=(w, done, f), daemon=True) for w, f in zip(workspaces, frames)]
+        for follower in followers:
+            follower.start()
+
+        rss_peak = rss_start
+        while any(nextflow_job.read_job(w)["state"] in nextflow_job.ACTIVE_STATES for w in workspaces):
+            rss_peak = max(rss_peak, process.memory_info().rss)
+            time.sleep(0.1)
+        wall_time = time.monotonic() - start
+        done.set()
+        for follower in followers:
+            follower.join()
+
+        jobs = [nextflow_job.read_job(w) for w in workspaces]
+        delivered = 0
+        for workspace in workspaces:
+            with open(nextflow_job.log_path(workspace), "rb") as f:
+                delivered += sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1024**2), b""))
+
+    server.shutdown()
+    server.server_close()
+    cpu_end = process.cpu_times()
+    frame_times = sorted(f["seconds"] * 1000 for run_frames in frames for f in run_frames)
+    return {
+        "runs": runs,
+        "line_rate_per_run": line_rate,
+        "lines_per_run": lines,
+        "succeeded": sum(job["returncode"] == 0 for job in jobs),
+        "wall_time_s": round(wall_time, 2),
+        "delivered_lines_per_s": round(delivered / wall_time),
+        "frames": len(frame_times),
+        "frame_ms_mean": round(statistics.fmean(frame_times), 2) if frame_times else None,
+        "frame_ms_p95": round(frame_times[int(len(frame_times) * 0.95)], 2) if frame_times else None,
+        "frame_ms_max": round(frame_times[-1], 2) if frame_times else None,
+        "view_payload_kb_max": round(max((f["payload_bytes"] for r in frames for f in r), default=0) / 1024, 1),
+        "view_behind_kb_max": round(max((f["behind_bytes"] for r in frames for f in r), default=0) / 1024, 1),
+        "rss_start_mb": round(rss_start / 1024**2, 1),
+        "rss_peak_mb": round(rss_peak / 1024**2, 1),
+        "cpu_s": round(cpu_end.user + cpu_end.system - cpu_start.user - cpu_start.system, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Run tab against the stand-in backend.")
+    parser.add_argument("--runs", type=int, default=4, help="Concurrent runs.")
+    parser.add_argument("--line-rate", type=float, default=1000, help="Log lines per second of each run.")
+    parser.add_argument("--lines", type=int, default=20_000, help="Log lines of each run.")
+    parser.add_argument("--results", action="store_true", help="Write synthetic results trees.")
+    parser.add_argument("--replay", help="Recorded log to replay instead of the synthetic log.")
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.runs, args.line_rate, args.lines, args.results, args.replay), indent=1))
@@ -0,0 +1,187 @@
+"""
+Local stand-in for the Nextflow backend, to develop, test and benchmark the app without
+Nextflow, Java or Docker.
+
+Implements the /run-nextflow/ endpoint of the backend: it accepts the same request, streams a
+synthetic or recorded quantms log at a configurable line rate, writes a synthetic results tree
+(and the trace, if requested with -with-trace) into the workspace and ends with the exit code
+line the app expects. Run it from the repository root either with the standard library only
+
+    python -m src.backend.stand_in --port 8000 --line-rate 1000
+
+or, with FastAPI installed, as an ASGI app configured by the environment variables below
+
+    uvicorn src.backend.stand_in:app --port 8000
+
+Environment variables:
+    STAND_IN_LINE_RATE: Log lines per second, 0 for as fast as possible. Defaults to 5.
+    STAND_IN_LINES: Lines of the synthetic log. Defaults to 200.
+    STAND_IN_REPLAY: Recorded log to replay instead of the synthetic log. Defaults to none.
+    STAND_IN_RESULTS: Write a synthetic results tree after a successful run (1 or 0). Defaults to 1.
+    STAND_IN_EXIT_CODE: Exit code reported at the end of every run. Defaults to 0.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+from src.backend.synthetic import EXIT_LINE, paced, replay_log, synthetic_log, write_results, write_trace
+
+try:
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel
+
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+
+
+def options_from_env() -> dict:
+    """
+    Get the stand-in options from the STAND_IN_* environment variables.
+    """
+    return {
+        "line_rate": float(os.environ.get("STAND_IN_LINE_RATE", 5)),
+        "lines": int(os.environ.get("STAND_IN_LINES", 200)),
+        "replay": os.environ.get("STAND_IN_REPLAY") or None,
+        "results": os.environ.get("STAND_IN_RESULTS", "1") == "1",
+        "exit_code": int(os.environ.get("STAND_IN_EXIT_CODE", 0)),
+    }
+
+
+def run_log(request: dict, options: dict) -> Iterator[str]:
+    """
+    Stream the log of a run and write its outputs once the log is through.
+
+    Args:
+        request (dict): The /run-nextflow/ request (input_path, database_path, profile, workdir, config_args).
+        options (dict): The stand-in options (see `options_from_env`).
+
+    Yields:
+        str: The log lines, with line breaks.
+    """
+    if options["replay"]:
+        lines = replay_log(options["replay"])
+    else:
+        lines = synthetic_log(options["lines"], f"stand_in_{uuid.uuid4().hex[:8]}")
+    for line in paced(lines, options["line_rate"]):
+        yield line + "\n"
+
+    config_args = request.get("config_args", "")
+    if trace := re.search(r"-with-trace\s+(\S+)", config_args):
+        write_trace(trace.group(1), cached="-resume" in config_args.split())
+    if options["results"] and options["exit_code"] == 0:
+        write_results(request["workdir"], name=Path(request["input_path"]).stem)
+    yield EXIT_LINE.format(options["exit_code"]) + "\n"
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves POST /run-nextflow/ with a chunked text/plain log stream.
+    """
+
+    protocol_version = "HTTP/1.1"
+    options: dict
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/run-nextflow":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for line in run_log(request, self.options):
+                data = line.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        except (ConnectionError, OSError):
+            self.close_connection = True
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = b'{"status": "ok"}'
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_server(options: dict, port: int = 8000, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Start the stand-in backend in a background thread of this process.
+
+    Args:
+        options (dict): The stand-in options (see `options_from_env`).
+        port (int, optional): Port to listen on, 0 for any free port. Defaults to 8000.
+        host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+
+    Returns:
+        ThreadingHTTPServer: The running server, stopped with `shutdown()`.
+    """
+    handler = type("StandInHandler", (_StandInHandler,), {"options": options})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stand-in-backend", daemon=True).start()
+    return server
+
+
+if FASTAPI_AVAILABLE:
+    app = FastAPI(title="Nextflow backend stand-in")
+
+    class RunRequest(BaseModel):
+        input_path: str
+        database_path: str
+        profile: str = "docker"
+        workdir: str
+        config_args: str = ""
+
+    @app.post("/run-nextflow/")
+    def run_nextflow(request: RunRequest) -> StreamingResponse:
+        # A plain generator, run by Starlette in its thread pool as it sleeps between lines
+        return StreamingResponse(run_log(request.model_dump(), options_from_env()), media_type="text/plain; charset=utf-8")
+
+    @app.get("/health")
+    def health() -> dict:
+        return {"status": "ok"}
+
+
+if __name__ == "__main__":
+    defaults = options_from_env()
+    parser = argparse.ArgumentParser(description="Local stand-in for the Nextflow backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--line-rate", type=float, default=defaults["line_rate"], help="Log lines per second, 0 for unlimited.")
+    parser.add_argument("--lines", type=int, default=defaults["lines"], help="Lines of the synthetic log.")
+    parser.add_argument("--replay", default=defaults["replay"], help="Recorded log to replay.")
+    parser.add_argument("--no-results", dest="results", action="store_false", default=defaults["results"],
+                        help="Do not write a synthetic results tree.")
+    parser.add_argument("--exit-code", type=int, default=defaults["exit_code"])
+    args = parser.parse_args()
+    server = start_server(
+        {k: getattr(args, k) for k in ("line_rate", "lines", "replay", "results", "exit_code")}, args.port, args.host
+    )
+    print(f"Stand-in Nextflow backend listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
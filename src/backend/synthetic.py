@@ -0,0 +1,246 @@
+"""
+Synthetic Nextflow logs, traces and quantms results for the stand-in backend.
+"""
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+from xml.sax.saxutils import quoteattr
+
+# Processes of a quantms LFQ run, in the order they finish, with the results directory they write
+PROCESSES = (
+    ("SDRF_PARSING", None),
+    ("FILE_PREPARATION:THERMORAWFILEPARSER", None),
+    ("DECOYDATABASE", None),
+    ("LFQ:ID:DATABASESEARCHENGINES:SEARCHENGINECOMET", None),
+    ("LFQ:ID:PSMRESCORING:EXTRACTPSMFEATURES", None),
+    ("LFQ:ID:PSMRESCORING:PERCOLATOR", None),
+    ("LFQ:ID:PSMFDRCONTROL:IDSCORESWITCHER", None),
+    ("LFQ:ID:PSMFDRCONTROL:IDFILTER", "idfilter"),
+    ("LFQ:PROTEOMICSLFQ", "proteomicslfq"),
+    ("LFQ:MSSTATS_LFQ", "msstats"),
+    ("SUMMARYPIPELINE", "summarypipeline"),
+)
+
+# Line with the exit code that ends the log stream of the backend
+EXIT_LINE = "[Process exited with code {}]"
+
+_AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+_CONDITIONS = ("blood plasma|control", "blood plasma|case")
+
+
+def _task_hash(rng: random.Random) -> str:
+    return f"{rng.randrange(16**2):02x}/{rng.randrange(16**6):06x}"
+
+
+def synthetic_log(lines: int, run_name: str, runs: int = 6, seed: int = 0) -> Iterator[str]:
+    """
+    Generate a quantms log with the header of Nextflow and progress lines of all processes.
+
+    Args:
+        lines (int): Total number of lines.
+        run_name (str): Run name announced in the "Launching" line.
+        runs (int, optional): MS runs, i.e. tasks per per-run process. Defaults to 6.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Yields:
+        str: The lines, without line breaks.
+    """
+    rng = random.Random(seed)
+    header = [
+        "N E X T F L O W  ~  version 24.04.4",
+        f"Launching `nf-core/quantms` [{run_name}] DSL2 - revision: stand-in",
+    ]
+    yield from header[:lines]
+    for i in range(lines - len(header)):
+        process, _ = PROCESSES[i * len(PROCESSES) // max(lines - len(header), 1)]
+        done = min(i % (runs + 1), runs)
+        yield (
+            f"[{_task_hash(rng)}] process > NFCORE_QUANTMS:QUANTMS:{process} (sample_{done + 1}) "
+            f"[{done * 100 // runs:3d}%] {done} of {runs}"
+        )
+
+
+def replay_log(log_file: str | Path) -> Iterator[str]:
+    """
+    Read a recorded log, leaving out the exit code line of the backend.
+    """
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.startswith(EXIT_LINE.split("{")[0]):
+                yield line
+
+
+def paced(lines: Iterable[str], line_rate: float) -> Iterator[str]:
+    """
+    Yield lines at a fixed rate (lines per second), catching up after delays instead of drifting.
+    A rate of 0 or less yields them as fast as possible.
+    """
+    start = time.monotonic()
+    for i, line in enumerate(lines):
+        if line_rate > 0:
+            delay = start + i / line_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield line
+
+
+def write_trace(trace_file: str | Path, runs: int = 6, cached: bool = False, seed: int = 0) -> None:
+    """
+    Write a Nextflow trace (default fields, human-readable values) with one task per run of
+    every per-run process and one task of every other process.
+
+    Args:
+        trace_file (str | Path): Path to the trace file.
+        runs (int, optional): MS runs. Defaults to 6.
+        cached (bool, optional): Mark the tasks of the first half of the processes as cached, as
+            in a resumed run. Defaults to False.
+        seed (int, optional): Random seed. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    rows = ["task_id\thash\tnative_id\tname\tstatus\texit\tsubmit\tduration\trealtime\t%cpu\tpeak_rss\tpeak_vmem\trchar\twchar"]
+    task_id = 0
+    for index, (process, _) in enumerate(PROCESSES):
+        per_run = ":ID:" in process or process.endswith("THERMORAWFILEPARSER")
+        for run in range(runs if per_run else 1):
+            task_id += 1
+            realtime = rng.uniform(5, 1800)
+            queue = rng.uniform(0, 300)
+            rows.append("\t".join([
+                str(task_id),
+                _task_hash(rng),
+                str(10_000 + task_id),
+                f"NFCORE_QUANTMS:QUANTMS:{process} (sample_{run + 1})",
+                "CACHED" if cached and index < len(PROCESSES) // 2 else "COMPLETED",
+                "0",
+                time.strftime("%Y-%m-%d %H:%M:%S.000"),
+                f"{(realtime + queue) / 60:.0f}m {(realtime + queue) % 60:.1f}s",
+                f"{realtime / 60:.0f}m {realtime % 60:.1f}s",
+                f"{rng.uniform(80, 790):.1f}%",
+                f"{rng.uniform(0.1, 12):.1f} GB",
+                f"{rng.uniform(1, 16):.1f} GB",
+                f"{rng.uniform(10, 4000):.0f} MB",
+                f"{rng.uniform(1, 900):.0f} MB",
+            ]))
+    Path(trace_file).parent.mkdir(parents=True, exist_ok=True)
+    Path(trace_file).write_text("\n".join(rows) + "\n")
+
+
+def _idxml(proteins: list[str], psms: list[tuple[str, int, float, float, float, list[int]]]) -> str:
+    """
+    Build an idXML document with one identification run.
+    """
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<IdXML version="1.5">',
+        '\t<SearchParameters id="SP_0" db="synthetic.fasta" db_version="" taxonomy="" mass_type="monoisotopic" charges="" '
+        'enzyme="trypsin" missed_cleavages="2" precursor_peak_tolerance="10" precursor_peak_tolerance_ppm="true" '
+        'peak_mass_tolerance="0.02" peak_mass_tolerance_ppm="false" >',
+        "\t</SearchParameters>",
+        '\t<IdentificationRun date="2026-01-01T00:00:00" search_engine="Comet" search_engine_version="stand-in" search_parameters_ref="SP_0" >',
+        '\t\t<ProteinIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.01" >',
+    ]
+    lines += [f'\t\t\t<ProteinHit id="PH_{i}" accession={quoteattr(a)} score="0.0" sequence="" >\n\t\t\t</ProteinHit>' for i, a in enumerate(proteins)]
+    lines.append("\t\t</ProteinIdentification>")
+    for sequence, charge, score, mz, rt, refs in psms:
+        lines += [
+            f'\t\t<PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.01" MZ="{mz:.6f}" RT="{rt:.3f}" >',
+            f'\t\t\t<PeptideHit score="{score:.6f}" sequence="{sequence}" charge="{charge}" protein_refs="{" ".join(f"PH_{r}" for r in refs)}" >',
+            "\t\t\t</PeptideHit>",
+            "\t\t</PeptideIdentification>",
+        ]
+    lines += ["\t</IdentificationRun>", "</IdXML>"]
+    return "\n".join(lines) + "\n"
+
+
+def write_results(
+    workdir: str | Path, name: str = "synthetic.sdrf", runs: int = 6, proteins: int = 100, psms_per_run: int = 1_000, seed: int = 0
+) -> None:
+    """
+    Write a synthetic quantms results tree into a workspace, with the files the results pages
+    read: PSMs (idfilter idXML per run), the MSstats input (proteomicslfq), the MSstats group
+    comparison (msstats) and the quantms.db (summarypipeline).
+
+    Args:
+        workdir (str | Path): The workspace.
+        name (str, optional): Experimental design name, the prefix of the table files. Defaults to "synthetic.sdrf".
+        runs (int, optional): MS runs, half of them in each condition. Defaults to 6.
+        proteins (int, optional): Proteins. Defaults to 100.
+        psms_per_run (int, optional): PSMs per run. Defaults to 1,000.
+        seed (int, optional): Random seed. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    results = Path(workdir, "results")
+    for _, directory in PROCESSES:
+        if directory:
+            Path(results, directory).mkdir(parents=True, exist_ok=True)
+
+    accessions = [f"sp|SYN{i:05d}|SYN{i}_HUMAN" for i in range(proteins)]
+    peptides = [
+        ("".join(rng.choice(_AMINO_ACIDS) for _ in range(rng.randint(7, 20))) + rng.choice("KR"), rng.randrange(proteins))
+        for _ in range(proteins * 5)
+    ]
+    run_names = [f"{i + 1:02d}SYN" for i in range(runs)]
+
+    quant_rows = ["ProteinName,PeptideSequence,PrecursorCharge,FragmentIon,ProductCharge,IsotopeLabelType,Condition,BioReplicate,Run,Intensity,Reference"]
+    for run_index, run in enumerate(run_names):
+        psms = []
+        for _ in range(psms_per_run):
+            sequence, protein = rng.choice(peptides)
+            psms.append((sequence, rng.randint(2, 4), rng.uniform(0, 0.01), rng.uniform(400, 1200), rng.uniform(60, 3600), [protein]))
+        Path(results, "idfilter", f"{run}_comet_feat_clean_perc_pep_idfilter.idXML").write_text(
+            _idxml(accessions, psms), encoding="utf-8"
+        )
+        condition = _CONDITIONS[run_index % 2]
+        for sequence, protein in peptides[: proteins * 2]:
+            quant_rows.append(
+                f'{accessions[protein]},{sequence},2,NA,0,L,{condition},{run_index + 1},{run_index + 1},'
+                f'{rng.lognormvariate(18, 1.5):.6e},"{run}.mzML"'
+            )
+    Path(results, "proteomicslfq", f"{name}_openms_design_msstats_in.csv").write_text("\n".join(quant_rows) + "\n")
+
+    comparison_rows = ["\t".join(["Protein", "Label", "log2FC", "SE", "Tvalue", "DF", "pvalue", "adj.pvalue", "issue",
+                                  "MissingPercentage", "ImputationPercentage", *_CONDITIONS])]
+    for accession in accessions:
+        log2fc = rng.gauss(0, 1.5)
+        pvalue = min(1.0, 10 ** -abs(log2fc * rng.uniform(0.5, 3)))
+        comparison_rows.append("\t".join(map(str, [
+            accession, f"{_CONDITIONS[1]}-{_CONDITIONS[0]}", round(log2fc, 6), round(rng.uniform(0.1, 1), 6),
+            round(log2fc / 0.5, 6), 4, pvalue, min(1.0, pvalue * proteins), "NA", 0, 0, 0, 0,
+        ])))
+    Path(results, "msstats", f"{name}_openms_design_msstats_in_comparisons.csv").write_text("\n".join(comparison_rows) + "\n")
+
+    db_file = Path(results, "summarypipeline", "quantms.db")
+    db_file.unlink(missing_ok=True)
+    con = sqlite3.connect(db_file)
+    try:
+        conditions = ", ".join(f'"{c}" VARCHAR' for c in _CONDITIONS)
+        con.execute(
+            "CREATE TABLE PEPQUANT(PeptideID INT(100) PRIMARY KEY, PeptideSequence VARCHAR(100), Modification VARCHAR(100), "
+            f'ProteinName VARCHAR(100), BestSearchScore FLOAT(4,3), "Average Intensity" FLOAT(4,3), {conditions})'
+        )
+        con.execute(
+            "CREATE TABLE PROTQUANT(ProteinID INT(100), ProteinName VARCHAR(100), Peptides_Number INT(100), "
+            f'"Average Intensity" VARCHAR, {conditions})'
+        )
+        con.executemany(
+            "INSERT INTO PEPQUANT VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (i, sequence, "", accessions[protein], rng.uniform(0, 0.01), intensity := rng.lognormvariate(18, 1.5),
+                 str(intensity * rng.uniform(0.5, 1.5)), str(intensity * rng.uniform(0.5, 1.5)))
+                for i, (sequence, protein) in enumerate(peptides)
+            ],
+        )
+        con.executemany(
+            "INSERT INTO PROTQUANT VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (i, accession, 5, str(intensity := rng.lognormvariate(20, 1.5)),
+                 str(intensity * rng.uniform(0.5, 1.5)), str(intensity * rng.uniform(0.5, 1.5)))
+                for i, accession in enumerate(accessions)
+            ],
+        )
+        con.commit()
+    finally:
+        con.close()
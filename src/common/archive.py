@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from src.common.catalog import artifacts, build_catalog
+from src.common.common import available_cpus
+
+# Extensions of formats that are compressed already (or barely shrink), stored instead of deflated
+STORED_SUFFIXES = (".png", ".jpg", ".jpeg", ".pdf", ".gz", ".zip", ".bz2", ".xz", ".db", ".sqlite", ".parquet")
+
+# Compression level of deflated members
+DEFLATE_LEVEL = 6
+
+# Bytes read from a file at once
+CHUNK_SIZE = 1024**2
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Sizes and offsets from this value on are stored in a ZIP64 extra field
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+# Value of a header field whose actual value is in the ZIP64 extra field
+_ZIP64_MARKER = 0xFFFFFFFF
+
+# General purpose flag: file names are UTF-8
+_UTF8_FLAG = 0x0800
+
+
+def manifest_path(zip_path: Path) -> Path:
+    """
+    Get the path of the manifest describing the members of an archive.
+    """
+    return zip_path.with_name(zip_path.name + ".manifest.json")
+
+
+def _dos_time(mtime_ns: int) -> tuple[int, int]:
+    """
+    Convert a modification time to the (time, date) fields of a ZIP header.
+    """
+    t = time.localtime(max(mtime_ns // 10**9, 315532800))
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def _field(value: int) -> int:
+    """
+    Get the value of a 32-bit size or offset header field, which is the ZIP64 marker for large values.
+    """
+    return _ZIP64_MARKER if value >= _ZIP64_LIMIT else value
+
+
+def local_header(name: str, member: dict) -> bytes:
+    """
+    Build the local file header of an archive member.
+
+    Args:
+        name (str): Name of the member in the archive.
+        member (dict): Method, crc, size, compressed_size and mtime_ns of the member.
+
+    Returns:
+        bytes: The header, followed by the member data in the archive.
+    """
+    encoded = name.encode("utf-8")
+    zip64 = member["size"] >= _ZIP64_LIMIT or member["compressed_size"] >= _ZIP64_LIMIT
+    extra = struct.pack("<HHQQ", 1, 16, member["size"], member["compressed_size"]) if zip64 else b""
+    return struct.pack(
+        "<IHHHHHIIIHH",
+        0x04034B50,
+        45 if zip64 else 20,
+        _UTF8_FLAG,
+        member["method"],
+        *_dos_time(member["mtime_ns"]),
+        member["crc"],
+        _ZIP64_MARKER if zip64 else member["compressed_size"],
+        _ZIP64_MARKER if zip64 else member["size"],
+        len(encoded),
+        len(extra),
+    ) + encoded + extra
+
+
+def central_directory(members: dict[str, dict], offset: int) -> bytes:
+    """
+    Build the central directory and end records of an archive.
+
+    Args:
+        members (dict[str, dict]): Member names mapped to their method, crc, size, compressed_size,
+            mtime_ns and header_offset, in archive order.
+        offset (int): Position of the central directory in the archive.
+
+    Returns:
+        bytes: The end of the archive.
+    """
+    records = []
+    for name, member in members.items():
+        encoded = name.encode("utf-8")
+        # ZIP64 extra field values, in the order defined by the format
+        zip64_values = [
+            v for v in (member["size"], member["compressed_size"], member["header_offset"]) if v >= _ZIP64_LIMIT
+        ]
+        extra = struct.pack(f"<HH{len(zip64_values)}Q", 1, 8 * len(zip64_values), *zip64_values) if zip64_values else b""
+        records.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            (3 << 8) | 45,
+            45 if zip64_values else 20,
+            _UTF8_FLAG,
+            member["method"],
+            *_dos_time(member["mtime_ns"]),
+            member["crc"],
+            _field(member["compressed_size"]),
+            _field(member["size"]),
+            len(encoded),
+            len(extra),
+            0,
+            0,
+            0,
+            0o100644 << 16,
+            _field(member["header_offset"]),
+        ) + encoded + extra)
+    directory = b"".join(records)
+
+    end = b""
+    count, size = len(members), len(directory)
+    if count >= 0xFFFF or size >= _ZIP64_LIMIT or offset >= _ZIP64_LIMIT:
+        end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, size, offset)
+        end += struct.pack("<IIQI", 0x07064B50, 0, offset + size, 1)
+    end += struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        _field(size), _field(offset), 0,
+    )
+    return directory + end
+
+
+def _compress(file: Path, method: int, tmp_dir: str) -> dict:
+    """
+    Compute the CRC of a file and, if it is deflated, compress it to a temporary file.
+
+    Runs on a worker thread, zlib releases the GIL while compressing and checksumming.
+    """
+    crc, size, compressed_size = 0, 0, 0
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15) if method == ZIP_DEFLATED else None
+    out = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) if compressor else None
+    with open(file, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if compressor:
+                compressed_size += out.write(compressor.compress(chunk))
+    if compressor:
+        compressed_size += out.write(compressor.flush())
+        out.close()
+    return {
+        "method": method,
+        "crc": crc,
+        "size": size,
+        "compressed_size": compressed_size if compressor else size,
+        "data_file": out.name if compressor else str(file),
+    }
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, length: int) -> None:
+    """
+    Copy `length` bytes starting at `offset` of one file to the current position of another.
+    """
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise EOFError("Unexpected end of the previous archive.")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def build_archive(workspace: str | Path, zip_path: Path | None = None, max_workers: int | None = None) -> Path:
+    """
+    Build the ZIP archive of the results of a workspace.
+
+    Members are listed from the artifact catalog, which must be up to date. Members whose
+    content hash is unchanged since the previous archive (see the manifest next to it) are
+    copied from it without recompressing. New and changed members are compressed on a thread
+    pool, formats that are compressed already (STORED_SUFFIXES) are stored as they are.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        zip_path (Path | None, optional): Path to the archive. Defaults to "results.zip" in the workspace.
+        max_workers (int | None, optional): Maximum number of compression threads. Defaults to the available CPUs.
+
+    Returns:
+        Path: Path to the archive.
+    """
+    workspace = Path(workspace)
+    zip_path = zip_path or Path(workspace, "results.zip")
+    files = {
+        Path(a["path"]).relative_to("results").as_posix(): a
+        for a in artifacts(workspace)
+        if Path(a["path"]).parts[0] == "results"
+    }
+
+    try:
+        with open(manifest_path(zip_path), "r") as f:
+            previous = json.load(f) if zip_path.exists() else {}
+    except (OSError, ValueError):
+        previous = {}
+    reused = {name: previous[name] for name, a in files.items() if name in previous and previous[name]["hash"] == a["hash"]}
+
+    tmp_zip = zip_path.with_name(f".{zip_path.name}.{os.getpid()}.tmp")
+    try:
+        with tempfile.TemporaryDirectory(dir=zip_path.parent) as tmp_dir:
+            with ThreadPoolExecutor(max_workers=max_workers or available_cpus()) as executor:
+                futures = {
+                    name: executor.submit(
+                        _compress,
+                        Path(workspace, a["path"]),
+                        ZIP_STORED if Path(name).suffix.lower() in STORED_SUFFIXES else ZIP_DEFLATED,
+                        tmp_dir,
+                    )
+                    for name, a in files.items()
+                    if name not in reused
+                }
+
+                manifest = {}
+                with open(tmp_zip, "wb") as out, open(zip_path if reused else os.devnull, "rb") as old:
+                    for name, a in files.items():
+                        member = dict(reused[name]) if name in reused else futures[name].result()
+                        member.update(hash=a["hash"], mtime_ns=a["mtime_ns"], header_offset=out.tell())
+                        out.write(local_header(name, member))
+                        data_offset = out.tell()
+                        if name in reused:
+                            _copy_range(old, out, member["data_offset"], member["compressed_size"])
+                        else:
+                            with open(member.pop("data_file"), "rb") as data:
+                                shutil.copyfileobj(data, out, CHUNK_SIZE)
+                        member["data_offset"] = data_offset
+                        manifest[name] = member
+                    out.write(central_directory(manifest, out.tell()))
+    except BaseException:
+        tmp_zip.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_zip, zip_path)
+    with open(manifest_path(zip_path), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return zip_path
+
+
+# CRC-32 checksums of files by content hash, computed once per process for streamed archives
+_crcs: dict[str, int] = {}
+
+
+def _results_artifacts(workspace: Path, steps: list[str]) -> dict[str, dict]:
+    """
+    Get the catalog entries of the results of a workspace by their path in the archive.
+    """
+    return {
+        Path(a["path"]).relative_to("results").as_posix(): a
+        for a in artifacts(workspace)
+        if Path(a["path"]).parts[0] == "results" and (not steps or a["step"] in steps)
+    }
+
+
+def _is_stale(workspace: Path, artifact: dict) -> bool:
+    """
+    Check whether a file was changed or deleted since its catalog entry was made.
+    """
+    try:
+        stat = Path(workspace, artifact["path"]).stat()
+    except OSError:
+        return True
+    return stat.st_size != artifact["size"] or stat.st_mtime_ns != artifact["mtime_ns"]
+
+
+def stream_layout(
+    workspace: str | Path, steps: list[str] = [], max_workers: int | None = None
+) -> tuple[list[tuple[bytes | Path, int]], str]:
+    """
+    Lay out an archive of the results of a workspace that is generated while it is downloaded.
+
+    All members are stored uncompressed, so the size and content of every byte of the archive
+    are known up front and any byte range can be generated independently (resumable downloads).
+    Only the CRC-32 checksums have to be computed beforehand, on a thread pool and once per
+    file content. Every member is checked against its catalog entry first, and the catalog is
+    rebuilt if a file changed since it was catalogued, so sizes and checksums are current.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        steps (list[str], optional): Steps (results subdirectories) to include. Defaults to [] (all steps).
+        max_workers (int | None, optional): Maximum number of checksum threads. Defaults to the available CPUs.
+
+    Returns:
+        tuple[list[tuple[bytes | Path, int]], str]: The segments of the archive, each header or
+            directory bytes or a file to copy with its length, and an ETag identifying the content.
+    """
+    workspace = Path(workspace)
+    files = _results_artifacts(workspace, steps)
+    if any(_is_stale(workspace, a) for a in files.values()):
+        build_catalog(workspace, ("results",))
+        files = _results_artifacts(workspace, steps)
+
+    missing = {a["hash"]: Path(workspace, a["path"]) for a in files.values() if a["hash"] not in _crcs}
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers or available_cpus()) as executor:
+            for content_hash, result in zip(missing, executor.map(lambda f: _compress(f, ZIP_STORED, ""), missing.values())):
+                _crcs[content_hash] = result["crc"]
+
+    segments, members, offset = [], {}, 0
+    for name, a in files.items():
+        member = {
+            "method": ZIP_STORED,
+            "crc": _crcs[a["hash"]],
+            "size": a["size"],
+            "compressed_size": a["size"],
+            "mtime_ns": a["mtime_ns"],
+            "header_offset": offset,
+        }
+        header = local_header(name, member)
+        segments += [(header, len(header)), (Path(workspace, a["path"]), a["size"])]
+        members[name] = member
+        offset += len(header) + a["size"]
+    directory = central_directory(members, offset)
+    segments.append((directory, len(directory)))
+
+    etag = hashlib.sha256("".join(f"{n}:{a['hash']}:{a['mtime_ns']};" for n, a in files.items()).encode()).hexdigest()[:32]
+    return segments, etag
+
+
+def read_range(
+    segments: list[tuple[bytes | Path, int]], start: int, end: int, chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Generate a byte range of an archive laid out by `stream_layout` in chunks of at most `chunk_size` bytes.
+
+    Args:
+        segments (list[tuple[bytes | Path, int]]): The segments of the archive.
+        start (int): First byte of the range.
+        end (int): Position after the last byte of the range.
+        chunk_size (int, optional): Maximum size of the generated chunks. Defaults to CHUNK_SIZE.
+
+    Yields:
+        bytes: The next chunk of the range.
+    """
+    position = 0
+    for data, length in segments:
+        segment_start, position = position, position + length
+        if position <= start:
+            continue
+        if segment_start >= end:
+            break
+        low, high = max(start, segment_start) - segment_start, min(end, position) - segment_start
+        if isinstance(data, bytes):
+            for i in range(low, high, chunk_size):
+                yield data[i:min(i + chunk_size, high)]
+            continue
+        with open(data, "rb") as f:
+            f.seek(low)
+            while low < high:
+                chunk = f.read(min(chunk_size, high - low))
+                if not chunk:
+                    raise OSError(f"{data} changed while it was downloaded.")
+                low += len(chunk)
+                yield chunk
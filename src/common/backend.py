@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Settings of the Nextflow backend client, overridden by "nextflow_backend" in settings.json
+DEFAULT_SETTINGS = {
+    # Base URL of the backend, e.g. "http://host.docker.internal:8000" from inside the app container
+    "url": "http://localhost:8000",
+    # Seconds to establish a connection
+    "connect_timeout": 10,
+    # Seconds the backend may stay silent while a run streams its log
+    "read_timeout": 3600,
+    # Attempts to submit a run again when no connection to the backend could be established
+    "retries": 3,
+    # Waits between submission attempts grow as backoff_factor * 2^attempt seconds
+    "backoff_factor": 1.0,
+    # Maximum bytes read from the log stream at once
+    "chunk_size": 64 * 1024,
+    # Connections kept open to the backend
+    "pool_size": 10,
+}
+
+# Last line of the log stream, with the exit code of Nextflow
+_EXIT_PREFIX = "[Process exited with code"
+
+# Pooled sessions of this process per client settings
+_sessions: dict[tuple, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def backend_settings(settings_file: str = "settings.json") -> dict:
+    """
+    Get the backend client settings from the app settings file, completed by DEFAULT_SETTINGS.
+
+    The file is read instead of the session state because runs are submitted from background threads.
+    """
+    try:
+        with open(settings_file, "r") as f:
+            settings = json.load(f).get("nextflow_backend", {})
+    except (OSError, ValueError):
+        settings = {}
+    return {**DEFAULT_SETTINGS, **settings}
+
+
+def get_session(settings: dict) -> requests.Session:
+    """
+    Get the pooled HTTP session of this process for the given client settings.
+
+    Submissions are retried with exponential backoff only when no connection could be
+    established, i.e. when the request can not have reached the backend. Error responses are
+    not retried: a gateway error (e.g. 504 from a proxy) may come after the request was
+    forwarded and the run started. Neither are failures while the log is streamed, as that
+    would start the run a second time.
+
+    Args:
+        settings (dict): Client settings (see `backend_settings`).
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    key = (settings["retries"], settings["backoff_factor"], settings["pool_size"])
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = Retry(
+                total=settings["retries"],
+                connect=settings["retries"],
+                read=0,
+                status=0,
+                other=0,
+                allowed_methods=frozenset({"GET", "POST"}),
+                backoff_factor=settings["backoff_factor"],
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings["pool_size"], max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+    return session
+
+
+def run_nextflow(
+    input_path: str,
+    database_path: str,
+    workdir: str,
+    config_args: str,
+    profile: str = "docker",
+    settings: dict | None = None,
+) -> Iterator[tuple[str, str | int]]:
+    """
+    Start a quantms run on the Nextflow backend and stream its log.
+
+    Args:
+        input_path (str): Path to the SDRF file.
+        database_path (str): Path to the FASTA file.
+        workdir (str): The workspace of the run.
+        config_args (str): Additional Nextflow options and pipeline parameters.
+        profile (str, optional): Nextflow execution profile. Defaults to "docker".
+        settings (dict | None, optional): Client settings. Defaults to None (`backend_settings()`).
+
+    Yields:
+        tuple[str, str | int]: ("log_update", line) for each log line and finally
+            ("returncode", exit code). A failed submission or an interrupted stream yields a
+            "log_update" with the error and no return code.
+    """
+    settings = settings or backend_settings()
+    data = {
+        "input_path": input_path,
+        "database_path": database_path,
+        "profile": profile,
+        "workdir": str(workdir),
+        "config_args": config_args,
+    }
+    start = time.monotonic()
+    try:
+        with get_session(settings).post(
+            f"{settings['url'].rstrip('/')}/run-nextflow/",
+            json=data,
+            stream=True,
+            timeout=(settings["connect_timeout"], settings["read_timeout"]),
+        ) as r:
+            if r.status_code != 200:
+                yield ("log_update", f"Execution failed: {r.status_code} {r.text}")
+                return
+            # The log is UTF-8, also when the response does not declare a charset
+            r.encoding = "utf-8"
+            for line in r.iter_lines(chunk_size=settings["chunk_size"], decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith(_EXIT_PREFIX):
+                    yield ("returncode", int(line.strip().split()[-1].replace("]", "")))
+                else:
+                    yield ("log_update", line)
+    except requests.RequestException as e:
+        yield ("log_update", f"Execution failed after {time.monotonic() - start:.0f} seconds: {e}")
@@ -0,0 +1,88 @@
+"""
+Benchmark of the protein table of the quantification page: the vectorized aggregation
+(`quantification.protein_table`) against the per-protein loop it replaced. Both are run on a
+synthetic PSM table, or on a proteomicslfq CSV, and their outputs are checked to be equal.
+
+    python -m src.common.benchmark_protein_table --psms 300000 --proteins 10000 --samples 100
+    python -m src.common.benchmark_protein_table --csv <workspace>/results/proteomicslfq/out.csv
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.common.quantification import protein_table
+
+
+def loop_protein_table(psms: pd.DataFrame) -> pd.DataFrame:
+    """
+    The protein table as built before, with a Python loop over the proteins.
+    """
+    psms = psms.assign(Sample=psms["Reference"].str.replace(".mzML", "", regex=False))
+    all_samples = sorted(psms["Sample"].unique())
+    pivot_list = []
+    for protein, group in psms.groupby("ProteinName"):
+        peptides = ";".join(group["PeptideSequence"].unique())
+        intensity_dict = group.groupby("Sample")["Intensity"].sum().to_dict()
+        intensity_dict_complete = {sample: intensity_dict.get(sample, 0) for sample in all_samples}
+        pivot_list.append({"ProteinName": protein, **intensity_dict_complete, "PeptideSequence": peptides})
+    pivot_df = pd.DataFrame(pivot_list)
+    return pivot_df[["ProteinName"] + all_samples + ["PeptideSequence"]]
+
+
+def synthetic_psms(psms: int, proteins: int, samples: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a random PSM-level table with the columns the protein table is built from.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "ProteinName": [f"sp|P{i:05d}|PROT" for i in rng.integers(0, proteins, psms)],
+        "PeptideSequence": [f"PEPTIDE{i}K" for i in rng.integers(0, proteins * 6, psms)],
+        "Reference": [f"sample_{i}.mzML" for i in rng.integers(0, samples, psms)],
+        "Intensity": rng.random(psms) * 1e8,
+    })
+
+
+def run_benchmark(psms: pd.DataFrame, repeat: int = 1) -> dict:
+    """
+    Time both implementations on a PSM table and check that they give the same table.
+
+    Args:
+        psms (pd.DataFrame): PSM-level table.
+        repeat (int, optional): Runs of each implementation, the fastest one counts. Defaults to 1.
+
+    Returns:
+        dict: The table size and the seconds of each implementation.
+    """
+    timings = {}
+    tables = {}
+    for name, build in (("loop", loop_protein_table), ("vectorized", protein_table)):
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tables[name] = build(psms)
+            seconds.append(time.perf_counter() - start)
+        timings[name] = min(seconds)
+    pd.testing.assert_frame_equal(tables["loop"], tables["vectorized"], check_dtype=False)
+    return {
+        "psms": len(psms),
+        "proteins": len(tables["vectorized"]),
+        "samples": tables["vectorized"].shape[1] - 2,
+        "loop_s": round(timings["loop"], 3),
+        "vectorized_s": round(timings["vectorized"], 3),
+        "speedup": round(timings["loop"] / timings["vectorized"], 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the protein table of the quantification page.")
+    parser.add_argument("--csv", help="proteomicslfq CSV to use instead of a synthetic table.")
+    parser.add_argument("--psms", type=int, default=300_000, help="PSMs of the synthetic table.")
+    parser.add_argument("--proteins", type=int, default=10_000, help="Proteins of the synthetic table.")
+    parser.add_argument("--samples", type=int, default=100, help="Samples of the synthetic table.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each implementation.")
+    args = parser.parse_args()
+    psms = pd.read_csv(args.csv) if args.csv else synthetic_psms(args.psms, args.proteins, args.samples)
+    print(json.dumps(run_benchmark(psms, args.repeat), indent=1))
@@ -0,0 +1,352 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from src.common.common import file_hash
+
+# Catalog file in the workspace directory
+CATALOG_FILE = "catalog.json"
+
+# Workspace directories whose files are catalogued
+CATALOG_DIRS = ("results", "sdrf-files", "fasta-files")
+
+# Artifact types with one file per MS run, named "<run>_<step>..."
+RUN_TYPES = ("idXML", "mzML", "featureXML")
+
+# Seconds without further changes before the file watcher refreshes the catalog
+REFRESH_DELAY = 2.0
+
+# Workspaces watched at once by this process, each uses up to four inotify instances of the
+# per-user limit (fs.inotify.max_user_instances, often 128); the least recently used is evicted
+MAX_WATCHED_WORKSPACES = 8
+
+# Seconds after which the watcher of a workspace whose catalog was not loaded is stopped
+WATCH_IDLE_TIMEOUT = 600
+
+# Minimum seconds between rescans of a workspace that could not be watched
+RESCAN_INTERVAL = 10.0
+
+# Serializes catalog writes of all threads of this process
+_write_lock = threading.Lock()
+
+# Catalogs read by this process, with the mtime of the catalog file they were read from
+_loaded: dict[Path, tuple[int, dict]] = {}
+
+# File watcher shared by all workspaces, and the watched workspaces, least recently used first
+_observer: Observer | None = None
+_watchers: dict[Path, "_CatalogWatcher"] = {}
+_watchers_lock = threading.Lock()
+
+# Time of the last full scan of each workspace by this process
+_scanned: dict[Path, float] = {}
+
+
+def _is_catalogued(relative_path: Path) -> bool:
+    """
+    Check whether a file (relative to the workspace) belongs in the catalog. Hidden and temporary
+    files and the columnar caches written by the results pages are left out.
+    """
+    return (
+        len(relative_path.parts) > 1
+        and relative_path.parts[0] in CATALOG_DIRS
+        and not any(part.startswith(".") for part in relative_path.parts)
+        and relative_path.suffix != ".parquet"
+    )
+
+
+def _artifact(workspace: Path, file: Path, stat: os.stat_result, previous: dict | None) -> dict:
+    """
+    Build the catalog entry of a file, reusing the content hash of the previous entry if the
+    file still has the same size and modification time.
+    """
+    relative_path = file.relative_to(workspace)
+    step = relative_path.parts[1] if relative_path.parts[0] == "results" and len(relative_path.parts) > 2 else relative_path.parts[0]
+    artifact_type = file.suffix.lstrip(".")
+    unchanged = previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns
+    return {
+        "path": relative_path.as_posix(),
+        "type": artifact_type,
+        "step": step,
+        "run": file.stem.split("_")[0] if artifact_type in RUN_TYPES else None,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": previous["hash"] if unchanged else file_hash(file),
+    }
+
+
+def build_catalog(workspace: str | Path, dirs: tuple[str, ...] = CATALOG_DIRS) -> dict:
+    """
+    Scan the workspace and write its artifact catalog.
+
+    Only files that are new or changed since the last catalog are hashed.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        dirs (tuple[str, ...], optional): Workspace directories to rescan, entries of other
+            directories are kept as they are. Defaults to CATALOG_DIRS.
+
+    Returns:
+        dict: The catalog, mapping paths relative to the workspace to their entries with
+            path, type, step, run, size, mtime_ns and (SHA-256) hash.
+    """
+    workspace = Path(workspace)
+    catalog_file = Path(workspace, CATALOG_FILE)
+    with _write_lock:
+        previous = _read_catalog(catalog_file)
+        catalog = {p: a for p, a in previous.items() if Path(p).parts[0] not in dirs}
+        for directory in dirs:
+            for root, subdirs, files in os.walk(Path(workspace, directory)):
+                subdirs[:] = sorted(d for d in subdirs if not d.startswith("."))
+                for name in sorted(files):
+                    file = Path(root, name)
+                    relative_path = file.relative_to(workspace)
+                    if not _is_catalogued(relative_path):
+                        continue
+                    try:
+                        stat = file.stat()
+                        artifact = _artifact(workspace, file, stat, previous.get(relative_path.as_posix()))
+                    except OSError:
+                        # Deleted while scanning
+                        continue
+                    catalog[artifact["path"]] = artifact
+
+        if catalog != previous or not catalog_file.exists():
+            tmp_file = catalog_file.with_name(f".{CATALOG_FILE}.{os.getpid()}.tmp")
+            with open(tmp_file, "w") as f:
+                json.dump({"artifacts": catalog}, f, indent=1)
+            os.replace(tmp_file, catalog_file)
+    return catalog
+
+
+def _read_catalog(catalog_file: Path) -> dict:
+    """
+    Read a catalog file, reparsing it only if it changed since it was last read by this process.
+    """
+    try:
+        mtime_ns = catalog_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _loaded.get(catalog_file)
+    if cached is None or cached[0] != mtime_ns:
+        try:
+            with open(catalog_file, "r") as f:
+                cached = (mtime_ns, json.load(f)["artifacts"])
+        except (OSError, ValueError, KeyError):
+            return {}
+        _loaded[catalog_file] = cached
+    return cached[1]
+
+
+def load_catalog(workspace: str | Path) -> dict:
+    """
+    Get the artifact catalog of a workspace, building it if there is none yet, and make sure
+    it is kept up to date by a file watcher.
+
+    An existing catalog is compared against the directories once when the watcher of the
+    workspace starts, as files may have changed while nothing watched them (e.g. before an app
+    restart). If the workspace cannot be watched, the catalog is instead rescanned at most every
+    RESCAN_INTERVAL seconds; rescans only hash files with a new size or modification time.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+
+    Returns:
+        dict: The catalog (see `build_catalog`).
+    """
+    workspace = Path(workspace)
+    key = workspace.resolve()
+    watched = watch(workspace)
+    last_scan = _scanned.get(key)
+    if watched:
+        stale = last_scan is None
+    else:
+        stale = last_scan is None or time.monotonic() - last_scan >= RESCAN_INTERVAL
+    catalog_file = Path(workspace, CATALOG_FILE)
+    if stale or not catalog_file.exists():
+        _scanned[key] = time.monotonic()
+        return build_catalog(workspace)
+    return _read_catalog(catalog_file)
+
+
+def artifacts(workspace: str | Path, step: str | None = None, type: str | tuple[str, ...] | None = None) -> list[dict]:
+    """
+    Get the catalog entries of a workspace, optionally of one step and artifact type(s), sorted by path.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        step (str | None, optional): Step (results subdirectory, e.g. "idfilter", or upload
+            directory, e.g. "sdrf-files"). Defaults to None (all steps).
+        type (str | tuple[str, ...] | None, optional): File extension(s) without the dot, e.g.
+            "idXML". Defaults to None (all types).
+
+    Returns:
+        list[dict]: The matching catalog entries.
+    """
+    types = (type,) if isinstance(type, str) else type
+    return [
+        a for _, a in sorted(load_catalog(workspace).items())
+        if (step is None or a["step"] == step) and (types is None or a["type"] in types)
+    ]
+
+
+def artifact_paths(workspace: str | Path, step: str | None = None, type: str | tuple[str, ...] | None = None) -> list[Path]:
+    """
+    Get the paths of the matching artifacts of a workspace (see `artifacts`), sorted.
+    """
+    return [Path(workspace, a["path"]) for a in artifacts(workspace, step, type)]
+
+
+def has_step(workspace: str | Path, step: str) -> bool:
+    """
+    Check whether a workspace has any artifacts of a step.
+    """
+    return any(a["step"] == step for a in load_catalog(workspace).values())
+
+
+def content_hash(workspace: str | Path, file: str | Path) -> str:
+    """
+    Get the content hash of a file from the catalog, hashing it only if it is not catalogued.
+    """
+    artifact = load_catalog(workspace).get(Path(file).relative_to(workspace).as_posix())
+    return artifact["hash"] if artifact else file_hash(Path(file))
+
+
+class _CatalogWatcher(FileSystemEventHandler):
+    """
+    Refreshes the catalog of a workspace once its files have stopped changing for REFRESH_DELAY seconds.
+    """
+
+    def __init__(self, workspace: Path, observer: Observer):
+        self.workspace = workspace
+        self.observer = observer
+        self.watches = {}
+        self.dirs = set()
+        self.timer = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Set when a directory could not be watched, the watcher is then replaced by rescans
+        self.failed = False
+
+    def watch_dirs(self) -> None:
+        """
+        Watch the catalogued directories of the workspace recursively, the workspace itself only
+        for new directories. Other directories, e.g. the Nextflow work directory with its many
+        task files, are not watched at all.
+        """
+        if "" not in self.watches:
+            self.watches[""] = self.observer.schedule(self, str(self.workspace), recursive=False)
+        for directory in CATALOG_DIRS:
+            path = Path(self.workspace, directory)
+            if directory in self.watches and not path.is_dir():
+                # Deleted or moved away, watched again once it is recreated
+                self.observer.unschedule(self.watches.pop(directory))
+            elif directory not in self.watches and path.is_dir():
+                self.watches[directory] = self.observer.schedule(self, str(path), recursive=True)
+
+    def stop(self) -> None:
+        """
+        Stop watching the workspace and drop a pending refresh.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        for watch in self.watches.values():
+            try:
+                self.observer.unschedule(watch)
+            except KeyError:
+                # Removed by the observer already, e.g. after the directory was deleted
+                pass
+        self.watches.clear()
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        if event.is_directory and Path(event.src_path).parent == self.workspace:
+            try:
+                self.watch_dirs()
+            except OSError:
+                # The next `watch` of this workspace stops the watcher, the catalog falls back to rescans
+                self.failed = True
+        relative_paths = [Path(event.src_path)] + ([Path(event.dest_path)] if event.dest_path else [])
+        dirs = set()
+        for path in relative_paths:
+            try:
+                path = path.relative_to(self.workspace)
+            except ValueError:
+                continue
+            # Files added to a directory also modify the directory, which is covered by the file event
+            if event.is_directory and event.event_type == "modified":
+                continue
+            if path.parts and path.parts[0] in CATALOG_DIRS and (event.is_directory or _is_catalogued(path)):
+                dirs.add(path.parts[0])
+        if not dirs:
+            return
+        with self.lock:
+            self.dirs |= dirs
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(REFRESH_DELAY, self.refresh)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def refresh(self) -> None:
+        with self.lock:
+            dirs, self.dirs = tuple(self.dirs), set()
+        if self.workspace.exists():
+            build_catalog(self.workspace, dirs)
+
+
+def watch(workspace: str | Path) -> bool:
+    """
+    Watch a workspace for changes to its catalogued files, unless it is watched already.
+
+    All workspaces share one file watcher. Watchers of workspaces that were not used for
+    WATCH_IDLE_TIMEOUT seconds are stopped, and at most MAX_WATCHED_WORKSPACES are watched at
+    once, evicting the least recently used one.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+
+    Returns:
+        bool: True if the workspace is watched, False if it does not exist or the file
+            watches could not be created (e.g. the inotify limits are reached).
+    """
+    global _observer
+    workspace = Path(workspace).resolve()
+    if not workspace.is_dir():
+        return False
+    now = time.monotonic()
+    with _watchers_lock:
+        watcher = _watchers.pop(workspace, None)
+        if watcher is not None and not watcher.failed:
+            watcher.last_used = now
+            _watchers[workspace] = watcher
+            return True
+        if watcher is not None:
+            watcher.stop()
+            watcher = None
+        for path, other in list(_watchers.items()):
+            if now - other.last_used >= WATCH_IDLE_TIMEOUT or len(_watchers) >= MAX_WATCHED_WORKSPACES:
+                _watchers.pop(path).stop()
+
+        try:
+            if _observer is None or not _observer.is_alive():
+                _watchers.clear()
+                _observer = Observer()
+                _observer.daemon = True
+                _observer.start()
+            watcher = _CatalogWatcher(workspace, _observer)
+            watcher.watch_dirs()
+        except OSError:
+            if watcher is not None:
+                watcher.stop()
+            return False
+        _watchers[workspace] = watcher
+        # Compare the catalog against the directories again, they were not watched until now
+        _scanned.pop(workspace, None)
+        return True
@@ -1,4 +1,6 @@
+import hashlib
 import json
+import math
 import os
 import shutil
 import sys
@@ -20,6 +22,7 @@ except ImportError:
     TK_AVAILABLE = False
 
 from src.common.captcha_ import captcha_control
+from src.common import pagination
 
 # Detect system platform
 OS_PLATFORM = sys.platform
@@ -443,60 +446,129 @@ def v_space(n: int, col=None) -> None:
             st.write("#")
 
 
+def lazy_tabs(labels: list[str], key: str) -> int:
+    """
+    Renders a tab bar of which only the selected tab is computed.
+
+    Unlike `st.tabs`, which runs the body of every tab on every rerun, the page only renders
+    the tab whose index is returned here. The other tabs are computed once they are opened.
+
+    Args:
+        labels (list[str]): The tab labels.
+        key (str): A unique widget key, which keeps the selected tab across reruns.
+
+    Returns:
+        int: Index of the selected tab.
+    """
+    return st.radio(
+        "Tabs",
+        range(len(labels)),
+        format_func=lambda i: labels[i],
+        horizontal=True,
+        label_visibility="collapsed",
+        key=key,
+    )
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_view_indices(
+    path: str, mtime_ns: int, sort_by: str | None, ascending: bool, filters: tuple
+):
+    """
+    Cache the row order of a sorted/filtered view of a Parquet file, so paging through it does not
+    repeat the sort. The modification time invalidates the entry when the file changes.
+    """
+    return pagination.view_indices(pagination.open_dataset(path), sort_by, ascending, dict(filters))
+
+
 def display_large_dataframe(
-    df, chunk_sizes: list[int] = [10, 100, 1_000, 10_000], **kwargs
+    df,
+    chunk_sizes: list[int] = [10, 100, 1_000, 10_000],
+    key_prefix: str = "large-dataframe",
+    **kwargs,
 ):
     """
-    Displays a large DataFrame in chunks with pagination controls and row selection.
+    Displays a large DataFrame in chunks with pagination controls, sorting, column filters and row selection.
+
+    Sorting and filtering happen on the server on an Arrow dataset. If `df` is the path to a Parquet
+    file, it is memory-mapped and only the sort/filter columns and the rows of the current page are
+    read, so tables with millions of rows can be browsed with constant memory per session.
 
     Args:
-        df: The DataFrame to display.
+        df: The DataFrame to display, or the path to a Parquet file.
         chunk_sizes: A list of chunk sizes to choose from.
+        key_prefix: Prefix for the widget keys, must be unique if several tables are on one page.
         ...: Additional keyword arguments to pass to the `st.dataframe` function. See: https://docs.streamlit.io/develop/api-reference/data/st.dataframe
 
     Returns:
-        Index of selected row.
+        Index of selected row in the unsorted, unfiltered data.
     """
+    dataset = pagination.open_dataset(df if isinstance(df, pd.DataFrame) else str(df))
+    columns = dataset.schema.names
+
+    # Sort and filter controls
+    with st.expander("🔎 Sort & Filter"):
+        cols = st.columns([3, 1])
+        sort_by = cols[0].selectbox(
+            "Sort by", [None] + columns, format_func=lambda c: "-" if c is None else c, key=f"{key_prefix}-sort"
+        )
+        ascending = cols[1].toggle("Ascending", True, key=f"{key_prefix}-ascending")
+
+        filters = {}
+        for column in st.multiselect("Filter columns", columns, key=f"{key_prefix}-filter-columns"):
+            if pagination.is_numeric(dataset, column):
+                cols = st.columns(2)
+                minimum = cols[0].number_input(f"{column} min", value=None, key=f"{key_prefix}-min-{column}")
+                maximum = cols[1].number_input(f"{column} max", value=None, key=f"{key_prefix}-max-{column}")
+                filters[column] = ("range", minimum, maximum)
+            else:
+                text = st.text_input(f"{column} contains", key=f"{key_prefix}-contains-{column}")
+                if text:
+                    filters[column] = ("contains", text)
+
+    # Row numbers of the sorted/filtered view (None for the plain table)
+    if isinstance(df, pd.DataFrame):
+        indices = pagination.view_indices(dataset, sort_by, ascending, filters)
+    else:
+        indices = _cached_view_indices(
+            str(df), Path(df).stat().st_mtime_ns, sort_by, ascending, tuple(filters.items())
+        )
+    n_rows = pagination.count_rows(dataset, indices)
 
     # Dropdown for selecting chunk size
-    chunk_size = st.selectbox("Select Number of Rows to Display", chunk_sizes)
+    chunk_size = st.selectbox("Select Number of Rows to Display", chunk_sizes, key=f"{key_prefix}-chunk-size")
 
     # Calculate total number of chunks
-    total_chunks = (len(df) + chunk_size - 1) // chunk_size
+    total_chunks = max((n_rows + chunk_size - 1) // chunk_size, 1)
 
     if total_chunks > 1:
-        page = int(st.number_input("Select Page", 1, total_chunks, 1, step=1))
+        page = int(st.number_input("Select Page", 1, total_chunks, 1, step=1, key=f"{key_prefix}-page"))
     else:
         page = 1
 
-    # Function to get the current chunk of the DataFrame
-    def get_current_chunk(df, chunk_size, chunk_index):
-        start = chunk_index * chunk_size
-        end = min(
-            start + chunk_size, len(df)
-        )  # Ensure end does not exceed dataframe length
-        return df.iloc[start:end], start, end
-
-    # Display the current chunk
-    current_chunk_df, start_row, end_row = get_current_chunk(df, chunk_size, page - 1)
+    # Read and display only the current chunk
+    start_row = min((page - 1) * chunk_size, n_rows)
+    end_row = min(start_row + chunk_size, n_rows)
+    current_chunk_df, row_numbers = pagination.read_page(dataset, indices, start_row, end_row)
 
     event = st.dataframe(current_chunk_df, **kwargs)
 
+    total_rows = dataset.count_rows()
+    filtered = f" (filtered from {total_rows})" if n_rows != total_rows else ""
     st.write(
-        f"Showing rows {start_row + 1} to {end_row} of {len(df)} ({get_dataframe_mem_useage(current_chunk_df):.2f} MB)"
+        f"Showing rows {start_row + 1 if n_rows else 0} to {end_row} of {n_rows}{filtered} ({get_dataframe_mem_useage(current_chunk_df):.2f} MB)"
     )
 
-    rows = event["selection"]["rows"]
-
     if st.session_state.settings["test"]:  # is a test App, return first row as selected
         return 1
-    elif not rows:
+
+    # Selection events are only returned if `on_select` is passed to `st.dataframe`
+    rows = event["selection"]["rows"] if isinstance(event, dict) else []
+    if not rows:
         return None
     else:
-        # Calculate the index based on the current page and chunk size
-        base_index = (page - 1) * chunk_size
-        print(base_index)
-        return base_index + rows[0]
+        # Map the selected row of the page back to the original row
+        return int(row_numbers[rows[0]])
 
 
 def show_table(df: pd.DataFrame, download_name: str = "") -> None:
@@ -623,6 +695,59 @@ def get_dataframe_mem_useage(df):
     return memory_usage_mb
 
 
+def file_hash(path: Path, chunk_size: int = 1024**2) -> str:
+    """
+    Get the SHA-256 hash of a file's content, read in chunks to keep memory usage constant.
+
+    Args:
+        path (Path): Path to the file.
+        chunk_size (int, optional): Number of bytes read at once. Defaults to 1 MB.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def available_cpus() -> int:
+    """
+    Get the number of CPUs this process may use.
+
+    Respects the CPU affinity of the process and the CPU quota of the container (cgroup v2 and v1),
+    which `os.cpu_count()` ignores.
+
+    Returns:
+        int: The number of usable CPUs, at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = Path("/sys/fs/cgroup/cpu.max")
+    # cgroup v1: quota is -1 if unlimited
+    cfs_quota = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    cfs_period = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    try:
+        if cpu_max.exists():
+            quota, period = cpu_max.read_text().split()
+        elif cfs_quota.exists():
+            quota, period = cfs_quota.read_text().strip(), cfs_period.read_text().strip()
+        else:
+            quota, period = "max", "1"
+        if quota not in ("max", "-1"):
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(cpus, 1)
+
+
 def tk_directory_dialog(title: str = "Select Directory", parent_dir: str = os.getcwd()):
     """
     Creates a Tkinter directory dialog for selecting a directory.
@@ -0,0 +1,238 @@
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+from src.common.archive import read_range, stream_layout
+from src.common.nextflow_job import log_path
+
+# Bytes sent to the client at once
+STREAM_CHUNK_SIZE = 1024**2
+
+# Seconds a download link stays valid, resumed downloads need a valid link too
+TOKEN_LIFETIME = 24 * 3600
+
+# File in the workspaces directory holding the key download links are signed with, shared by
+# all app processes so any of them can serve the links of the others
+SECRET_FILE = ".download-secret"
+
+# Running download server of this process
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range "Range: bytes=..." header into (start, end) with `end` exclusive.
+
+    Returns None for headers that are ignored (other units or multiple ranges), which means
+    the full archive is sent. Raises ValueError for unsatisfiable ranges.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    else:
+        start, end = max(size - int(last), 0), size
+    if start >= end:
+        raise ValueError(header)
+    return start, end
+
+
+def _secret(workspaces_dir: Path) -> bytes:
+    """
+    Get the key download links are signed with, creating it on first use.
+    """
+    path = Path(workspaces_dir, SECRET_FILE)
+    if not path.exists():
+        # Written in full before it is linked into place, so other processes never read a partial key
+        tmp = Path(workspaces_dir, f"{SECRET_FILE}.{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    return path.read_bytes()
+
+
+def _signature(workspaces_dir: Path, workspace: str, expires: int) -> str:
+    return hmac.new(_secret(workspaces_dir), f"{workspace}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def workspace_token(workspace: str | Path) -> str:
+    """
+    Get a token that allows downloading the results and log of a workspace for `TOKEN_LIFETIME`.
+
+    The page issues it after the app's own checks (session, captcha, consent), the download
+    server only serves requests carrying a valid one.
+    """
+    workspace = Path(workspace)
+    expires = int(time.time()) + TOKEN_LIFETIME
+    return f"{expires}.{_signature(workspace.parent, workspace.name, expires)}"
+
+
+def _valid_token(workspaces_dir: Path, workspace: str, token: str) -> bool:
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(workspaces_dir, workspace, int(expires)))
+
+
+class _DownloadHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET/HEAD /results/<workspace>.zip?steps=<step>,<step> as an archive generated on the
+    fly and GET/HEAD /logs/<workspace>.log as the Nextflow log of the latest run, up to its size
+    at the time of the request. Both need the workspace's token in the "token" parameter.
+    """
+
+    workspaces_dir: Path
+
+    def do_HEAD(self) -> None:
+        self._send(body=False)
+
+    def do_GET(self) -> None:
+        self._send(body=True)
+
+    def _send(self, body: bool) -> None:
+        url = urlsplit(self.path)
+        match = re.fullmatch(r"/results/([\w-]+)\.zip|/logs/([\w-]+)\.log", url.path)
+        workspace = Path(self.workspaces_dir, match.group(1) or match.group(2)) if match else None
+        query = parse_qs(url.query)
+        # Unknown workspaces and invalid tokens look the same, not revealing which workspaces exist
+        if (
+            workspace is None
+            or not _valid_token(self.workspaces_dir, workspace.name, query.get("token", [""])[0])
+            or not workspace.is_dir()
+        ):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        if match.group(1):
+            steps = [s for s in ",".join(query.get("steps", [])).split(",") if s]
+            segments, etag = stream_layout(workspace, steps)
+            content_type, file_name = "application/zip", f'{"-".join(["results"] + steps)}.zip'
+        else:
+            try:
+                stat = log_path(workspace).stat()
+            except OSError:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            segments, etag = [(log_path(workspace), stat.st_size)], f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+            content_type, file_name = "text/plain; charset=utf-8", f"{workspace.name}-nextflow.log"
+        size = sum(length for _, length in segments)
+
+        byte_range = None
+        if "Range" in self.headers and self.headers.get("If-Range", f'"{etag}"') == f'"{etag}"':
+            try:
+                byte_range = _parse_range(self.headers["Range"], size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        start, end = byte_range or (0, size)
+
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Disposition", f'attachment; filename="{file_name}"')
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{etag}"')
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        try:
+            for chunk in read_range(segments, start, end, STREAM_CHUNK_SIZE):
+                self.wfile.write(chunk)
+        except (ConnectionError, OSError):
+            # Client went away or a file changed, the client can resume with a new request
+            self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_download_server(workspaces_dir: str | Path, port: int, host: str = "127.0.0.1") -> bool:
+    """
+    Start the results download server of this process in a background thread, unless it is running.
+
+    Args:
+        workspaces_dir (str | Path): Directory containing the workspaces that can be downloaded.
+        port (int): Port to listen on.
+        host (str, optional): Address to listen on, "0.0.0.0" to serve other hosts too (e.g.
+            through a published container port). Defaults to "127.0.0.1".
+
+    Returns:
+        bool: True if the server is running, False if it could not listen on the port (e.g. it
+            is taken by another app process), in which case it is tried again on the next call.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return True
+        handler = type("DownloadHandler", (_DownloadHandler,), {"workspaces_dir": Path(workspaces_dir).resolve()})
+        try:
+            _server = ThreadingHTTPServer((host, port), handler)
+        except OSError:
+            return False
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="download-server", daemon=True).start()
+        return True
+
+
+def server_url(server: dict, headers) -> str | None:
+    """
+    Get the URL of the download server as seen by the browser.
+
+    Args:
+        server (dict): The "download_server" settings.
+        headers: Headers of the browser's request to the app (`st.context.headers`).
+
+    Returns:
+        str | None: The configured "url", or the app's host name with the server's port. None
+            if the app runs behind a reverse proxy and no "url" is configured, since the proxy
+            can not be assumed to forward the port.
+    """
+    if server["url"]:
+        return server["url"]
+    if "X-Forwarded-Proto" in headers or "X-Forwarded-Host" in headers:
+        return None
+    return f"http://{headers.get('Host', 'localhost').split(':')[0]}:{server['port']}"
+
+
+def download_url(base_url: str, workspace: str | Path, steps: list[str] = []) -> str:
+    """
+    Get the URL of the streamed results archive of a workspace.
+
+    Args:
+        base_url (str): URL of the download server, e.g. "http://localhost:8502".
+        workspace (str | Path): Path to the workspace.
+        steps (list[str], optional): Steps to include. Defaults to [] (all steps).
+
+    Returns:
+        str: The download URL.
+    """
+    url = f"{base_url.rstrip('/')}/results/{quote(Path(workspace).name)}.zip?token={workspace_token(workspace)}"
+    return url + (f"&steps={quote(','.join(steps))}" if steps else "")
+
+
+def log_url(base_url: str, workspace: str | Path) -> str:
+    """
+    Get the URL of the Nextflow log of the latest run of a workspace.
+    """
+    return f"{base_url.rstrip('/')}/logs/{quote(Path(workspace).name)}.log?token={workspace_token(workspace)}"
@@ -0,0 +1,286 @@
+import multiprocessing
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyopenms import IdXMLFile
+
+# Suffix of the columnar cache written next to each parsed idXML file
+CACHE_SUFFIX = ".parquet"
+
+# Schema metadata keys identifying the idXML file a cache was built from
+_CACHE_KEYS = (b"source_path", b"source_mtime_ns", b"source_size")
+
+# Available idXML parsers, selected via the "idxml_parser" entry in settings.json
+PARSERS = ("pyopenms", "stream")
+
+# Rows per Parquet row group of the cache, small enough to read single pages of a table cheaply
+CACHE_ROW_GROUP_SIZE = 65_536
+
+# Rough number of idXML bytes per peptide hit, used to size the arrays of the streaming parser
+_BYTES_PER_HIT = 400
+
+
+def _parse_idxml(idxml_file: Path) -> pd.DataFrame:
+    """
+    Parse an idXML file with pyOpenMS into a flat DataFrame with one row per peptide hit.
+
+    Args:
+        idxml_file (Path): Path to the idXML file.
+
+    Returns:
+        pd.DataFrame: Columns RT, m/z, Sequence, Charge, Score and Proteins.
+    """
+    proteins = []
+    peptides = []
+    IdXMLFile().load(str(idxml_file), proteins, peptides)
+
+    records = []
+    for pep in peptides:
+        rt = pep.getRT()
+        mz = pep.getMZ()
+        for hit in pep.getHits():
+            protein_refs = [ev.getProteinAccession() for ev in hit.getPeptideEvidences()]
+            records.append({
+                "RT": rt,
+                "m/z": mz,
+                "Sequence": hit.getSequence().toString(),
+                "Charge": hit.getCharge(),
+                "Score": hit.getScore(),
+                "Proteins": ",".join(protein_refs) if protein_refs else None
+            })
+
+    return pd.DataFrame(records, columns=["RT", "m/z", "Sequence", "Charge", "Score", "Proteins"])
+
+
+def _stream_idxml(idxml_file: Path) -> pd.DataFrame:
+    """
+    Parse an idXML file into the same DataFrame as `_parse_idxml` without the pyOpenMS object model.
+
+    The XML is read incrementally and every PeptideHit is written straight into preallocated
+    NumPy arrays, which grow by doubling when the estimate from the file size is too small.
+    Finished ProteinIdentification and PeptideIdentification elements are removed from the
+    tree right away, so memory use is bounded by the size of the arrays, not of the XML.
+
+    Args:
+        idxml_file (Path): Path to the idXML file.
+
+    Returns:
+        pd.DataFrame: Columns RT, m/z, Sequence, Charge, Score and Proteins.
+    """
+    capacity = max(idxml_file.stat().st_size // _BYTES_PER_HIT, 1024)
+    columns = {
+        "RT": np.empty(capacity, dtype=np.float64),
+        "m/z": np.empty(capacity, dtype=np.float64),
+        "Sequence": np.empty(capacity, dtype=object),
+        "Charge": np.empty(capacity, dtype=np.int64),
+        "Score": np.empty(capacity, dtype=np.float64),
+        "Proteins": np.empty(capacity, dtype=object),
+    }
+    # Protein hit IDs (e.g. "PH_0") referenced by peptide hits, mapped to their accessions
+    accessions = {}
+    n = 0
+    rt = mz = np.nan
+    parent = None
+
+    for event, elem in ET.iterparse(str(idxml_file), events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == "IdentificationRun":
+                parent = elem
+            elif tag == "PeptideIdentification":
+                rt = float(elem.get("RT", "nan"))
+                mz = float(elem.get("MZ", "nan"))
+            elif tag == "PeptideHit":
+                if n == capacity:
+                    capacity *= 2
+                    for name, values in columns.items():
+                        columns[name] = np.resize(values, capacity)
+                refs = [accessions.get(ref, ref) for ref in elem.get("protein_refs", "").split()]
+                columns["RT"][n] = rt
+                columns["m/z"][n] = mz
+                columns["Sequence"][n] = elem.get("sequence", "")
+                columns["Charge"][n] = int(elem.get("charge", 0))
+                columns["Score"][n] = float(elem.get("score", "nan"))
+                columns["Proteins"][n] = ",".join(refs) if refs else None
+                n += 1
+        elif tag == "ProteinHit":
+            accessions[elem.get("id")] = elem.get("accession")
+        elif tag in ("ProteinIdentification", "PeptideIdentification"):
+            elem.clear()
+            if parent is not None:
+                parent.remove(elem)
+
+    return pd.DataFrame({name: values[:n] for name, values in columns.items()})
+
+
+def cache_key(source_file: Path) -> dict[bytes, bytes]:
+    """
+    Build the cache key (path, modification time and size) of the source file of a columnar
+    cache (an idXML or CSV file), to be stored in the schema metadata of the cache.
+    """
+    stat = source_file.stat()
+    values = [source_file.resolve(), stat.st_mtime_ns, stat.st_size]
+    return {k: str(v).encode() for k, v in zip(_CACHE_KEYS, values)}
+
+
+def cache_path(source_file: str | Path) -> Path:
+    """
+    Get the path of the columnar cache file belonging to an idXML or CSV file.
+
+    Args:
+        source_file (str | Path): Path to the idXML or CSV file.
+
+    Returns:
+        Path: Path to the cache file, located next to the source file.
+    """
+    source_file = Path(source_file)
+    return source_file.with_name(source_file.name + CACHE_SUFFIX)
+
+
+def is_cache_fresh(source_file: str | Path) -> bool:
+    """
+    Check whether a cache file exists for the source file and matches its current path, mtime and size.
+
+    Args:
+        source_file (str | Path): Path to the idXML or CSV file.
+
+    Returns:
+        bool: True if the cache can be used instead of reading the source file.
+    """
+    source_file = Path(source_file)
+    cache_file = cache_path(source_file)
+    if not cache_file.exists():
+        return False
+    try:
+        metadata = pq.read_schema(cache_file).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return all(metadata.get(k) == v for k, v in cache_key(source_file).items())
+
+
+def _write_cache(idxml_file: Path, table: pa.Table) -> None:
+    """
+    Write a parsed idXML table to its cache file, tagged with the cache key of the source file.
+
+    The file is written to a temporary name first and moved in place, so concurrent readers
+    never see a partially written cache. Failing to write (e.g. read-only results) is not an error.
+    """
+    cache_file = cache_path(idxml_file)
+    tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **cache_key(idxml_file)})
+    try:
+        pq.write_table(table, tmp_file, row_group_size=CACHE_ROW_GROUP_SIZE)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+
+
+def _finalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the Charge column to an ordered categorical and add a numeric copy for color scales.
+    """
+    if not df.empty:
+        # Convert Charge to ordered categorical type
+        df["Charge"] = df["Charge"].astype(str)
+        charge_order = sorted(df["Charge"].unique(), key=lambda x: int(x))
+        df["Charge"] = pd.Categorical(df["Charge"], categories=charge_order, ordered=True)
+
+        # Add numeric column for color scaling
+        df["Charge_num"] = df["Charge"].astype(int)
+
+    return df
+
+
+def load_idxml_table(idxml_file: str | Path, parser: str = "pyopenms") -> pa.Table:
+    """
+    Load the peptide hits of an idXML file as an Arrow table, from its cache if it is still fresh.
+
+    The first load parses the idXML file and stores the result as a Parquet file next to it.
+    As long as the idXML file keeps its path, modification time and size, later loads are a
+    memory-mapped columnar read of that cache instead of a full XML parse.
+
+    Args:
+        idxml_file (str | Path): Path to the idXML file.
+        parser (str, optional): "pyopenms" to load the file with pyOpenMS or "stream" to use the
+            constant-memory streaming parser for large files. Defaults to "pyopenms".
+
+    Returns:
+        pa.Table: Columns RT, m/z, Sequence, Charge, Score and Proteins.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown idXML parser '{parser}'. Choose one of {PARSERS}.")
+    idxml_file = Path(idxml_file)
+    if is_cache_fresh(idxml_file):
+        return pq.read_table(cache_path(idxml_file), memory_map=True)
+    parse = _stream_idxml if parser == "stream" else _parse_idxml
+    table = pa.Table.from_pandas(parse(idxml_file), preserve_index=False)
+    _write_cache(idxml_file, table)
+    return table
+
+
+def idxml_to_dataframe(idxml_file: str | Path, parser: str = "pyopenms") -> pd.DataFrame:
+    """
+    Load an idXML file as a DataFrame with one row per peptide hit (see `load_idxml_table`).
+
+    Args:
+        idxml_file (str | Path): Path to the idXML file.
+        parser (str, optional): "pyopenms" or "stream". Defaults to "pyopenms".
+
+    Returns:
+        pd.DataFrame: Columns RT, m/z, Sequence, Charge (ordered categorical), Score, Proteins and Charge_num.
+    """
+    return _finalize(load_idxml_table(idxml_file, parser).to_pandas())
+
+
+def warm_idxml_caches(
+    idxml_files: list[Path], parser: str = "pyopenms", max_workers: int = 1
+) -> dict[Path, Exception]:
+    """
+    Parse the idXML files without a fresh cache and write their caches (see `load_idxml_table`).
+
+    The files are parsed in a process pool of up to `max_workers` processes. Only the caches
+    are written, no tables are sent back or converted to DataFrames.
+
+    Args:
+        idxml_files (list[Path]): Paths to the idXML files.
+        parser (str, optional): "pyopenms" or "stream". Defaults to "pyopenms".
+        max_workers (int, optional): Maximum number of parser processes. Defaults to 1.
+
+    Returns:
+        dict[Path, Exception]: The files that could not be parsed, with the exception raised.
+    """
+    stale_files = [f for f in idxml_files if not is_cache_fresh(f)]
+    errors = {}
+    if len(stale_files) <= 1 or max_workers <= 1:
+        for idxml_file in stale_files:
+            try:
+                _warm_cache(idxml_file, parser)
+            except Exception as e:
+                errors[idxml_file] = e
+        return errors
+
+    # Spawn fresh interpreters, forking the multi-threaded Streamlit server is not safe
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(stale_files)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {executor.submit(_warm_cache, f, parser): f for f in stale_files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors[futures[future]] = e
+    return errors
+
+
+def _warm_cache(idxml_file: Path, parser: str) -> None:
+    """
+    Parse an idXML file and write its cache, returning nothing to keep worker results small.
+    """
+    load_idxml_table(idxml_file, parser)
@@ -0,0 +1,406 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from src.common import backend, run_queue
+from src.common.archive import build_archive
+from src.common.catalog import build_catalog
+from src.common.trace import REPORT_FILE, TIMELINE_FILE, TRACE_FILE, reporting_args
+
+# Directory in the workspace with the job file and the log of the latest run
+JOB_DIR = "nextflow-run"
+JOB_FILE = "job.json"
+LOG_FILE = "nextflow.log"
+
+# Nextflow session (run name) of the latest launched run, which the next run resumes
+SESSION_FILE = "session.json"
+
+# Nextflow work directory in the workspace, kept between runs as the task cache
+WORK_DIR = "work"
+
+# Log line in which Nextflow announces the run name, e.g. "Launching `nf-core/quantms` [happy_euler] DSL2 - revision: ..."
+_LAUNCH_PATTERN = re.compile(r"Launching `[^`]*` \[([\w-]+)\]")
+
+# Seconds between flushes of the log file while lines arrive
+LOG_FLUSH_INTERVAL = 0.5
+
+# Maximum bytes returned by one `read_log` call
+MAX_LOG_READ = 4 * 1024**2
+
+# Lines of the log kept in the log view of a session, older lines are only on disk
+LOG_VIEW_LINES = 1_000
+
+# Seconds between updates of the log view while a run is active
+LOG_VIEW_INTERVAL = 1.0
+
+# Maximum lines returned by `search_log`
+MAX_SEARCH_MATCHES = 1_000
+
+ACTIVE_STATES = ("queued", "running")
+
+# Job threads of this process per workspace
+_threads: dict[Path, threading.Thread] = {}
+_threads_lock = threading.Lock()
+
+
+def log_path(workspace: str | Path) -> Path:
+    """
+    Get the path of the log file of the latest run of a workspace.
+    """
+    return Path(workspace, JOB_DIR, LOG_FILE)
+
+
+def _write_json(file: Path, data: dict) -> None:
+    """
+    Atomically replace a JSON file.
+    """
+    tmp_file = file.with_name(f".{file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_file, file)
+
+
+def _write_job(workspace: Path, job: dict) -> None:
+    """
+    Atomically replace the job file of a workspace.
+    """
+    _write_json(Path(workspace, JOB_DIR, JOB_FILE), job)
+
+
+def read_session(workspace: str | Path) -> dict | None:
+    """
+    Get the Nextflow session of the latest launched run of a workspace.
+
+    Returns:
+        dict | None: The run name and launch time, None if no run was launched yet.
+    """
+    try:
+        with open(Path(workspace, JOB_DIR, SESSION_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _resume_args(workspace: Path, session: dict | None) -> str:
+    """
+    Get the Nextflow options that run in the work directory of the workspace and, if given,
+    resume a session so that unchanged tasks are taken from the cache.
+    """
+    args = f"-work-dir {Path(workspace, WORK_DIR).resolve()}"
+    return f"{args} -resume {session['run_name']}" if session else args
+
+
+def read_job(workspace: str | Path) -> dict | None:
+    """
+    Get the latest job of a workspace.
+
+    A job that is still marked as queued or running but whose thread is gone (the app was
+    restarted) is marked as failed. Jobs of app processes on other hosts or containers, whose
+    threads can not be checked, are failed once the run queue has closed their queue job.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+
+    Returns:
+        dict | None: The job with id, state ("queued", "running", "done" or "failed"), position
+            in the queue, command, returncode and submitted/started/finished times, and the error of
+            a failed run or of the post-processing (cataloguing and archiving the results) of a
+            successful one ("postprocess_error"). None if the workspace has no job.
+    """
+    workspace = Path(workspace)
+    try:
+        with open(Path(workspace, JOB_DIR, JOB_FILE), "r") as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if job["state"] in ACTIVE_STATES:
+        identity = job.get("owner") or {"pid": job["pid"]}
+        alive = run_queue.owner_alive(identity)
+        if alive and identity["pid"] == os.getpid():
+            thread = _threads.get(workspace.resolve())
+            alive = thread is not None and thread.is_alive()
+        elif alive is None:
+            if job.get("queue_id") is None:
+                # Not submitted to the queue yet, which takes moments
+                alive = time.time() - job["submitted"] < run_queue.LEASE_TIMEOUT
+            else:
+                alive = run_queue.position(workspace.parent, job["queue_id"]) is not None
+        if not alive:
+            job.update(state="failed", finished=time.time(), error="The run was interrupted.")
+            _write_job(workspace, job)
+    return job
+
+
+def start_job(
+    workspace: str | Path,
+    sdrf_path: str,
+    fasta_path: str,
+    config_args: str,
+    profile: str,
+    limits: dict,
+    archive: bool = False,
+    resume: bool = True,
+    backend_settings: dict | None = None,
+) -> str:
+    """
+    Start a Nextflow run of a workspace in a background thread of this process.
+
+    The run waits in the run queue, then streams the backend output into the log file of the
+    workspace. Nextflow is asked to write its trace, report and timeline into the job directory
+    (see `trace.reporting_args`). All runs of a workspace share one work directory, and a run
+    resumes the session of the previous one unless `resume` is False, so only tasks whose
+    inputs or parameters changed are executed again. After a successful run the results are
+    catalogued (and archived if requested).
+    The run continues when the session that started it ends; any session of the workspace can
+    follow it with `read_job` and `read_log`.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        sdrf_path (str): Path to the SDRF file.
+        fasta_path (str): Path to the FASTA file.
+        config_args (str): Additional pipeline arguments.
+        profile (str): Nextflow execution profile.
+        limits (dict): The "run_queue" settings.
+        archive (bool, optional): Build the results archive after a successful run, for
+            deployments without the download server. Defaults to False.
+        resume (bool, optional): Reuse the cached tasks of the previous run. Defaults to True.
+        backend_settings (dict | None, optional): Settings of the backend client. Defaults to
+            None (the "nextflow_backend" settings).
+
+    Raises:
+        ValueError: If a run of the workspace is queued or running already.
+
+    Returns:
+        str: The job ID.
+    """
+    workspace = Path(workspace)
+    with _threads_lock:
+        job = read_job(workspace)
+        if job is not None and job["state"] in ACTIVE_STATES:
+            raise ValueError(f"A run of workspace {workspace.name} is queued or running already.")
+        Path(workspace, JOB_DIR).mkdir(parents=True, exist_ok=True)
+        log_path(workspace).write_bytes(b"")
+        # Nextflow refuses to overwrite the reports of the previous run
+        for name in (TRACE_FILE, REPORT_FILE, TIMELINE_FILE):
+            Path(workspace, JOB_DIR, name).unlink(missing_ok=True)
+        session = read_session(workspace) if resume else None
+        config_args = " ".join(
+            [config_args, reporting_args(Path(workspace, JOB_DIR)), _resume_args(workspace, session)]
+        ).strip()
+        job = {
+            "id": uuid.uuid4().hex,
+            "state": "queued",
+            "position": None,
+            "pid": os.getpid(),
+            "owner": run_queue.owner(),
+            "queue_id": None,
+            "command": None,
+            "returncode": None,
+            "run_name": None,
+            "resumed_from": session["run_name"] if session else None,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+        }
+        _write_job(workspace, job)
+        thread = threading.Thread(
+            target=_run,
+            args=(workspace, job, sdrf_path, fasta_path, config_args, profile, limits, archive, backend_settings),
+            name=f"nextflow-{workspace.name}",
+            daemon=True,
+        )
+        _threads[workspace.resolve()] = thread
+        thread.start()
+    return job["id"]
+
+
+def _run(
+    workspace: Path,
+    job: dict,
+    sdrf_path: str,
+    fasta_path: str,
+    config_args: str,
+    profile: str,
+    limits: dict,
+    archive: bool,
+    backend_settings: dict | None,
+) -> None:
+    """
+    Run a job: wait for a slot in the run queue, run Nextflow and record the outcome.
+    """
+    workspaces_dir = workspace.parent
+    try:
+        job_id = run_queue.submit(workspaces_dir, workspace, limits)
+    except ValueError as e:
+        job.update(state="failed", finished=time.time(), error=str(e))
+        _write_job(workspace, job)
+        return
+    job["queue_id"] = job_id
+    _write_job(workspace, job)
+
+    try:
+        for position in run_queue.wait_for_turn(workspaces_dir, job_id, limits):
+            if position != job["position"]:
+                job["position"] = position
+                _write_job(workspace, job)
+        if run_queue.position(workspaces_dir, job_id) != 0:
+            # Closed by the queue while waiting, e.g. taken for a job of an exited process
+            raise RuntimeError("The run was removed from the run queue before it could start.")
+        job.update(state="running", position=0, started=time.time())
+        _write_job(workspace, job)
+
+        with open(log_path(workspace), "ab") as log:
+            last_flush = time.monotonic()
+            for kind, value in backend.run_nextflow(
+                sdrf_path, fasta_path, str(workspace), config_args, profile, settings=backend_settings
+            ):
+                if kind == "cmd":
+                    job["command"] = value
+                    _write_job(workspace, job)
+                elif kind in ("log_update", "debug"):
+                    log.write(f"{value}\n".encode("utf-8"))
+                    if job["run_name"] is None and (launch := _LAUNCH_PATTERN.search(value)):
+                        # The next run of the workspace resumes this session
+                        job["run_name"] = launch.group(1)
+                        _write_job(workspace, job)
+                        _write_json(
+                            Path(workspace, JOB_DIR, SESSION_FILE), {"run_name": job["run_name"], "launched": time.time()}
+                        )
+                elif kind == "returncode":
+                    job["returncode"] = value
+                if time.monotonic() - last_flush >= LOG_FLUSH_INTERVAL:
+                    log.flush()
+                    last_flush = time.monotonic()
+    except Exception as e:
+        job["error"] = str(e)
+    finally:
+        run_queue.finish(workspaces_dir, job_id, job["returncode"] == 0)
+
+    try:
+        if job["returncode"] == 0:
+            # Catalog the results of the finished run for the results pages and the archive
+            build_catalog(workspace)
+            # Without the download server, results are downloaded as a prebuilt archive,
+            # in which only new and changed result files are compressed again
+            if archive:
+                build_archive(workspace)
+    except Exception as e:
+        # The run itself succeeded, keep its outcome and record why its results are not catalogued
+        job["postprocess_error"] = str(e)
+    finally:
+        job.update(state="done" if job["returncode"] == 0 else "failed", finished=time.time())
+        _write_job(workspace, job)
+
+
+def read_log(workspace: str | Path, offset: int = 0) -> tuple[str, int]:
+    """
+    Read the complete lines appended to the log of a workspace since a byte offset.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        offset (int, optional): Byte offset returned by the previous call. Defaults to 0.
+
+    Returns:
+        tuple[str, int]: The new lines (at most MAX_LOG_READ bytes) and the offset to continue from.
+    """
+    try:
+        with open(log_path(workspace), "rb") as f:
+            if f.seek(0, os.SEEK_END) < offset:
+                # The log was restarted by a new run
+                offset = 0
+            f.seek(offset)
+            data = f.read(MAX_LOG_READ)
+    except FileNotFoundError:
+        return "", 0
+    # Leave a partially written last line for the next call, unless it fills the whole read
+    end = data.rfind(b"\n") + 1 or (len(data) if len(data) == MAX_LOG_READ else 0)
+    return data[:end].decode("utf-8", errors="replace"), offset + end
+
+
+def tail_log(workspace: str | Path, lines: int, block_size: int = 64 * 1024) -> tuple[list[str], int]:
+    """
+    Read the last complete lines of the log of a workspace, block by block from the back.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        lines (int): The number of lines to return.
+        block_size (int, optional): The number of bytes read at once. Defaults to 64 KiB.
+
+    Returns:
+        tuple[list[str], int]: The lines and the offset after the last of them.
+    """
+    try:
+        with open(log_path(workspace), "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            data = b""
+            while position > 0 and data.count(b"\n") <= lines:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+    except FileNotFoundError:
+        return [], 0
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode("utf-8", errors="replace").splitlines()[-lines:], position + end
+
+
+def follow_log(workspace: str | Path, view: deque, offset: int | None) -> int:
+    """
+    Append the lines written to the log of a workspace since `offset` to a log view.
+
+    The view is a ring buffer (a deque with maxlen), so its size is bounded however long the
+    run is. Instead of reading everything, the view jumps to the end of the log when it is
+    attached (`offset` is None) or more than MAX_LOG_READ bytes behind.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        view (deque): The lines shown, updated in place.
+        offset (int | None): The offset returned by the previous call, None to attach.
+
+    Returns:
+        int: The offset to continue from.
+    """
+    try:
+        size = log_path(workspace).stat().st_size
+    except FileNotFoundError:
+        view.clear()
+        return 0
+    if offset is None or size - offset > MAX_LOG_READ:
+        lines, offset = tail_log(workspace, view.maxlen)
+        view.clear()
+    else:
+        text, offset = read_log(workspace, offset)
+        lines = text.splitlines()
+    view.extend(lines)
+    return offset
+
+
+def search_log(workspace: str | Path, query: str, max_matches: int = MAX_SEARCH_MATCHES) -> list[tuple[int, str]]:
+    """
+    Find the lines of the full log of a workspace that contain a text, ignoring case.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        query (str): The text to search for.
+        max_matches (int, optional): The maximum number of lines returned. Defaults to MAX_SEARCH_MATCHES.
+
+    Returns:
+        list[tuple[int, str]]: The line numbers (starting at 1) and lines of the first matches.
+    """
+    needle = query.lower()
+    matches = []
+    try:
+        with open(log_path(workspace), "r", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, 1):
+                if needle in line.lower():
+                    matches.append((number, line.rstrip("\n")))
+                    if len(matches) >= max_matches:
+                        break
+    except FileNotFoundError:
+        pass
+    return matches
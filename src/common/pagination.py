@@ -0,0 +1,230 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow.fs import LocalFileSystem
+
+from src.common.idxml import CACHE_ROW_GROUP_SIZE, cache_key, cache_path, is_cache_fresh
+
+# A filter is ("contains", text) for text columns or ("range", minimum, maximum) for numeric
+# columns, where either bound may be None
+Filter = tuple
+
+
+def csv_to_parquet(csv_file: str | Path, sep: str = ",") -> Path:
+    """
+    Convert a CSV/TSV file to a Parquet file next to it, unless that file is still fresh.
+
+    The CSV is streamed batch by batch into the Parquet writer, so the conversion itself
+    does not need the whole table in memory. Column types are inferred from the first block;
+    if a later row does not fit the inferred type of a column (e.g. a float in an integer
+    column), the conversion is started again with that column widened (see `_widen`).
+
+    Args:
+        csv_file (str | Path): Path to the CSV file.
+        sep (str, optional): Column delimiter. Defaults to ",".
+
+    Returns:
+        Path: Path to the Parquet file.
+    """
+    csv_file = Path(csv_file)
+    parquet_file = cache_path(csv_file)
+    if is_cache_fresh(csv_file):
+        return parquet_file
+
+    tmp_file = parquet_file.with_name(f".{parquet_file.name}.{os.getpid()}.tmp")
+    column_types = {}
+    while True:
+        try:
+            _write_parquet(csv_file, tmp_file, sep, column_types)
+            os.replace(tmp_file, parquet_file)
+            return parquet_file
+        except pa.ArrowInvalid as e:
+            tmp_file.unlink(missing_ok=True)
+            if not _widen(csv_file, sep, column_types, e):
+                raise
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+
+def _write_parquet(csv_file: Path, parquet_file: Path, sep: str, column_types: dict[str, pa.DataType]) -> None:
+    """
+    Stream a CSV file into a Parquet file, with the given types for some of its columns.
+    """
+    reader = pv.open_csv(
+        csv_file,
+        parse_options=pv.ParseOptions(delimiter=sep),
+        # Type inference is based on the first block only, large blocks make it more robust
+        read_options=pv.ReadOptions(block_size=16 * 1024**2),
+        convert_options=pv.ConvertOptions(column_types=column_types),
+    )
+    schema = reader.schema.with_metadata(cache_key(csv_file))
+    with pq.ParquetWriter(parquet_file, schema) as writer:
+        for batch in reader:
+            writer.write_table(pa.Table.from_batches([batch], schema), row_group_size=CACHE_ROW_GROUP_SIZE)
+
+
+def _widen(csv_file: Path, sep: str, column_types: dict[str, pa.DataType], error: pa.ArrowInvalid) -> bool:
+    """
+    Widen the type of the column a CSV conversion error is about: integers to floats, anything
+    else to strings.
+
+    Returns:
+        bool: False if the error is not about a column type, or the column is a string already.
+    """
+    match = re.search(r"CSV column #(\d+): .*CSV conversion error to (\w+)", str(error))
+    if not match:
+        return False
+    with pv.open_csv(csv_file, parse_options=pv.ParseOptions(delimiter=sep)) as reader:
+        field = reader.schema.field(int(match.group(1)))
+    current = column_types.get(field.name, field.type)
+    if pa.types.is_string(current):
+        return False
+    column_types[field.name] = pa.float64() if pa.types.is_integer(current) else pa.string()
+    return True
+
+
+def open_dataset(source: str | Path | pd.DataFrame) -> ds.Dataset:
+    """
+    Open a Parquet file (memory-mapped) or wrap a DataFrame as an Arrow dataset.
+
+    Dictionary columns (e.g. pandas categoricals) are decoded to their values, so that they can
+    be sorted and filtered.
+
+    Args:
+        source (str | Path | pd.DataFrame): Path to a Parquet file or a DataFrame.
+
+    Returns:
+        ds.Dataset: The dataset, which is only read when rows or columns are requested.
+    """
+    if isinstance(source, pd.DataFrame):
+        table = pa.Table.from_pandas(source, preserve_index=False)
+        return ds.dataset(table.cast(_decoded_schema(table.schema)))
+    options = dict(format=ds.ParquetFileFormat(), filesystem=LocalFileSystem(use_mmap=True))
+    dataset = ds.dataset(source, **options)
+    schema = _decoded_schema(dataset.schema)
+    # Columns are cast to the given schema while scanning
+    return dataset if schema.equals(dataset.schema) else ds.dataset(source, schema=schema, **options)
+
+
+def _decoded_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Replace dictionary types (e.g. of pandas categoricals) by their value types, which Arrow
+    can sort and compare to plain values.
+    """
+    return pa.schema(
+        [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field for field in schema],
+        metadata=schema.metadata,
+    )
+
+
+def is_numeric(dataset: ds.Dataset, column: str) -> bool:
+    """
+    Check whether a column of the dataset is numeric, i.e. filtered by range instead of by text.
+    """
+    field_type = dataset.schema.field(column).type
+    return pa.types.is_integer(field_type) or pa.types.is_floating(field_type)
+
+
+def filter_expression(filters: dict[str, Filter]) -> pc.Expression | None:
+    """
+    Combine column filters into one Arrow expression that is evaluated while scanning.
+
+    Args:
+        filters (dict[str, Filter]): Column names mapped to their filter.
+
+    Returns:
+        pc.Expression | None: The combined expression, or None if there is nothing to filter.
+    """
+    expression = None
+    for column, (kind, *values) in filters.items():
+        field = pc.field(column)
+        if kind == "contains":
+            condition = pc.match_substring(field.cast(pa.string()), values[0], ignore_case=True)
+        elif kind == "range":
+            minimum, maximum = values
+            condition = None
+            if minimum is not None:
+                condition = field >= minimum
+            if maximum is not None:
+                condition = field <= maximum if condition is None else condition & (field <= maximum)
+        else:
+            raise ValueError(f"Unknown filter type '{kind}' for column '{column}'.")
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def view_indices(
+    dataset: ds.Dataset,
+    sort_by: str | None = None,
+    ascending: bool = True,
+    filters: dict[str, Filter] = {},
+) -> np.ndarray | None:
+    """
+    Get the row numbers of a sorted and filtered view of the dataset, in view order.
+
+    Only the sort and filter columns are read, never the full rows.
+
+    Args:
+        dataset (ds.Dataset): The dataset.
+        sort_by (str | None, optional): Column to sort by. Defaults to None (file order).
+        ascending (bool, optional): Sort order. Defaults to True.
+        filters (dict[str, Filter], optional): Column filters. Defaults to {}.
+
+    Returns:
+        np.ndarray | None: Row numbers, or None if the view is the unsorted, unfiltered dataset.
+    """
+    expression = filter_expression(filters)
+    if sort_by is None and expression is None:
+        return None
+
+    columns = list(dict.fromkeys(list(filters) + ([sort_by] if sort_by else [])))
+    table = dataset.to_table(columns=columns)
+    indices = np.arange(table.num_rows)
+    if expression is not None:
+        mask = ds.dataset(table).to_table(columns={"keep": expression})["keep"]
+        indices = np.flatnonzero(mask.fill_null(False).to_numpy(zero_copy_only=False))
+    if sort_by is not None:
+        order = pc.array_sort_indices(
+            table[sort_by].take(pa.array(indices)),
+            order="ascending" if ascending else "descending",
+            null_placement="at_end",
+        )
+        indices = indices[order.to_numpy()]
+    return indices
+
+
+def count_rows(dataset: ds.Dataset, indices: np.ndarray | None) -> int:
+    """
+    Get the number of rows of a view (see `view_indices`), from the file metadata if unfiltered.
+    """
+    return dataset.count_rows() if indices is None else len(indices)
+
+
+def read_page(
+    dataset: ds.Dataset, indices: np.ndarray | None, start: int, end: int
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Read one page of a view of the dataset.
+
+    Args:
+        dataset (ds.Dataset): The dataset.
+        indices (np.ndarray | None): Row numbers of the view (see `view_indices`).
+        start (int): First position in the view.
+        end (int): Position after the last row of the page.
+
+    Returns:
+        tuple[pd.DataFrame, np.ndarray]: The rows of the page and their row numbers in the dataset.
+    """
+    page_indices = np.arange(start, end) if indices is None else indices[start:end]
+    page = dataset.take(pa.array(page_indices, type=pa.int64())).to_pandas()
+    return page, page_indices
@@ -0,0 +1,32 @@
+import pandas as pd
+
+
+def protein_table(psms: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate the PSM-level quantification table to a protein x sample abundance table.
+
+    Args:
+        psms (pd.DataFrame): PSM-level table with the columns ProteinName, PeptideSequence,
+            Reference (the mzML file of the sample) and Intensity.
+
+    Returns:
+        pd.DataFrame: One row per protein with its name, the summed intensity per sample (0 for
+            samples without PSMs of the protein) and the ';'-joined unique peptide sequences in
+            order of appearance.
+    """
+    # Convert Reference → Sample
+    psms = psms.assign(Sample=psms["Reference"].str.replace(".mzML", "", regex=False))
+
+    # Summed intensity per protein and sample, samples without PSMs of a protein get 0
+    abundance = psms.groupby(["ProteinName", "Sample"])["Intensity"].sum().unstack("Sample", fill_value=0)
+
+    # Unique peptide sequences per protein, in order of appearance
+    peptides = (
+        psms.drop_duplicates(["ProteinName", "PeptideSequence"])
+        .groupby("ProteinName")["PeptideSequence"]
+        .agg(";".join)
+    )
+
+    pivot_df = abundance.join(peptides).reset_index()
+    pivot_df.columns.name = None
+    return pivot_df
@@ -0,0 +1,231 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+# Location of the pipeline's summary database in the results directory of a workspace
+QUANTMS_DB = Path("summarypipeline", "quantms.db")
+
+# Columns (lower case) that get an index if a table has them: protein, peptide and run
+INDEXED_COLUMNS = ("proteinname", "peptidesequence", "run", "reference")
+
+# Maximum number of idle connections kept open per database file
+POOL_SIZE = 4
+
+# Idle read-only connections per database file, shared by all sessions of this process,
+# together with the (mtime, size) of the file they were opened for and the file they connect
+# to (the indexed copy of the database, see `indexed_copy`)
+_pools: dict[Path, tuple[tuple[int, int], Path, queue.LifoQueue]] = {}
+_pools_lock = threading.Lock()
+
+# Locks held while a database file is copied and indexed, so other databases are not blocked
+_index_locks: dict[Path, threading.Lock] = {}
+
+
+def database_path(workspace: str | Path) -> Path:
+    """
+    Get the path of the summarypipeline database of a workspace.
+    """
+    return Path(workspace, "results", QUANTMS_DB)
+
+
+def ensure_indexes(db_file: str | Path) -> None:
+    """
+    Create the missing indexes on protein, peptide and run columns of all tables.
+
+    Args:
+        db_file (str | Path): Path to the SQLite database, written to.
+    """
+    with closing(sqlite3.connect(db_file, timeout=10)) as con, con:
+        tables = [row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            for column in [row[1] for row in con.execute(f'PRAGMA table_info("{table}")')]:
+                if column.lower() in INDEXED_COLUMNS:
+                    con.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+
+
+def _signature(db_file: Path) -> tuple[int, int]:
+    stat = db_file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def indexed_copy(db_file: Path, signature: tuple[int, int]) -> Path:
+    """
+    Get a copy of a database with indexes (see `ensure_indexes`), creating it if needed.
+
+    The pipeline's database itself is never written, so its content hash in the catalog stays the
+    same. The copy is a hidden file next to it (left out of the catalog and the archives), named
+    after the (mtime, size) of the database, and replaces the copies of earlier versions.
+
+    Args:
+        db_file (Path): Path to the SQLite database.
+        signature (tuple[int, int]): The (mtime, size) of the database.
+
+    Returns:
+        Path: The indexed copy, or the database itself if the copy can not be written.
+    """
+    prefix = f".{db_file.name}."
+    copy = db_file.with_name(f"{prefix}{signature[0]:x}-{signature[1]:x}.indexed")
+    if copy.exists():
+        return copy
+    tmp = copy.with_name(f"{copy.name}.{os.getpid()}.tmp")
+    try:
+        with closing(sqlite3.connect(db_file.as_uri() + "?mode=ro", uri=True)) as source, closing(
+            sqlite3.connect(tmp)
+        ) as target:
+            source.backup(target)
+        ensure_indexes(tmp)
+        os.replace(tmp, copy)
+    except (OSError, sqlite3.Error):
+        tmp.unlink(missing_ok=True)
+        return db_file
+    for old in db_file.parent.glob(f"{prefix}*.indexed"):
+        if old != copy:
+            old.unlink(missing_ok=True)
+    return copy
+
+
+def _pool(db_file: Path) -> tuple[Path, queue.LifoQueue]:
+    """
+    Get the file to connect to and the connection pool of a database, indexing a copy of it first
+    if it is new or has changed.
+    """
+    signature = _signature(db_file)
+    with _pools_lock:
+        entry = _pools.get(db_file)
+        if entry is not None and entry[0] == signature:
+            return entry[1], entry[2]
+        lock = _index_locks.setdefault(db_file, threading.Lock())
+    with lock:
+        with _pools_lock:
+            entry = _pools.get(db_file)
+            if entry is not None and entry[0] == signature:
+                return entry[1], entry[2]
+        target = indexed_copy(db_file, signature)
+        pool = queue.LifoQueue(POOL_SIZE)
+        with _pools_lock:
+            replaced = _pools.get(db_file)
+            _pools[db_file] = (signature, target, pool)
+    if replaced is not None:
+        # Connections borrowed from the replaced pool are closed when they are given back
+        _close_all(replaced[2])
+    return target, pool
+
+
+def _close_all(pool: queue.LifoQueue) -> None:
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+@contextmanager
+def connection(db_file: str | Path) -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a read-only connection to a database from the per-process pool.
+
+    Connections are returned to the pool afterwards (or closed if it is full). When the file is
+    replaced, e.g. by a new pipeline run, a new pool is started for it.
+
+    Args:
+        db_file (str | Path): Path to the SQLite database.
+
+    Yields:
+        sqlite3.Connection: The connection, to the indexed copy of the database if there is one.
+    """
+    db_file = Path(db_file).resolve()
+    target, pool = _pool(db_file)
+    try:
+        con = pool.get_nowait()
+    except queue.Empty:
+        con = sqlite3.connect(target.as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+    try:
+        yield con
+    finally:
+        with _pools_lock:
+            current = _pools.get(db_file, (None, None, None))[2] is pool
+        try:
+            if not current:
+                raise queue.Full
+            pool.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+
+def query(db_file: str | Path, sql: str, params: list = []) -> pd.DataFrame:
+    """
+    Run a query on a database with a pooled read-only connection.
+
+    Args:
+        db_file (str | Path): Path to the SQLite database.
+        sql (str): The query.
+        params (list, optional): Values for the `?` placeholders in the query. Defaults to [].
+
+    Returns:
+        pd.DataFrame: The result rows.
+    """
+    with connection(db_file) as con:
+        return pd.read_sql_query(sql, con, params=params)
+
+
+def tables(db_file: str | Path) -> set[str]:
+    """
+    Get the names of the tables of a database, upper case.
+    """
+    return {name.upper() for name in query(db_file, "SELECT name FROM sqlite_master WHERE type = 'table'")["name"]}
+
+
+def protein_names(db_file: str | Path) -> list[str]:
+    """
+    Get the names of all quantified proteins, sorted.
+    """
+    return query(db_file, "SELECT DISTINCT ProteinName FROM PROTQUANT ORDER BY ProteinName")["ProteinName"].tolist()
+
+
+def protein_quant(db_file: str | Path, proteins: list[str] = []) -> pd.DataFrame:
+    """
+    Get the protein-level quantification, optionally only of the given proteins.
+
+    Args:
+        db_file (str | Path): Path to the SQLite database.
+        proteins (list[str], optional): Protein names. Defaults to [] (all proteins).
+
+    Returns:
+        pd.DataFrame: The rows of the PROTQUANT table.
+    """
+    if not proteins:
+        return query(db_file, "SELECT * FROM PROTQUANT")
+    return query(
+        db_file, f"SELECT * FROM PROTQUANT WHERE ProteinName IN ({', '.join('?' * len(proteins))})", proteins
+    )
+
+
+def peptide_quant(db_file: str | Path, proteins: list[str] = [], sequence: str = "") -> pd.DataFrame:
+    """
+    Get the peptide-level quantification of the given proteins and/or peptide sequence.
+
+    Both filters are looked up through the indexes created by `ensure_indexes`.
+
+    Args:
+        db_file (str | Path): Path to the SQLite database.
+        proteins (list[str], optional): Protein names. Defaults to [] (all proteins).
+        sequence (str, optional): Exact (unmodified) peptide sequence. Defaults to "" (all peptides).
+
+    Returns:
+        pd.DataFrame: The rows of the PEPQUANT table.
+    """
+    conditions, params = [], []
+    if proteins:
+        conditions.append(f"ProteinName IN ({', '.join('?' * len(proteins))})")
+        params += proteins
+    if sequence:
+        conditions.append("PeptideSequence = ?")
+        params.append(sequence)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return query(db_file, f"SELECT * FROM PEPQUANT{where}", params)
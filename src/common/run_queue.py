@@ -0,0 +1,391 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import psutil
+
+from src.common.common import available_cpus
+
+# Queue database in the workspaces directory, shared by all app processes
+QUEUE_DB = ".run-queue.db"
+
+# Seconds of history used to rank workspaces by how much they have run recently
+FAIR_SHARE_WINDOW = 24 * 3600
+
+# Fraction of the total memory that is never handed out to runs
+MEMORY_RESERVE = 0.1
+
+# Seconds between heartbeats of the app processes that own queued or running jobs
+HEARTBEAT_INTERVAL = 10
+
+# Seconds without a heartbeat after which a job of another host or container is closed
+LEASE_TIMEOUT = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workspace TEXT NOT NULL,
+    state TEXT NOT NULL,
+    cores INTEGER NOT NULL,
+    memory_mb INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    pid_created REAL,
+    host TEXT,
+    heartbeat REAL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, submitted);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_workspace ON jobs (workspace) WHERE state IN ('queued', 'running');
+"""
+
+# Columns added to the jobs table after its first version
+_ADDED_COLUMNS = {"pid_created": "REAL", "host": "TEXT", "heartbeat": "REAL"}
+
+# Queue databases whose schema this process has set up and migrated
+_prepared: set[Path] = set()
+_prepared_lock = threading.Lock()
+
+# Heartbeat thread of this process, running while it owns queued or running jobs
+_heartbeat: threading.Thread | None = None
+_heartbeat_lock = threading.Lock()
+
+
+def _host() -> str:
+    """
+    Identify the host and PID namespace of this process: process IDs can only be checked
+    between processes with the same identity. A restarted container gets a new PID namespace,
+    so a job of its previous incarnation is never mistaken for a job of a process that
+    happens to have the same PID.
+    """
+    try:
+        pid_namespace = os.readlink("/proc/self/ns/pid")
+    except OSError:
+        pid_namespace = ""
+    return f"{socket.gethostname()}/{psutil.boot_time():.0f}/{pid_namespace}"
+
+
+def owner() -> dict:
+    """
+    Get the identity of this app process as recorded with its jobs: pid, process creation time
+    (pid_created) and host (see `_host`).
+    """
+    return {"pid": os.getpid(), "pid_created": psutil.Process().create_time(), "host": _host()}
+
+
+def owner_alive(job_owner: dict) -> bool | None:
+    """
+    Check whether the app process identified by `owner()` is still running.
+
+    Returns:
+        bool | None: Whether it runs, None if it is not on this host or in this PID namespace
+            and so can not be checked.
+    """
+    if job_owner.get("host") != _host():
+        return None
+    try:
+        return psutil.Process(job_owner["pid"]).create_time() == job_owner["pid_created"]
+    except psutil.Error:
+        return False
+
+
+def _connect(workspaces_dir: str | Path) -> sqlite3.Connection:
+    """
+    Open the queue database, creating and migrating its schema on the first use in this process.
+    """
+    db_file = Path(workspaces_dir, QUEUE_DB)
+    con = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    with _prepared_lock:
+        if db_file.resolve() not in _prepared:
+            try:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.executescript(_SCHEMA)
+                con.execute("BEGIN IMMEDIATE")
+                columns = {row["name"] for row in con.execute("PRAGMA table_info(jobs)")}
+                for column, column_type in _ADDED_COLUMNS.items():
+                    if column not in columns:
+                        con.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+                con.execute("COMMIT")
+            except BaseException:
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+                con.close()
+                raise
+            _prepared.add(db_file.resolve())
+    return con
+
+
+@contextmanager
+def _transaction(workspaces_dir: str | Path) -> Iterator[sqlite3.Connection]:
+    """
+    Open the queue database and hold its write lock for the duration of the block, so that
+    admission decisions of concurrent sessions and processes are serialized.
+    """
+    con = _connect(workspaces_dir)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+
+
+@contextmanager
+def _snapshot(workspaces_dir: str | Path) -> Iterator[sqlite3.Connection]:
+    """
+    Open the queue database for reading a consistent snapshot, without taking its write lock.
+    """
+    con = _connect(workspaces_dir)
+    try:
+        con.execute("BEGIN")
+        try:
+            yield con
+        finally:
+            con.execute("ROLLBACK")
+    finally:
+        con.close()
+
+
+def _alive(job: sqlite3.Row, now: float) -> bool:
+    """
+    Check whether the app process of a job still runs (see `_reap`).
+    """
+    alive = owner_alive(dict(job))
+    if alive is None:
+        alive = job["heartbeat"] is not None and now - job["heartbeat"] < LEASE_TIMEOUT
+    return alive
+
+
+def _reap(con: sqlite3.Connection) -> None:
+    """
+    Close the jobs of app processes that have exited, which will never finish them.
+
+    A process on this host (see `_host`) has exited if no process with its PID and creation time
+    exists. Processes elsewhere, e.g. in other containers sharing the database, can not be
+    checked and are considered exited once their heartbeat is older than LEASE_TIMEOUT.
+    """
+    now = time.time()
+    jobs = con.execute("SELECT * FROM jobs WHERE state IN ('queued', 'running')").fetchall()
+    for job in jobs:
+        if not _alive(job, now):
+            con.execute(
+                "UPDATE jobs SET state = ?, finished = ? WHERE id = ?",
+                ("cancelled" if job["state"] == "queued" else "failed", now, job["id"]),
+            )
+
+
+def _beat(workspaces_dir: Path, identity: dict) -> None:
+    """
+    Heartbeat thread: renew the lease of the active jobs of this process every HEARTBEAT_INTERVAL
+    seconds, until it has none left.
+    """
+    global _heartbeat
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _heartbeat_lock:
+            try:
+                with _transaction(workspaces_dir) as con:
+                    renewed = con.execute(
+                        "UPDATE jobs SET heartbeat = ? WHERE host = ? AND pid = ? AND pid_created = ? AND state IN ('queued', 'running')",
+                        (time.time(), identity["host"], identity["pid"], identity["pid_created"]),
+                    ).rowcount
+            except sqlite3.Error:
+                # Database busy for longer than its timeout, try again with the next beat
+                continue
+            if not renewed:
+                _heartbeat = None
+                return
+
+
+def _start_heartbeat(workspaces_dir: Path, identity: dict) -> None:
+    """
+    Start the heartbeat thread of this process, unless it is running.
+    """
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_beat, args=(workspaces_dir, identity), name="run-queue-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _fair_order(con: sqlite3.Connection) -> list[sqlite3.Row]:
+    """
+    Get the queued jobs in the order they are admitted: workspaces that started fewer runs
+    within FAIR_SHARE_WINDOW first, then by submission time.
+    """
+    return con.execute(
+        """
+        SELECT q.*, (
+            SELECT COUNT(*) FROM jobs r WHERE r.workspace = q.workspace AND r.started >= ?
+        ) AS recent_runs
+        FROM jobs q WHERE q.state = 'queued'
+        ORDER BY recent_runs, q.submitted, q.id
+        """,
+        (time.time() - FAIR_SHARE_WINDOW,),
+    ).fetchall()
+
+
+def _admissible(con: sqlite3.Connection, job: sqlite3.Row, max_concurrent_runs: int) -> bool:
+    """
+    Check whether a job fits next to the running jobs: below the concurrency limit, within the
+    CPUs of this host and within the memory that is both available and not reserved by running jobs.
+    A job is always admitted when nothing is running, so that it can not wait forever.
+    """
+    running = con.execute("SELECT cores, memory_mb FROM jobs WHERE state = 'running'").fetchall()
+    if not running:
+        return True
+    if len(running) >= max_concurrent_runs:
+        return False
+    if sum(r["cores"] for r in running) + job["cores"] > available_cpus():
+        return False
+    memory = psutil.virtual_memory()
+    reserve = memory.total * MEMORY_RESERVE
+    unreserved = memory.total - reserve - sum(r["memory_mb"] for r in running) * 1024**2
+    return job["memory_mb"] * 1024**2 <= min(unreserved, memory.available - reserve)
+
+
+def submit(workspaces_dir: str | Path, workspace: str | Path, limits: dict) -> int:
+    """
+    Add a run of a workspace to the queue.
+
+    Args:
+        workspaces_dir (str | Path): Directory of all workspaces, which holds the queue database.
+        workspace (str | Path): Path to the workspace.
+        limits (dict): The "run_queue" settings, with the cores ("cores_per_run") and memory
+            ("memory_per_run_gb") reserved for the run.
+
+    Raises:
+        ValueError: If a run of the workspace is queued or running already.
+
+    Returns:
+        int: The job ID.
+    """
+    identity = owner()
+    with _transaction(workspaces_dir) as con:
+        _reap(con)
+        try:
+            cursor = con.execute(
+                """
+                INSERT INTO jobs (workspace, state, cores, memory_mb, pid, pid_created, host, heartbeat, submitted)
+                VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    Path(workspace).name,
+                    min(limits["cores_per_run"], available_cpus()),
+                    int(limits["memory_per_run_gb"] * 1024),
+                    identity["pid"],
+                    identity["pid_created"],
+                    identity["host"],
+                    time.time(),
+                    time.time(),
+                ),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"A run of workspace {Path(workspace).name} is queued or running already.")
+    _start_heartbeat(Path(workspaces_dir), identity)
+    return cursor.lastrowid
+
+
+def try_start(workspaces_dir: str | Path, job_id: int, limits: dict) -> bool:
+    """
+    Start a queued job if it is next in fair order and fits into the free cores and memory.
+
+    Jobs are not admitted out of order, so a large job at the front can not be starved by smaller ones.
+
+    Args:
+        workspaces_dir (str | Path): Directory of all workspaces, which holds the queue database.
+        job_id (int): The job ID.
+        limits (dict): The "run_queue" settings, with the global limit "max_concurrent_runs".
+
+    Returns:
+        bool: Whether the job is running.
+    """
+    with _transaction(workspaces_dir) as con:
+        _reap(con)
+        job = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None or job["state"] != "queued":
+            return job is not None and job["state"] == "running"
+        order = _fair_order(con)
+        if order[0]["id"] != job_id or not _admissible(con, job, limits["max_concurrent_runs"]):
+            return False
+        con.execute("UPDATE jobs SET state = 'running', started = ? WHERE id = ?", (time.time(), job_id))
+        return True
+
+
+def position(workspaces_dir: str | Path, job_id: int) -> int | None:
+    """
+    Get the position of a job in the queue.
+
+    Only reads the queue: jobs of exited app processes are left out, but closed by the next write.
+
+    Returns:
+        int | None: 1 for the next job to start, 0 if the job is running, None if it has finished.
+    """
+    now = time.time()
+    with _snapshot(workspaces_dir) as con:
+        job = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None or job["state"] not in ("queued", "running") or not _alive(job, now):
+            return None
+        if job["state"] == "running":
+            return 0
+        return [j["id"] for j in _fair_order(con) if _alive(j, now)].index(job_id) + 1
+
+
+def wait_for_turn(workspaces_dir: str | Path, job_id: int, limits: dict) -> Iterator[int]:
+    """
+    Wait until a queued job is started, yielding its queue position every "poll_interval" seconds.
+
+    Args:
+        workspaces_dir (str | Path): Directory of all workspaces, which holds the queue database.
+        job_id (int): The job ID.
+        limits (dict): The "run_queue" settings.
+
+    Yields:
+        int: The queue position of the job (see `position`).
+    """
+    while not try_start(workspaces_dir, job_id, limits):
+        current = position(workspaces_dir, job_id)
+        if current is None:
+            return
+        yield current
+        time.sleep(limits["poll_interval"])
+
+
+def finish(workspaces_dir: str | Path, job_id: int, success: bool) -> None:
+    """
+    Remove a job from the queue: a running job is marked done or failed, a job that never
+    started is marked cancelled.
+    """
+    with _transaction(workspaces_dir) as con:
+        con.execute(
+            """
+            UPDATE jobs SET finished = ?, state = CASE
+                WHEN state = 'queued' THEN 'cancelled' WHEN ? THEN 'done' ELSE 'failed' END
+            WHERE id = ? AND state IN ('queued', 'running')
+            """,
+            (time.time(), success, job_id),
+        )
+
+
+def summary(workspaces_dir: str | Path) -> dict[str, int]:
+    """
+    Get the number of running and queued jobs of all workspaces.
+
+    Only reads the queue, jobs of exited app processes are left out (see `position`).
+    """
+    now = time.time()
+    with _snapshot(workspaces_dir) as con:
+        jobs = con.execute("SELECT * FROM jobs WHERE state IN ('queued', 'running')").fetchall()
+    states = [job["state"] for job in jobs if _alive(job, now)]
+    return {"running": states.count("running"), "queued": states.count("queued")}
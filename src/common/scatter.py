@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Above this many points, scatter plots are rendered as a server-side density image
+RASTER_THRESHOLD = 100_000
+
+# Individual points are drawn on top of the density image once the view contains at most this many
+MAX_OVERLAY_POINTS = 5_000
+
+# Resolution (x, y) of the density image
+DENSITY_BINS = (400, 300)
+
+COLOR_SCALE = ["#a6cee3", "#1f78b4", "#08519c", "#08306b"]
+
+
+def density_image(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_range: tuple[float, float],
+    y_range: tuple[float, float],
+    bins: tuple[int, int] = DENSITY_BINS,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aggregate points into a 2D grid of counts, like a datashader canvas.
+
+    Args:
+        x (np.ndarray): X coordinates of the points.
+        y (np.ndarray): Y coordinates of the points.
+        x_range (tuple[float, float]): Visible x range, points outside are ignored.
+        y_range (tuple[float, float]): Visible y range, points outside are ignored.
+        bins (tuple[int, int], optional): Number of bins along x and y. Defaults to DENSITY_BINS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Counts with shape (y bins, x bins), x bin centers and y bin centers.
+    """
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=[x_range, y_range])
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return counts.T, x_centers, y_centers
+
+
+def density_scatter(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    x_range: tuple[float, float],
+    y_range: tuple[float, float],
+    hover_columns: list[str] = [],
+) -> tuple[go.Figure, np.ndarray | None]:
+    """
+    Build a scatter plot of many points as a density image, overlaid with the individual points once
+    the visible region is small enough.
+
+    Only the binned image (and the overlay) is sent to the browser, so the figure size no longer
+    grows with the number of points.
+
+    Args:
+        df (pd.DataFrame): The data to plot.
+        x (str): Column to plot on the x axis.
+        y (str): Column to plot on the y axis.
+        x_range (tuple[float, float]): Visible x range.
+        y_range (tuple[float, float]): Visible y range.
+        hover_columns (list[str], optional): Columns shown in the hover text of the overlaid points.
+
+    Returns:
+        tuple[go.Figure, np.ndarray | None]: The figure and the positional row indices of the overlaid
+            points (trace 1), or None if there are too many points in the region to overlay them.
+    """
+    x_values = df[x].to_numpy(dtype=float)
+    y_values = df[y].to_numpy(dtype=float)
+    counts, x_centers, y_centers = density_image(x_values, y_values, x_range, y_range)
+    # Log scale keeps sparse regions visible next to dense ones, empty bins stay transparent
+    with np.errstate(divide="ignore"):
+        z = np.where(counts > 0, np.log10(counts).round(3), np.nan)
+
+    fig = go.Figure(
+        go.Heatmap(
+            x=x_centers,
+            y=y_centers,
+            z=z,
+            customdata=counts.astype(int),
+            colorscale=COLOR_SCALE,
+            colorbar=dict(title="log10(PSMs)"),
+            hovertemplate=f"{x}: %{{x:.2f}}<br>{y}: %{{y:.4f}}<br>PSMs: %{{customdata:.0f}}<extra></extra>",
+        )
+    )
+
+    in_view = np.flatnonzero(
+        (x_values >= x_range[0]) & (x_values <= x_range[1])
+        & (y_values >= y_range[0]) & (y_values <= y_range[1])
+    )
+    overlay_index = None
+    if len(in_view) <= MAX_OVERLAY_POINTS:
+        overlay_index = in_view
+        points = df.iloc[overlay_index]
+        fig.add_trace(
+            go.Scatter(
+                x=points[x],
+                y=points[y],
+                mode="markers",
+                marker=dict(size=6, color="#08306b", opacity=0.8),
+                customdata=np.column_stack([overlay_index, points[hover_columns].astype(str)]),
+                hovertemplate="<b>Index: %{customdata[0]}</b><br>"
+                + f"{x}: %{{x:.2f}}<br>{y}: %{{y:.4f}}<br>"
+                + "".join(f"{c}: %{{customdata[{i + 1}]}}<br>" for i, c in enumerate(hover_columns))
+                + "<extra></extra>",
+                showlegend=False,
+            )
+        )
+
+    fig.update_layout(
+        xaxis=dict(title=x, range=list(x_range)),
+        yaxis=dict(title=y, range=list(y_range)),
+        hovermode="closest",
+    )
+    return fig, overlay_index
@@ -0,0 +1,202 @@
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from src.common.catalog import artifact_paths
+from src.common.idxml import cache_path, is_cache_fresh, warm_idxml_caches
+from src.common.pagination import Filter, csv_to_parquet
+from src.common.quantms_db import QUANTMS_DB, connection
+
+# Maximum number of rows a query returns to a page
+MAX_RESULT_ROWS = 1_000_000
+
+
+def _quote(identifier: str) -> str:
+    """
+    Quote a table or column name for use in SQL.
+    """
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _literal(path: Path) -> str:
+    """
+    Quote a file path as an SQL string literal.
+    """
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+def result_files(workspace: str | Path) -> list[Path]:
+    """
+    List the result files of a workspace that are registered as tables by `open_results_db`.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+
+    Returns:
+        list[Path]: idXML runs, the proteomicslfq and MSstats tables and the summarypipeline database.
+    """
+    return (
+        artifact_paths(workspace, "idfilter", "idXML")
+        + artifact_paths(workspace, "proteomicslfq", "csv")[:1]
+        + [f for f in artifact_paths(workspace, "msstats", "csv") if f.name.endswith("_comparisons.csv")][:1]
+        + [f for f in artifact_paths(workspace, "summarypipeline", "db") if f == Path(workspace, "results", QUANTMS_DB)]
+    )
+
+
+def open_results_db(
+    workspace: str | Path, parser: str = "pyopenms", max_workers: int = 1
+) -> duckdb.DuckDBPyConnection:
+    """
+    Open an in-memory DuckDB database with the result files of a workspace as tables.
+
+    - `psms`: the peptide hits of all idXML runs, with the run name in the `run` column
+    - `quant`: the PSM-level proteomicslfq quantification table
+    - `msstats`: the MSstats group comparison table
+    - one table per table of `summarypipeline/quantms.db`, e.g. `pepquant` and `protquant`
+
+    The idXML runs and the CSV/TSV tables are views on their Parquet caches, so queries only read
+    the columns and row groups they need. The (small) summarypipeline database is copied.
+    Afterwards, the database can only read files from the results directory.
+
+    Args:
+        workspace (str | Path): Path to the workspace.
+        parser (str, optional): idXML parser for runs without a fresh cache. Defaults to "pyopenms".
+        max_workers (int, optional): Maximum number of idXML parser processes. Defaults to 1.
+
+    Returns:
+        duckdb.DuckDBPyConnection: The database connection.
+    """
+    results_dir = Path(workspace, "results").resolve()
+    con = duckdb.connect()
+
+    for file in result_files(workspace):
+        if file.suffix == ".idXML":
+            continue
+        if file.parent.name == "proteomicslfq":
+            con.execute(f"CREATE VIEW quant AS SELECT * FROM read_parquet({_literal(csv_to_parquet(file))})")
+        elif file.parent.name == "msstats":
+            # Despite the extension, the MSstats comparison table is tab-separated
+            parquet_file = csv_to_parquet(file, sep="\t")
+            con.execute(f"CREATE VIEW msstats AS SELECT * FROM read_parquet({_literal(parquet_file)})")
+        else:
+            with connection(file) as db:
+                names = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+                for name in names:
+                    df = pd.read_sql_query(f"SELECT * FROM {_quote(name)}", db)
+                    con.from_df(df).create(name.lower())
+
+    # Parse runs without a fresh cache (writing it), runs that fail to parse are left out
+    idxml_files = [f for f in result_files(workspace) if f.suffix == ".idXML"]
+    warm_idxml_caches(idxml_files, parser, max_workers)
+    caches = [cache_path(f) for f in idxml_files if is_cache_fresh(f)]
+    if caches:
+        con.execute(
+            "CREATE VIEW psms AS SELECT "
+            r"regexp_extract(filename, '([^/\\]+)\.idXML\.parquet$', 1) AS run, * EXCLUDE (filename) "
+            f"FROM read_parquet([{', '.join(_literal(c) for c in caches)}], filename = true)"
+        )
+
+    # Restrict file access to the results, so queries cannot read or write anything else
+    con.execute(f"SET allowed_directories = [{_literal(str(results_dir) + '/')}]")
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+
+def list_tables(con: duckdb.DuckDBPyConnection) -> dict[str, list[str]]:
+    """
+    Get the tables of a results database with their column names.
+    """
+    rows = con.cursor().execute(
+        "SELECT table_name, column_name FROM information_schema.columns ORDER BY table_name, ordinal_position"
+    ).fetchall()
+    tables = {}
+    for table, column in rows:
+        tables.setdefault(table, []).append(column)
+    return tables
+
+
+def run_query(con: duckdb.DuckDBPyConnection, sql: str, params: list = [], limit: int = MAX_RESULT_ROWS) -> pd.DataFrame:
+    """
+    Run a single read-only SELECT statement on a results database.
+
+    Each call uses its own cursor, so one connection can be shared by all sessions of the app.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): The database connection (see `open_results_db`).
+        sql (str): The SELECT statement.
+        params (list, optional): Values for the `?` placeholders in the statement. Defaults to [].
+        limit (int, optional): Maximum number of rows returned. Defaults to MAX_RESULT_ROWS.
+
+    Returns:
+        pd.DataFrame: The result rows.
+    """
+    cursor = con.cursor()
+    statements = cursor.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single SELECT statement can be run on the results.")
+    return cursor.execute(f"SELECT * FROM ({statements[0].query}) LIMIT {int(limit)}", params).df()
+
+
+def select(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    columns: list[str] = [],
+    filters: dict[str, Filter] = {},
+    group_by: list[str] = [],
+    aggregates: dict[str, str] = {},
+    order_by: str | None = None,
+    ascending: bool = True,
+    limit: int = MAX_RESULT_ROWS,
+) -> pd.DataFrame:
+    """
+    Query a table of a results database, with filtering and aggregation done by the database.
+
+    Only the resulting rows are loaded into pandas, e.g. the summed intensity per protein instead
+    of the full PSM-level table.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): The database connection (see `open_results_db`).
+        table (str): Table to query, e.g. "quant".
+        columns (list[str], optional): Columns to select. Defaults to all columns, or only the
+            `group_by` columns if aggregating.
+        filters (dict[str, Filter], optional): Column filters as used by `display_large_dataframe`,
+            ("contains", text) or ("range", minimum, maximum). Defaults to {}.
+        group_by (list[str], optional): Columns to group by. Defaults to [].
+        aggregates (dict[str, str], optional): Columns mapped to an aggregate function, e.g.
+            {"Intensity": "sum"}. Defaults to {}.
+        order_by (str | None, optional): Column to sort by. Defaults to None.
+        ascending (bool, optional): Sort order. Defaults to True.
+        limit (int, optional): Maximum number of rows returned. Defaults to MAX_RESULT_ROWS.
+
+    Returns:
+        pd.DataFrame: The result rows.
+    """
+    selected = [_quote(c) for c in (columns or group_by)]
+    for column, func in aggregates.items():
+        if not func.isidentifier():
+            raise ValueError(f"Invalid aggregate function '{func}' for column '{column}'.")
+        selected.append(f"{func}({_quote(column)}) AS {_quote(column)}")
+
+    conditions, params = [], []
+    for column, (kind, *values) in filters.items():
+        if kind == "contains":
+            conditions.append(f"CAST({_quote(column)} AS VARCHAR) ILIKE ?")
+            params.append(f"%{values[0]}%")
+        elif kind == "range":
+            for value, operator in zip(values, (">=", "<=")):
+                if value is not None:
+                    conditions.append(f"{_quote(column)} {operator} ?")
+                    params.append(value)
+        else:
+            raise ValueError(f"Unknown filter type '{kind}' for column '{column}'.")
+
+    sql = f"SELECT {', '.join(selected) or '*'} FROM {_quote(table)}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if group_by:
+        sql += " GROUP BY " + ", ".join(_quote(c) for c in group_by)
+    if order_by:
+        sql += f" ORDER BY {_quote(order_by)} {'ASC' if ascending else 'DESC'}"
+    return run_query(con, sql, params, limit)
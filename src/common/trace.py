@@ -0,0 +1,144 @@
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Execution reports requested from Nextflow, in the job directory of the workspace (see nextflow_job)
+TRACE_FILE = "trace.txt"
+REPORT_FILE = "report.html"
+TIMELINE_FILE = "timeline.html"
+
+_DURATION_UNITS = {"ms": 1e-3, "s": 1, "m": 60, "h": 3600, "d": 86400}
+_MEMORY_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "PB": 1024**5}
+
+
+def reporting_args(job_dir: str | Path) -> str:
+    """
+    Get the Nextflow options that write the trace, report and timeline of a run into a directory.
+    """
+    job_dir = Path(job_dir).resolve()
+    return (
+        f"-with-trace {Path(job_dir, TRACE_FILE)} "
+        f"-with-report {Path(job_dir, REPORT_FILE)} "
+        f"-with-timeline {Path(job_dir, TIMELINE_FILE)}"
+    )
+
+
+def _seconds(value: str) -> float:
+    """
+    Parse a trace duration, e.g. "1h 2m 3s", "250ms" or raw milliseconds, into seconds.
+    """
+    value = str(value).strip()
+    if value in ("", "-", "nan"):
+        return np.nan
+    if re.fullmatch(r"\d+", value):
+        return int(value) / 1000
+    parts = re.findall(r"([\d.]+)\s*(ms|s|m|h|d)", value)
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts) if parts else np.nan
+
+
+def _megabytes(value: str) -> float:
+    """
+    Parse a trace memory or I/O size, e.g. "1.2 GB" or raw bytes, into MB.
+    """
+    value = str(value).strip()
+    if value in ("", "-", "nan"):
+        return np.nan
+    match = re.fullmatch(r"([\d.]+)\s*([KMGTP]?B)?", value)
+    if not match:
+        return np.nan
+    return float(match.group(1)) * _MEMORY_UNITS[match.group(2) or "B"] / 1024**2
+
+
+def _percent(value: str) -> float:
+    """
+    Parse a trace percentage, e.g. "98.5%", into a number.
+    """
+    value = str(value).strip().rstrip("%")
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def load_trace(trace_file: str | Path) -> pd.DataFrame:
+    """
+    Read a Nextflow trace file into one row per task.
+
+    Args:
+        trace_file (str | Path): Path to the trace file (tab-separated, human-readable or raw values).
+
+    Returns:
+        pd.DataFrame: Task name, process (last part of the fully qualified name, e.g. "COMET"),
+            tag, status, exit code, and realtime_s (execution time), queue_s (time between
+            submission and start of the execution, i.e. duration - realtime), cpu_percent,
+            peak_rss_mb, peak_vmem_mb, rchar_mb and wchar_mb.
+    """
+    trace = pd.read_csv(trace_file, sep="\t", dtype=str, keep_default_na=False)
+    names = trace["name"].str.extract(r"^(?P<qualified>[^(]+?)\s*(?:\((?P<tag>.*)\))?$")
+    tasks = pd.DataFrame({
+        "name": trace["name"],
+        "process": names["qualified"].str.split(":").str[-1],
+        "tag": names["tag"].fillna(""),
+        "status": trace.get("status", ""),
+        "exit": pd.to_numeric(trace.get("exit"), errors="coerce"),
+    })
+    for column, parse in (
+        ("duration", _seconds),
+        ("realtime", _seconds),
+        ("%cpu", _percent),
+        ("peak_rss", _megabytes),
+        ("peak_vmem", _megabytes),
+        ("rchar", _megabytes),
+        ("wchar", _megabytes),
+    ):
+        tasks[column] = trace[column].map(parse) if column in trace else np.nan
+    tasks = tasks.rename(columns={
+        "realtime": "realtime_s",
+        "%cpu": "cpu_percent",
+        "peak_rss": "peak_rss_mb",
+        "peak_vmem": "peak_vmem_mb",
+        "rchar": "rchar_mb",
+        "wchar": "wchar_mb",
+    })
+    tasks.insert(tasks.columns.get_loc("realtime_s") + 1, "queue_s", (tasks.pop("duration") - tasks["realtime_s"]).clip(lower=0))
+    return tasks
+
+
+def process_summary(tasks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate the tasks of a trace per process, the processes taking the most time first.
+
+    Tasks taken from the cache of a resumed run (status CACHED) are counted, but their time and
+    resources, spent in an earlier run, are left out.
+
+    Args:
+        tasks (pd.DataFrame): Tasks from `load_trace`.
+
+    Returns:
+        pd.DataFrame: Per process the number of executed and cached tasks, total/mean/max
+            realtime, share of the total realtime, CPU hours, mean %CPU, total queue time, max
+            peak RSS and total I/O.
+    """
+    cached = tasks["status"] == "CACHED"
+    counts = pd.DataFrame({
+        "executed": (~cached).groupby(tasks["process"]).sum(),
+        "cached": cached.groupby(tasks["process"]).sum(),
+    })
+    tasks = tasks[~cached].assign(cpu_h=lambda t: t["realtime_s"] * t["cpu_percent"] / 100 / 3600)
+    summary = counts.join(tasks.groupby("process").agg(
+        realtime_total_h=("realtime_s", lambda s: s.sum() / 3600),
+        realtime_mean_s=("realtime_s", "mean"),
+        realtime_max_s=("realtime_s", "max"),
+        cpu_h=("cpu_h", "sum"),
+        cpu_percent_mean=("cpu_percent", "mean"),
+        queue_total_h=("queue_s", lambda s: s.sum() / 3600),
+        peak_rss_max_mb=("peak_rss_mb", "max"),
+        rchar_total_mb=("rchar_mb", "sum"),
+        wchar_total_mb=("wchar_mb", "sum"),
+    )).fillna({"realtime_total_h": 0.0, "cpu_h": 0.0, "queue_total_h": 0.0})
+    summary.index.name = "process"
+    total = summary["realtime_total_h"].sum()
+    summary.insert(3, "realtime_share_percent", summary["realtime_total_h"] / total * 100 if total else 0.0)
+    return summary.sort_values("realtime_total_h", ascending=False).reset_index()
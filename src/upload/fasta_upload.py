@@ -3,6 +3,7 @@ from pathlib import Path
 
 import streamlit as st
 
+from src.common.catalog import build_catalog
 from src.common.common import reset_directory
 
 def save_uploaded_fasta(uploaded_files: list[bytes]) -> None:
@@ -22,6 +23,7 @@ def save_uploaded_fasta(uploaded_files: list[bytes]) -> None:
         if f.name not in [f.name for f in fasta_dir.iterdir()] and f.name.endswith((".fasta", ".fa")):
             with open(Path(fasta_dir, f.name), "wb") as fh:
                 fh.write(f.getbuffer())
+    build_catalog(st.session_state.workspace, ("fasta-files",))
     st.success("Successfully added uploaded FASTA files!")
 
 def copy_local_fasta_files_from_directory(local_fasta_directory: str, make_copy: bool = True) -> None:
@@ -49,6 +51,7 @@ def copy_local_fasta_files_from_directory(local_fasta_directory: str, make_copy:
             with open(external_files, "a") as f_handle:
                 f_handle.write(f"{f}\n")
 
+    build_catalog(st.session_state.workspace, ("fasta-files",))
     st.success("Successfully added local FASTA files!")
 
 def remove_selected_fasta_files(to_remove: list[str], params: dict) -> dict:
@@ -64,6 +67,7 @@ def remove_selected_fasta_files(to_remove: list[str], params: dict) -> dict:
         if isinstance(v, list) and any(f in v for f in to_remove):
             params[k] = [item for item in v if item not in to_remove]
 
+    build_catalog(st.session_state.workspace, ("fasta-files",))
     st.success("Selected FASTA files removed!")
     return params
 
@@ -80,5 +84,6 @@ def remove_all_fasta_files(params: dict) -> dict:
         if "fasta" in k and isinstance(v, list):
             params[k] = []
 
+    build_catalog(st.session_state.workspace, ("fasta-files",))
     st.success("All FASTA files removed!")
     return params
\ No newline at end of file
@@ -3,6 +3,7 @@ from pathlib import Path
 
 import streamlit as st
 
+from src.common.catalog import build_catalog
 from src.common.common import reset_directory
 
 def save_uploaded_sdrf(uploaded_files: list[bytes]) -> None:
@@ -22,6 +23,7 @@ def save_uploaded_sdrf(uploaded_files: list[bytes]) -> None:
         if f.name not in [f.name for f in sdrf_dir.iterdir()] and f.name.endswith((".sdrf", ".tsv")):
             with open(Path(sdrf_dir, f.name), "wb") as fh:
                 fh.write(f.getbuffer())
+    build_catalog(st.session_state.workspace, ("sdrf-files",))
     st.success("Successfully added uploaded SDRF files!")
 
 def copy_local_sdrf_files_from_directory(local_sdrf_directory: str, make_copy: bool = True) -> None:
@@ -47,6 +49,7 @@ def copy_local_sdrf_files_from_directory(local_sdrf_directory: str, make_copy: b
             with open(external_files, "a") as f_handle:
                 f_handle.write(f"{f}\n")
 
+    build_catalog(st.session_state.workspace, ("sdrf-files",))
     st.success("Successfully added local SDRF files!")
 
 def remove_selected_sdrf_files(to_remove: list[str], params: dict) -> dict:
@@ -62,6 +65,7 @@ def remove_selected_sdrf_files(to_remove: list[str], params: dict) -> dict:
         if isinstance(v, list) and any(f in v for f in to_remove):
             params[k] = [item for item in v if item not in to_remove]
 
+    build_catalog(st.session_state.workspace, ("sdrf-files",))
     st.success("Selected SDRF files removed!")
     return params
 
@@ -78,5 +82,6 @@ def remove_all_sdrf_files(params: dict) -> dict:
         if "sdrf" in k and isinstance(v, list):
             params[k] = []
 
+    build_catalog(st.session_state.workspace, ("sdrf-files",))
     st.success("All SDRF files removed!")
     return params
\ No newline at end of file
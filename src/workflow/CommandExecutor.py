@@ -1,16 +1,22 @@
 import time
+import itertools
 import os
+import queue
 import shutil
 import subprocess
 import threading
+from collections import deque
+from typing import IO
 from pathlib import Path
 from .Logger import Logger
 from .ParameterManager import ParameterManager
 import sys
 import importlib.util
 import json
+import psutil
 import streamlit as st
-import requests
+from src.common import backend
+from src.common.common import available_cpus
 
 class CommandExecutor:
     """
@@ -21,11 +27,74 @@ class CommandExecutor:
     commands and batches of commands in parallel, leveraging Python's subprocess module
     for execution.
     """
+    # Share of the total memory that is kept free when starting commands in parallel
+    MEMORY_RESERVE = 0.1
+
+    # Seconds between checks for free resources while commands are waiting to start
+    ADMISSION_INTERVAL = 1.0
+
+    # Chunks of command output (of up to MAX_LINE_BYTES each) buffered between the output pipes and the log files
+    BUFFER_CHUNKS = 64
+
+    # Bytes read from an output pipe at once, also the length at which long lines are split
+    MAX_LINE_BYTES = 64 * 1024
+
+    # Seconds between writes of command output to the log files
+    FLUSH_INTERVAL = 0.5
+
+    # Most recent lines of command output kept for the live tail, also the most lines logged at once
+    TAIL_LINES = 1_000
+
     # Methods for running commands and logging
-    def __init__(self, workflow_dir: Path, logger: Logger, parameter_manager: ParameterManager):
+    def __init__(
+        self,
+        workflow_dir: Path,
+        logger: Logger,
+        parameter_manager: ParameterManager,
+        max_workers: int | None = None,
+        memory_estimates: dict[str, float] = {},
+    ):
+        """
+        Args:
+            workflow_dir (Path): The workflow directory.
+            logger (Logger): Logger for command output and run times.
+            parameter_manager (ParameterManager): Parameters of the workflow.
+            max_workers (int | None, optional): Maximum number of commands running in parallel.
+                Defaults to the number of available CPUs.
+            memory_estimates (dict[str, float], optional): Peak memory in MB of one process of a tool
+                (TOPP tool name or python-tools script name), used to decide how many processes of
+                it fit into memory. Defaults to {}.
+        """
         self.pid_dir = Path(workflow_dir, "pids")
+        self.metrics_file = Path(workflow_dir, "metrics.jsonl")
+        self._metrics_lock = threading.Lock()
         self.logger = logger
         self.parameter_manager = parameter_manager
+        self.max_workers = max_workers or available_cpus()
+        self.memory_estimates = memory_estimates
+        # IDs of the commands run by this executor in the structured log
+        self._command_ids = itertools.count(1)
+        # Process IDs of the running commands, by the ID of the thread that runs them
+        self._pids = {}
+        # Live tail of the output of all commands run by this executor, newest last, each batch
+        # of lines headed by the command like in the logs
+        self.live_tail = deque(maxlen=self.TAIL_LINES)
+
+    @staticmethod
+    def _tool_name(command: list[str]) -> str:
+        """
+        Get the name of the tool a command runs, the script name for python-tools.
+        """
+        tool = Path(str(command[0])).stem
+        if tool.startswith("python") and len(command) > 1 and not str(command[1]).startswith("-"):
+            tool = Path(str(command[1])).stem
+        return tool
+
+    def _memory_estimate(self, command: list[str]) -> float:
+        """
+        Get the estimated peak memory of a command in MB from `memory_estimates`, 0 if unknown.
+        """
+        return self.memory_estimates.get(self._tool_name(command), 0)
 
     def run_multiple_commands(
         self, commands: list[str]
@@ -33,24 +102,60 @@ class CommandExecutor:
         """
         Executes multiple shell commands concurrently in separate threads.
 
-        This method leverages threading to run each command in parallel, improving
-        efficiency for batch command execution. Execution time and command results are
-        logged if specified.
+        At most `max_workers` commands run at the same time. Queued commands are started as
+        running ones finish, once their estimated memory (see `memory_estimates`) fits into the
+        available memory minus MEMORY_RESERVE and minus what the running commands are still
+        expected to allocate, i.e. their estimates less their current RSS (which the available
+        memory excludes already). A command is always started if nothing else is running.
+        Execution time and command results are logged if specified.
 
         Args:
             commands (list[str]): A list where each element is a list representing
                                         a command and its arguments.
         """
         # Log the start of command execution
-        self.logger.log(f"Running {len(commands)} commands in parallel...", 1)
+        self.logger.log(f"Running {len(commands)} commands in parallel (at most {self.max_workers} at a time)...", 1)
         start_time = time.time()
 
-        # Initialize a list to keep track of threads
-        threads = []
+        # Estimated memory (MB) of the running commands, by the thread that runs them
+        running = {}
+        resources_freed = threading.Condition()
+        reserve = psutil.virtual_memory().total / 1024**2 * self.MEMORY_RESERVE
+
+        def run(cmd: list[str]) -> None:
+            try:
+                self.run_command(cmd)
+            finally:
+                self._pids.pop(threading.get_ident(), None)
+                with resources_freed:
+                    running.pop(threading.current_thread(), None)
+                    resources_freed.notify_all()
 
-        # Start a new thread for each command
+        def pending_memory(thread: threading.Thread, memory: float) -> float:
+            pid = self._pids.get(thread.ident)
+            if pid is None:
+                # Not started yet
+                return memory
+            return max(memory - self._tree_rss(pid) / 1024**2, 0)
+
+        def can_start(memory: float) -> bool:
+            if not running:
+                return True
+            if len(running) >= self.max_workers:
+                return False
+            pending = sum(pending_memory(thread, m) for thread, m in running.items())
+            return memory <= psutil.virtual_memory().available / 1024**2 - pending - reserve
+
+        # Start each command in its own thread once resources are available
+        threads = []
         for cmd in commands:
-            thread = threading.Thread(target=self.run_command, args=(cmd,))
+            memory = self._memory_estimate(cmd)
+            with resources_freed:
+                # Memory is also freed by processes outside this executor, so check periodically
+                while not can_start(memory):
+                    resources_freed.wait(self.ADMISSION_INTERVAL)
+                thread = threading.Thread(target=run, args=(cmd,))
+                running[thread] = memory
             thread.start()
             threads.append(thread)
 
@@ -76,37 +181,188 @@ class CommandExecutor:
         command = [str(c) for c in command]
 
         # Log the execution start
-        self.logger.log(f"Running command:\n"+' '.join(command)+"\nWaiting for command to finish...", 1)   
+        command_id = next(self._command_ids)
+        self.logger.log(f"Running command:\n"+' '.join(command)+"\nWaiting for command to finish...", 1, command_id)
         start_time = time.time()
         
         # Execute the command
         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         child_pid = process.pid
+        self._pids[threading.get_ident()] = child_pid
         
         # Record the PID to keep track of running processes associated with this workspace/workflow
         # User can close the Streamlit app and return to a running workflow later
         pid_file_path = self.pid_dir / str(child_pid)
         pid_file_path.touch()
         
-        # Wait for command completion and capture output
-        stdout, stderr = process.communicate()
+        # Stream output to the logs while the command runs
+        stderr_lines, peak_rss = self._stream_output(process, command_id)
+        usage = self._wait(process)
+        self._pids.pop(threading.get_ident(), None)
         
         # Cleanup PID file
         pid_file_path.unlink()
 
         end_time = time.time()
         execution_time = end_time - start_time
+        self._record_metrics(command, start_time, execution_time, process.returncode, usage, peak_rss)
         # Format the logging prefix
-        self.logger.log(f"Process finished:\n"+' '.join(command)+f"\nTotal time to run command: {execution_time:.2f} seconds", 1)
+        self.logger.log(f"Process finished:\n"+' '.join(command)+f"\nTotal time to run command: {execution_time:.2f} seconds", 1, command_id)
         
-        # Log stdout if present
-        if stdout:
-            self.logger.log(stdout.decode(), 2)
-        
-        # Log stderr and raise an exception if errors occurred
-        if stderr or process.returncode != 0:
-            error_message = stderr.decode().strip()
-            self.logger.log(f"ERRORS OCCURRED:\n{error_message}", 2)
+        # Point to the errors, stderr itself is already logged with the output
+        if stderr_lines or process.returncode != 0:
+            self.logger.log(
+                f"ERRORS OCCURRED:\n{self._output_header(command, command_id)} exited with code {process.returncode}"
+                + (f", see its stderr ({stderr_lines:,} line{'s' * (stderr_lines != 1)}) in the output above" if stderr_lines else ""),
+                2,
+                command_id,
+            )
+
+    @staticmethod
+    def _wait(process: subprocess.Popen):
+        """
+        Wait for a process to exit and get its resource usage, including that of its (waited for)
+        child processes. Returns None where os.wait4 is not available (Windows).
+        """
+        if not hasattr(os, "wait4"):
+            process.wait()
+            return None
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return usage
+
+    def _record_metrics(
+        self, command: list[str], start_time: float, wall_time: float, returncode: int, usage, peak_rss: int
+    ) -> None:
+        """
+        Append the resource usage of a finished command as one JSON line to the metrics file
+        in the workflow directory.
+
+        CPU times and I/O (bytes read from and written to the storage device) include all child
+        processes of the command. Peak RSS is the largest sampled total RSS of the process tree;
+        ru_maxrss is not used, it includes the memory of this process at the time of the fork.
+        """
+        metrics = {
+            "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start_time)),
+            "tool": self._tool_name(command),
+            "command": command,
+            "exit_code": returncode,
+            "wall_time_s": round(wall_time, 3),
+            "user_time_s": round(usage.ru_utime, 3) if usage else None,
+            "system_time_s": round(usage.ru_stime, 3) if usage else None,
+            "peak_rss_mb": round(peak_rss / 1024**2, 1),
+            "read_bytes": usage.ru_inblock * 512 if usage else None,
+            "write_bytes": usage.ru_oublock * 512 if usage else None,
+        }
+        with self._metrics_lock, open(self.metrics_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(metrics) + "\n")
+
+    def _read_lines(self, pipe: IO[bytes], stream: str, lines: queue.Queue) -> None:
+        """
+        Read an output pipe of a process into a queue, one list of complete lines per read,
+        until the pipe is closed.
+        """
+        rest = b""
+        with pipe:
+            while chunk := pipe.read1(self.MAX_LINE_BYTES):
+                *complete, rest = (rest + chunk).split(b"\n")
+                if len(rest) >= self.MAX_LINE_BYTES:
+                    complete.append(rest)
+                    rest = b""
+                if complete:
+                    lines.put((stream, [line.decode(errors="replace").rstrip("\r") for line in complete]))
+            if rest:
+                lines.put((stream, [rest.decode(errors="replace").rstrip("\r")]))
+
+    def _output_header(self, command: list[str], command_id: int | None) -> str:
+        """
+        Get the name of a command in the logs, e.g. "CometAdapter [3]".
+        """
+        tool = self._tool_name(command)
+        return tool if command_id is None else f"{tool} [{command_id}]"
+
+    def _stream_output(self, process: subprocess.Popen, command_id: int | None = None) -> tuple[int, int]:
+        """
+        Write the stdout and stderr of a process to the logs line by line while it runs.
+
+        The pipes are read on two threads into a bounded queue (a process that writes faster than
+        the logs are written is slowed down instead of filling the memory) and the lines are
+        written to the logs in batches every FLUSH_INTERVAL seconds. Only complete lines are
+        logged, and the batches of one command follow each other without blank lines. Each batch
+        starts with the tool name and command ID, since the output of commands running in
+        parallel is interleaved. The batches are also appended to `live_tail`. The total RSS of
+        the process and its children is sampled at the same interval.
+
+        Args:
+            process (subprocess.Popen): The process, with stdout and stderr pipes.
+            command_id (int | None, optional): ID of the command in the logs. Defaults to None.
+
+        Returns:
+            tuple[int, int]: The number of lines written to stderr and the peak RSS in bytes.
+        """
+        lines = queue.Queue(maxsize=self.BUFFER_CHUNKS)
+        readers = [
+            threading.Thread(target=self._read_lines, args=(pipe, stream, lines), daemon=True)
+            for pipe, stream in ((process.stdout, "stdout"), (process.stderr, "stderr"))
+        ]
+        for reader in readers:
+            reader.start()
+
+        header = f"{self._output_header(process.args, command_id)}:"
+        stderr_lines = 0
+        batch = []
+        logged = False
+        last_flush = time.monotonic()
+        peak_rss = self._tree_rss(process.pid)
+        last_sample = time.monotonic()
+        while any(reader.is_alive() for reader in readers) or not lines.empty():
+            if time.monotonic() - last_sample >= self.FLUSH_INTERVAL:
+                peak_rss = max(peak_rss, self._tree_rss(process.pid))
+                last_sample = time.monotonic()
+            try:
+                stream, chunk = lines.get(timeout=self.FLUSH_INTERVAL)
+                batch += chunk
+                if stream == "stderr":
+                    stderr_lines += len(chunk)
+            except queue.Empty:
+                pass
+            if batch and (len(batch) >= self.TAIL_LINES or time.monotonic() - last_flush >= self.FLUSH_INTERVAL):
+                self._log_output(header, batch, command_id, end="\n")
+                batch = []
+                logged = True
+                last_flush = time.monotonic()
+        if batch:
+            self._log_output(header, batch, command_id)
+        elif logged:
+            # End the block of output with a blank line like any other message
+            self.logger.log("", 2, command_id, end="\n")
+        return stderr_lines, peak_rss
+
+    def _log_output(self, header: str, batch: list[str], command_id: int | None, end: str = "\n\n") -> None:
+        """
+        Log a batch of output lines of a command under its header and add them to `live_tail`.
+        """
+        self.live_tail.append(header)
+        self.live_tail.extend(batch)
+        self.logger.log("\n".join([header] + batch), 2, command_id, end=end)
+
+    @staticmethod
+    def _tree_rss(pid: int) -> int:
+        """
+        Get the total RSS in bytes of a process and its children, 0 once it has exited.
+        """
+        try:
+            parent = psutil.Process(pid)
+            processes = [parent] + parent.children(recursive=True)
+        except psutil.Error:
+            return 0
+        rss = 0
+        for p in processes:
+            try:
+                rss += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
 
     def run_topp(self, tool: str, input_output: dict, custom_params: dict = {}) -> None:
         """
@@ -270,23 +526,8 @@ class CommandExecutor:
             tmp_params_file.unlink()
 
     def run_nextflow(input_path: str, database_path: str, workdir: str, config_args: str, profile: str = "docker") -> tuple:
-        # Convert to absolute path
-        endpoint = "http://localhost:8000/run-nextflow/"
-        data = {
-            "input_path": input_path,
-            "database_path": database_path,
-            "profile": profile,
-            "workdir": str(workdir),
-            "config_args": config_args
-        }
-        with requests.post(endpoint, json=data, stream=True) as r:
-            if r.status_code == 200:
-                for line in r.iter_lines(decode_unicode=True):
-                    if line:
-                        if line.startswith("[Process exited with code"):
-                            returncode = int(line.strip().split()[-1].replace("]", ""))
-                            yield ("returncode", returncode)
-                        else:
-                            yield ("log_update", line)
-            else:
-                yield ("log_update", f"Execution failed: {r.text}")
+        """
+        Start a quantms run on the Nextflow backend and stream its log, see `backend.run_nextflow`.
+        The backend is configured under "nextflow_backend" in settings.json.
+        """
+        yield from backend.run_nextflow(input_path, database_path, workdir, config_args, profile)
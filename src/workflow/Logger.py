@@ -1,3 +1,11 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime
 from pathlib import Path
 
 class Logger:
@@ -7,36 +15,251 @@ class Logger:
     easy tracking of events, errors, or other significant occurrences in processes called
     during workflow execution.
 
+    Messages are written by one background writer thread, so logging from many threads never
+    interleaves and never waits for the disk. The writer keeps the log files open, writes in
+    batches once FLUSH_BYTES are buffered or FLUSH_INTERVAL seconds have passed, and rotates
+    a log file to "<name>.log.1" ... "<name>.log.<backup_count>" when it exceeds `max_bytes`.
+
     Attributes:
         log_file (Path): The file path of the log file where messages will be written.
     """
-    def __init__(self, workflow_dir: Path) -> None:
+    # Log files with the highest message level written to them
+    LOG_LEVELS = {"minimal": 0, "commands-and-run-times": 1, "all": 2}
+
+    # Seconds after which buffered messages are written
+    FLUSH_INTERVAL = 0.5
+
+    # Buffered bytes after which messages are written right away
+    FLUSH_BYTES = 256 * 1024
+
+    # Messages waiting for the writer, logging blocks while the queue is full
+    QUEUE_SIZE = 10_000
+
+    def __init__(
+        self,
+        workflow_dir: Path,
+        structured: bool = False,
+        max_bytes: int = 100 * 1024**2,
+        backup_count: int = 3,
+    ) -> None:
+        """
+        Args:
+            workflow_dir (Path): The workflow directory, logs are written to its "logs" subdirectory.
+            structured (bool, optional): Also write every message as a JSON line (time, level,
+                command_id, message) to "all.jsonl". Defaults to False.
+            max_bytes (int, optional): Size at which a log file is rotated, 0 to never rotate.
+                Defaults to 100 MiB.
+            backup_count (int, optional): Rotated files kept per log. Defaults to 3.
+        """
         self.workflow_dir = workflow_dir
+        self.structured = structured
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
 
-    def log(self, message: str, level: int = 0) -> None:
+    def log(self, message: str, level: int = 0, command_id: int | None = None, end: str = "\n\n") -> None:
         """
         Appends a given message to the log file, followed by two newline characters
         for readability. This method ensures that each logged message is separated
         for clear distinction in the log file.
 
+        The message is queued and written by the writer thread shortly after, see `flush`.
+
         Args:
             message (str): The message to be logged to the file.
             level (int, optional): The level of importance of the message. Defaults to 0.
+            command_id (int | None, optional): The command the message belongs to, for the
+                structured log. Defaults to None.
+            end (str, optional): Appended to the message in the log files. Defaults to two
+                newlines; consecutive parts of one block of text (e.g. command output) are
+                logged with a single newline.
+        """
+        self._start_writer()
+        self._queue.put((time.time(), level, command_id, message, end))
+
+    def flush(self) -> None:
+        """
+        Wait until all messages logged so far are written to the log files (or failed to be
+        written, see `_LogWriter`).
+        """
+        writer = self._writer
+        if writer is None:
+            return
+        written = threading.Event()
+        self._queue.put(written)
+        # The writer does not stop on errors, but never wait for one that is gone
+        while not written.wait(self.FLUSH_INTERVAL) and writer.is_alive():
+            pass
+
+    def close(self) -> None:
+        """
+        Write all logged messages, close the log files and stop the writer thread. Logging again
+        starts a new writer. Also done when the logger is garbage collected.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                return
+            _LogWriter.stop(self._queue, self._writer)
+            self._writer = None
+
+    def _start_writer(self) -> None:
+        """
+        Start the writer thread unless it is running. Messages still queued when the logger is
+        garbage collected or the interpreter exits are written then.
+        """
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                # The thread only references the writer, not this logger, so the logger can be collected
+                log_writer = _LogWriter(
+                    self._queue,
+                    Path(self.workflow_dir, "logs"),
+                    self.LOG_LEVELS,
+                    self.structured,
+                    self.max_bytes,
+                    self.backup_count,
+                    self.FLUSH_INTERVAL,
+                    self.FLUSH_BYTES,
+                )
+                self._writer = threading.Thread(target=log_writer.run, name="logger", daemon=True)
+                self._writer.start()
+                weakref.finalize(self, _LogWriter.stop, self._queue, self._writer)
+
+
+class _LogWriter:
+    """
+    Writer thread of a `Logger`: collects queued messages into per-file buffers and writes them
+    in batches. A batch that can not be written (e.g. the disk is full or the logs directory can
+    not be created) is reported on stderr and dropped, and writing is tried again with the next
+    batch, so logging never blocks on a failed writer.
+    """
+
+    def __init__(
+        self,
+        messages: queue.Queue,
+        log_dir: Path,
+        log_levels: dict[str, int],
+        structured: bool,
+        max_bytes: int,
+        backup_count: int,
+        flush_interval: float,
+        flush_bytes: int,
+    ) -> None:
+        self.messages = messages
+        self.log_dir = log_dir
+        self.log_levels = log_levels
+        self.structured = structured
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.files = {}
+        self.failing = False
+
+    @staticmethod
+    def stop(messages: queue.Queue, writer: threading.Thread) -> None:
+        """
+        Let a writer thread write the queued messages and wait until it has stopped.
+        """
+        if writer.is_alive():
+            messages.put(None)
+            writer.join()
+
+    def run(self) -> None:
+        names = list(self.log_levels) + (["all.jsonl"] if self.structured else [])
+        buffers = {name: [] for name in names}
+        buffered = 0
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self.messages.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+                if isinstance(item, tuple) and item:
+                    timestamp, level, command_id, message, end = item
+                    text = f"{message}{end}"
+                    for name, max_level in self.log_levels.items():
+                        if level <= max_level:
+                            buffers[name].append(text)
+                            buffered += len(text)
+                    if self.structured and message:
+                        buffers["all.jsonl"].append(json.dumps({
+                            "time": datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds"),
+                            "level": level,
+                            "command_id": command_id,
+                            "message": message,
+                        }) + "\n")
+                # Write when enough is buffered, when it is time, or when asked to (flush/close)
+                if not isinstance(item, tuple) or buffered >= self.flush_bytes or time.monotonic() - last_flush >= self.flush_interval:
+                    self._write_batch(buffers)
+                    buffered = 0
+                    last_flush = time.monotonic()
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is None:
+                    return
+        finally:
+            self._close_files()
+
+    def _write_batch(self, buffers: dict[str, list[str]]) -> None:
+        """
+        Write and clear the buffers, reporting (once per run of failures) if that fails.
+        """
+        try:
+            for name, buffer in buffers.items():
+                if buffer:
+                    self._write_file(name, "".join(buffer))
+                    buffer.clear()
+        except Exception as e:
+            if not self.failing:
+                print(f"Could not write the logs in {self.log_dir}, messages are dropped until it works again: {e}", file=sys.stderr)
+                self.failing = True
+            for buffer in buffers.values():
+                buffer.clear()
+            # Reopen the files with the next batch
+            self._close_files()
+        else:
+            if self.failing:
+                print(f"Writing the logs in {self.log_dir} works again.", file=sys.stderr)
+                self.failing = False
+
+    def _close_files(self) -> None:
+        for f in self.files.values():
+            try:
+                f.close()
+            except OSError:
+                pass
+        self.files.clear()
+
+    def _write_file(self, name: str, text: str) -> None:
+        """
+        Append text to a log file, rotating it first if it would exceed `max_bytes`.
         """
-        log_dir = Path(self.workflow_dir, "logs")
-        if not log_dir.exists():
-            log_dir.mkdir()
-        # Write the message to the log file.
-        if level == 0:
-            with open(Path(log_dir, "minimal.log"), "a", encoding="utf-8") as f:
-                f.write(f"{message}\n\n")
-        if level <= 1:
-            with open(Path(log_dir, "commands-and-run-times.log"), "a", encoding="utf-8") as f:
-                f.write(f"{message}\n\n")
-        if level <= 2:
-            with open(Path(log_dir, "all.log"), "a", encoding="utf-8") as f:
-                f.write(f"{message}\n\n")
-        # log_types = ["minimal", "commands and run times", "tool outputs", "all"]
-        # for i, log_type in enumerate(log_types):
-        #     with open(Path(log_dir, f"{log_type.replace(" ", "-")}.log"), "a", encoding="utf-8") as f:
-        #         f.write(f"{message}\n\n")
\ No newline at end of file
+        file_name = name if name.endswith(".jsonl") else f"{name}.log"
+        path = Path(self.log_dir, file_name)
+        f = self.files.get(name)
+        if f is None or not path.exists():
+            # Not opened yet, or deleted since (e.g. the workflow directory was cleaned up)
+            if f is not None:
+                f.close()
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            f = self.files[name] = open(path, "a", encoding="utf-8")
+        data = text.encode("utf-8")
+        if self.max_bytes and f.tell() and f.tell() + len(data) > self.max_bytes:
+            f.close()
+            del self.files[name]
+            for i in range(self.backup_count - 1, 0, -1):
+                if Path(self.log_dir, f"{file_name}.{i}").exists():
+                    os.replace(Path(self.log_dir, f"{file_name}.{i}"), Path(self.log_dir, f"{file_name}.{i + 1}"))
+            if self.backup_count:
+                os.replace(path, Path(self.log_dir, f"{file_name}.1"))
+            else:
+                path.unlink()
+            f = self.files[name] = open(path, "a", encoding="utf-8")
+        f.write(text)
+        f.flush()
@@ -0,0 +1,89 @@
+"""
+The streaming idXML parser must produce the same table as the pyOpenMS parser.
+
+    python -m pytest tests
+"""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.common.idxml import _parse_idxml, _stream_idxml
+
+EXAMPLE_DATA = Path(__file__).parent.parent / "example_data"
+
+# Two identification runs with protein hit IDs continuing across runs, evidence listing
+# proteins out of accession order, N-terminal and residue modifications, hits without
+# evidence and a spectrum without hits
+HANDMADE_IDXML = """<?xml version="1.0" encoding="UTF-8"?>
+<IdXML version="1.5" xsi:noNamespaceSchemaLocation="https://www.openms.de/xml-schema/IdXML_1_5.xsd" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+	<SearchParameters id="SP_0" db="" db_version="" taxonomy="" mass_type="monoisotopic" charges="" enzyme="trypsin" missed_cleavages="2" precursor_peak_tolerance="10" precursor_peak_tolerance_ppm="true" peak_mass_tolerance="0.02" peak_mass_tolerance_ppm="false" >
+	</SearchParameters>
+	<IdentificationRun date="2024-01-01T00:00:00" search_engine="Comet" search_engine_version="2023.01" search_parameters_ref="SP_0" >
+		<ProteinIdentification score_type="" higher_score_better="true" significance_threshold="0.0" >
+			<ProteinHit id="PH_0" accession="sp|Q99999|ZZZ_HUMAN" score="0.0" sequence="" >
+			</ProteinHit>
+			<ProteinHit id="PH_1" accession="sp|P00001|AAA_HUMAN" score="0.0" sequence="" >
+			</ProteinHit>
+			<ProteinHit id="PH_2" accession="DECOY_sp|P50000|MMM_HUMAN" score="0.0" sequence="" >
+			</ProteinHit>
+		</ProteinIdentification>
+		<PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="501.25" RT="1201.5" >
+			<PeptideHit score="0.001" sequence=".(Acetyl)PEPM(Oxidation)TIDEK" charge="2" protein_refs="PH_0 PH_2 PH_1" >
+			</PeptideHit>
+			<PeptideHit score="0.2" sequence="AAAC(Carbamidomethyl)K" charge="3" >
+			</PeptideHit>
+		</PeptideIdentification>
+		<PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="622.75" RT="1302.25" >
+		</PeptideIdentification>
+		<PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="733.5" RT="90.125" >
+			<PeptideHit score="0.05" sequence="SEQVENCER" charge="1" protein_refs="PH_1" >
+			</PeptideHit>
+		</PeptideIdentification>
+	</IdentificationRun>
+	<IdentificationRun date="2024-01-01T00:00:00" search_engine="Comet" search_engine_version="2023.01" search_parameters_ref="SP_0" >
+		<ProteinIdentification score_type="" higher_score_better="true" significance_threshold="0.0" >
+			<ProteinHit id="PH_3" accession="sp|P00001|AAA_HUMAN" score="0.0" sequence="" >
+			</ProteinHit>
+			<ProteinHit id="PH_4" accession="sp|P00002|BBB_HUMAN" score="0.0" sequence="" >
+			</ProteinHit>
+		</ProteinIdentification>
+		<PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="844.0" RT="15.0" >
+			<PeptideHit score="0.01" sequence="LLLLR" charge="4" protein_refs="PH_4 PH_3" >
+			</PeptideHit>
+		</PeptideIdentification>
+	</IdentificationRun>
+</IdXML>
+"""
+
+
+def _assert_same_table(idxml_file: Path) -> None:
+    expected = _parse_idxml(idxml_file)
+    actual = _stream_idxml(idxml_file)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=not expected.empty)
+
+
+@pytest.mark.parametrize("idxml_file", sorted(EXAMPLE_DATA.rglob("*.idXML")), ids=lambda p: p.name)
+def test_stream_parser_matches_pyopenms_on_example_data(idxml_file: Path) -> None:
+    _assert_same_table(idxml_file)
+
+
+def test_stream_parser_matches_pyopenms_on_handmade_file(tmp_path: Path) -> None:
+    idxml_file = tmp_path / "handmade.idXML"
+    idxml_file.write_text(HANDMADE_IDXML, encoding="utf-8")
+    _assert_same_table(idxml_file)
+    assert len(_stream_idxml(idxml_file)) == 4
+
+
+def test_stream_parser_grows_its_arrays(tmp_path: Path) -> None:
+    # About 150 bytes per hit, well below the size estimate, so the arrays are resized while parsing
+    peptides = "".join(
+        f'<PeptideIdentification score_type="q-value" higher_score_better="false" MZ="{400 + i / 7}" RT="{i / 3}" >'
+        f'<PeptideHit score="{i / 5000}" sequence="PEPTIDE{"K" if i % 2 else "R"}" charge="{2 + i % 3}" protein_refs="PH_{i % 3}" />'
+        "</PeptideIdentification>\n"
+        for i in range(5000)
+    )
+    run = HANDMADE_IDXML.split("</ProteinIdentification>", 1)[1].split("</IdentificationRun>", 1)[0]
+    idxml_file = tmp_path / "large.idXML"
+    idxml_file.write_text(HANDMADE_IDXML.replace(run, "\n" + peptides, 1), encoding="utf-8")
+    _assert_same_table(idxml_file)